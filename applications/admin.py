@@ -6,6 +6,7 @@ from applications.models import Profile
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ("__str__", "aim")
+    list_select_related = ('user',)
     readonly_fields = ('user', 'deck_templates_count', 'decks_count')
 
     filter_horizontal = ()
@@ -0,0 +1,17 @@
+import logging
+
+from applications.serializers import ProfileStatusSerializer
+from applications.views import CurrentUserProfileStatusAPIView
+from core.async_views import AsyncAPIView
+from core.log import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCurrentUserProfileStatusAPIView(AsyncAPIView):
+    fallback_view = CurrentUserProfileStatusAPIView
+
+    def get_data(self, request, *args, **kwargs):
+        data = ProfileStatusSerializer(request.user.profile).data
+        log_event(logger, 'profile_status_requested', user_id=request.user.id)
+        return data
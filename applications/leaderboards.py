@@ -0,0 +1,55 @@
+"""
+Leaderboards of public profiles
+
+Served from the counters of `Profile` (updated by every review) and their partial indexes of public profiles:
+top of the board is a range scan of the index in its order (O(log n + limit)), rank of the profile counts
+the index entries above it (index only scan, O(log n + rank))
+Ties share the rank (1, 2, 2, 4...), in the top and for the current profile
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from applications.models import Profile, week_start
+from contents.models import DeckTemplate
+
+BOARDS = ('weekly', 'streak')
+MAX_LIMIT = 100
+
+
+def board_queryset(board, today=None):
+    """
+    (queryset of the ranked public profiles, name of the counter field)
+    """
+    today = today or timezone.now().date()
+    profiles = Profile.objects.filter(is_private=False)
+    if board == 'weekly':
+        return profiles.filter(week=week_start(today), weekly_reviews__gt=0), 'weekly_reviews'
+    return profiles.filter(streak_date__gte=today - timezone.timedelta(days=1), streak__gt=0), 'streak'
+
+
+def template_neighbours(profile):
+    """
+    Profiles sharing deck templates with the profile: creators and downloaders of its created or downloaded templates
+    """
+    templates = DeckTemplate.objects.filter(Q(creator_id=profile.id) | Q(downloaded=profile.id)).values('id')
+    return Q(id__in=DeckTemplate.downloaded.through.objects.filter(decktemplate_id__in=templates)
+             .values('profile_id')) | Q(id__in=DeckTemplate.objects.filter(id__in=templates).values('creator_id')) \
+        | Q(id=profile.id)
+
+
+def leaderboard(board, profile, limit=10, templates=False):
+    """
+    Leaderboard response data: top profiles and the rank of the given one (without a rank if it has no score)
+    """
+    profiles, field = board_queryset(board)
+    if templates:
+        profiles = profiles.filter(template_neighbours(profile))
+
+    top = []
+    for number, row in enumerate(profiles.order_by('-%s' % field, 'id').values('user_id', 'user__name', field)[:limit]):
+        rank = top[-1]['rank'] if top and top[-1]['score'] == row[field] else number + 1  # Profiles above are listed
+        top.append({'rank': rank, 'user_id': row['user_id'], 'name': row['user__name'], 'score': row[field]})
+
+    score = profile.current_weekly_reviews if board == 'weekly' else profile.current_streak
+    rank = profiles.filter(**{'%s__gt' % field: score}).count() + 1 if score else None
+    return {'board': board, 'top': top, 'me': {'rank': rank, 'score': score, 'private': profile.is_private}}
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-19 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_private', models.BooleanField(default=True, help_text='Designates whether this user profile is private. Private profiles invisible to others', verbose_name='Is private')),
+                ('aim', models.IntegerField(default=100, help_text='Count of card to learn every day', verbose_name='Aim')),
+                ('about', models.CharField(blank=True, default='Hey there! I am learning on ll-deck!', max_length=256, verbose_name='About')),
+                ('status', models.SmallIntegerField(choices=[(0, 'Profile status: IDLE (None)'), (1, 'Profile status: Active'), (2, 'Profile status: Busy'), (3, 'Profile status: Inactive')], default=0, verbose_name='Status')),
+                ('selected_theme_mode', models.SmallIntegerField(choices=[(0, 'Theme mode: IDLE (None)'), (1, 'Theme mode: System default'), (2, 'Theme mode: Light'), (3, 'Theme mode: Dark'), (4, 'Theme mode: High contrast')], default=0, verbose_name='Theme mode')),
+                ('selected_language', models.SmallIntegerField(choices=[(0, 'Profile language setting: None'), (1, 'Profile language setting: English'), (2, 'Profile language setting: Russian'), (3, 'Profile language setting: Kazakh')], default=0, verbose_name='Language')),
+                ('shard', models.CharField(blank=True, help_text='Database alias storing decks, cards and statistics of this profile (see core/sharding.py)', max_length=32, verbose_name='Shard')),
+            ],
+            options={
+                'verbose_name': 'User Profile',
+                'verbose_name_plural': 'Users Profiles',
+            },
+        ),
+    ]
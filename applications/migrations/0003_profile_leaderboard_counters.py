@@ -0,0 +1,46 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='streak',
+            field=models.PositiveIntegerField(default=0, help_text='Consecutive days with reviews up to `streak_date`'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='streak_date',
+            field=models.DateField(blank=True, help_text='Last day with reviews', null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='week',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='weekly_reviews',
+            field=models.PositiveIntegerField(default=0, help_text='Reviews of the week starting with `week`'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['week', '-weekly_reviews'], name='profile_week_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-streak', 'streak_date'], name='profile_streak_idx'),
+        ),
+    ]
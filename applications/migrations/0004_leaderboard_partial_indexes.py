@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_profile_leaderboard_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='profile',
+            name='profile_week_reviews_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='profile',
+            name='profile_streak_idx',
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_private', False)), fields=['week', '-weekly_reviews', 'id'], include=('user_id',), name='profile_week_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('is_private', False)), fields=['-streak', 'id'], include=('streak_date', 'user_id'), name='profile_streak_idx'),
+        ),
+    ]
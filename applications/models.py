@@ -1,12 +1,42 @@
 import typing
 
 from django.db import models
+from django.db.models import Case, When, F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from applications.constants import Theme, ProfileStatus, UserLanguage
+from core.sharding import choose_shard
 from lldeck.settings import AUTH_USER_MODEL
 
 
+def week_start(date):
+    return date - timezone.timedelta(days=date.weekday())
+
+
+class ProfileManager(models.Manager):
+    def record_reviews(self, profile_id, count=1, today=None):
+        """
+        Updates streak and weekly reviews counters of the profile with one UPDATE, without reading the profile
+        Expressions of SET are evaluated on the previous values of the row
+        """
+        today = today or timezone.now().date()
+        streak = Case(
+            When(streak_date=today, then=F('streak')),
+            When(streak_date=today - timezone.timedelta(days=1), then=F('streak') + 1),
+            default=Value(1), output_field=models.PositiveIntegerField()
+        )
+        return self.filter(id=profile_id).update(
+            streak=streak, longest_streak=Greatest(F('longest_streak'), streak), streak_date=today,
+            weekly_reviews=Case(
+                When(week=week_start(today), then=F('weekly_reviews') + count),
+                default=Value(count), output_field=models.PositiveIntegerField()
+            ),
+            week=week_start(today),
+        )
+
+
 class Profile(models.Model):
     is_private = models.BooleanField(
         _('Is private'),
@@ -27,6 +57,17 @@ class Profile(models.Model):
         choices=UserLanguage.PROFILE_LANGUAGES,
         default=UserLanguage.LANGUAGE_NONE
     )
+    shard = models.CharField(
+        _('Shard'), max_length=32, blank=True,
+        help_text=_("Database alias storing decks, cards and statistics of this profile (see core/sharding.py)")
+    )
+
+    # Leaderboard counters, updated by every review (`ProfileManager.record_reviews`)
+    streak = models.PositiveIntegerField(default=0, help_text=_("Consecutive days with reviews up to `streak_date`"))
+    longest_streak = models.PositiveIntegerField(default=0)
+    streak_date = models.DateField(null=True, blank=True, help_text=_("Last day with reviews"))
+    weekly_reviews = models.PositiveIntegerField(default=0, help_text=_("Reviews of the week starting with `week`"))
+    week = models.DateField(null=True, blank=True)
 
     decks = typing.Any  # related_name
     deck_templates = typing.Any  # related_name
@@ -35,9 +76,36 @@ class Profile(models.Model):
 
     # followed = models.ManyToManyField(to=PROFILE_MODEL, related_name='followers', blank=True)
 
+    objects = ProfileManager()
+
     class Meta:
         verbose_name = 'User Profile'
         verbose_name_plural = 'Users Profiles'
+        indexes = [
+            # Leaderboards of public profiles: top of the week by reviews, top of the current streaks,
+            # both served by index only scans (see applications/leaderboards.py)
+            models.Index(
+                fields=['week', '-weekly_reviews', 'id'], include=['user_id'], condition=Q(is_private=False),
+                name='profile_week_reviews_idx'
+            ),
+            models.Index(
+                fields=['-streak', 'id'], include=['streak_date', 'user_id'], condition=Q(is_private=False),
+                name='profile_streak_idx'
+            ),
+        ]
+
+    @property
+    def current_streak(self):
+        """
+        Streak goes on while the day after the last day with reviews is not over
+        """
+        if self.streak_date and self.streak_date >= timezone.now().date() - timezone.timedelta(days=1):
+            return self.streak
+        return 0
+
+    @property
+    def current_weekly_reviews(self):
+        return self.weekly_reviews if self.week == week_start(timezone.now().date()) else 0
 
     @property
     def decks_count(self):
@@ -72,5 +140,10 @@ class Profile(models.Model):
             count += deck.stat_total_reviews
         return count
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if not self.shard:
+            self.shard = choose_shard(self.user_id)
+        super(Profile, self).save(force_insert, force_update, using, update_fields)
+
     def __str__(self):
         return "%s's profile" % self.user.name
@@ -6,7 +6,7 @@ from applications.models import Profile
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        exclude = ('id', 'user')
+        exclude = ('id', 'user', 'shard', 'streak', 'longest_streak', 'streak_date', 'weekly_reviews', 'week')
 
 
 class ProfileStatusSerializer(serializers.ModelSerializer):
@@ -16,10 +16,12 @@ class ProfileStatusSerializer(serializers.ModelSerializer):
     cards_learned_today = serializers.ReadOnlyField()
     minutes_gone_today = serializers.ReadOnlyField()
     total_reviews = serializers.ReadOnlyField()
+    streak = serializers.ReadOnlyField(source='current_streak')
+    weekly_reviews = serializers.ReadOnlyField(source='current_weekly_reviews')
 
     class Meta:
         model = Profile
         fields = (
             'id', 'decks_count', 'deck_templates_count', 'downloaded_deck_templates_count',
-            'cards_learned_today', 'minutes_gone_today', 'total_reviews'
+            'cards_learned_today', 'minutes_gone_today', 'total_reviews', 'streak', 'longest_streak', 'weekly_reviews'
         )
@@ -1,12 +1,18 @@
 import logging
 
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from applications.leaderboards import leaderboard, BOARDS, MAX_LIMIT
 from applications.models import Profile
 from applications.serializers import ProfileSerializer, ProfileStatusSerializer
 from authentication.models import User
+from contents.helpers import ProfileResponseCacheHelper
+from contents.history import profile_history, HISTORY_DAYS, MAX_HISTORY_DAYS
+from core.log import log_event
 
 logger = logging.getLogger(__name__)
 
@@ -52,7 +58,66 @@ class CurrentUserProfileStatusAPIView(APIView):
     def get(cls, request):
         try:
             serializer = ProfileStatusSerializer(request.user.profile)
-            logger.info("User '%s' requested profile statistics" % request.user.name)
+            log_event(logger, 'profile_status_requested', user_id=request.user.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Profile.DoesNotExist:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class CurrentUserProfileHistoryAPIView(APIView, ProfileResponseCacheHelper):
+    """
+    Statistics history of the days `from` - `to` (YYYY-MM-DD, default: the last year up to today)
+    """
+
+    def get(self, request):
+        try:
+            profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        errors, dates = {}, {}
+        for name in ('from', 'to'):
+            value = request.query_params.get(name)
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:
+                dates[name] = None
+            if value and dates[name] is None:
+                errors[name] = ["Date of YYYY-MM-DD format is expected."]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        date_to = dates['to'] or timezone.now().date()
+        date_from = dates['from'] or date_to - timezone.timedelta(days=HISTORY_DAYS - 1)
+        if date_from > date_to or (date_to - date_from).days >= MAX_HISTORY_DAYS:
+            return Response({"from": ["Range of up to %s days is expected." % MAX_HISTORY_DAYS]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        log_event(logger, 'profile_history_requested', user_id=request.user.id)
+        return self.cached_response(
+            lambda: Response(profile_history(
+                profile.daily_summaries.all(), profile.yearly_summaries.all(), date_from, date_to
+            ))
+        )
+
+
+class LeaderboardAPIView(APIView):
+    """
+    Top of the public profiles by reviews of the week (`weekly`) or current streak (`streak`) with the rank
+    of the current profile, among all profiles or profiles sharing deck templates with the current one
+    """
+    templates = False
+
+    def get(self, request, board):
+        if board not in BOARDS:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        try:
+            profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        limit = request.query_params.get('limit', '10')
+        if not limit.isnumeric() or not 0 < int(limit) <= MAX_LIMIT:
+            return Response({"limit": ["Number from 1 to %s is expected." % MAX_LIMIT]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(leaderboard(board, profile, int(limit), templates=self.templates), status=status.HTTP_200_OK)
@@ -32,3 +32,14 @@ class UserManager(BaseUserManager):
             raise ValueError('Superuser must have is_superuser=True.')
 
         return self._create_user(email, password, **extra_fields)
+
+
+class ActiveUserManager(UserManager):
+    """
+    Default manager, users marked as deleted are hidden (see contents/purge.py)
+    Not used in migrations, historical models see every user
+    """
+    use_in_migrations = False
+
+    def get_queryset(self):
+        return super(ActiveUserManager, self).get_queryset().filter(deleted_at=None)
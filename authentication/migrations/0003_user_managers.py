@@ -0,0 +1,22 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:33
+
+import authentication.managers
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', authentication.managers.UserManager()),
+            ],
+        ),
+    ]
@@ -8,7 +8,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
-from .managers import UserManager
+from .managers import UserManager, ActiveUserManager
 from .tools import get_user_avatar_path
 
 
@@ -31,8 +31,13 @@ class User(AbstractBaseUser, PermissionsMixin):
             "Unselect this instead of deleting accounts."
         ),
     )
+    deleted_at = models.DateTimeField(
+        _('Deleted at'), null=True, blank=True, editable=False,
+        help_text=_("Marked as deleted, hidden by the default manager until purged (see contents/purge.py)")
+    )
 
-    objects = UserManager()
+    objects = ActiveUserManager()
+    all_objects = UserManager()  # With the deleted ones
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['name', ]
@@ -40,6 +45,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _('User')
         verbose_name_plural = _('Users')
+        indexes = [
+            # Accounts waiting for the purge (purgedeleted command)
+            models.Index(fields=['deleted_at'], name='user_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+        ]
 
     def clean(self):
         # Don't allow other users to create without phone number.
@@ -2,11 +2,13 @@ import logging
 import os
 import uuid
 
+from core.log import log_event
+
 logger = logging.getLogger(__name__)
 
 
 def get_user_avatar_path(instance, filename):
-    logger.info("Avatar (image file) '%s' was uploaded by the user '%s'" % (filename, instance.name))
+    log_event(logger, 'avatar_uploaded', filename=filename, user_id=instance.id)
     return os.path.join("avatars", str(uuid.uuid1()) + os.path.splitext(filename)[1])
 
 
@@ -1,15 +1,21 @@
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 
-from applications.views import CurrentUserProfileAPIView, ProfileAPIView, CurrentUserProfileStatusAPIView
+from applications.async_views import AsyncCurrentUserProfileStatusAPIView
+from applications.views import CurrentUserProfileAPIView, ProfileAPIView, CurrentUserProfileHistoryAPIView, \
+    LeaderboardAPIView
 from authentication.views import UserViewSet, CurrentUser, UserGenericViewSet
+from core.async_views import read_path_view
 
 urlpatterns = [
     path('api-token/', obtain_auth_token),
     path('register', UserViewSet.as_view({'post': 'create'})),
     path('users/me', CurrentUser.as_view()),
     path('users/me/profile', CurrentUserProfileAPIView.as_view()),
-    path('users/me/profile/status', CurrentUserProfileStatusAPIView.as_view()),
+    path('users/me/profile/status', read_path_view(AsyncCurrentUserProfileStatusAPIView)),
+    path('users/me/profile/history', CurrentUserProfileHistoryAPIView.as_view()),
+    path('users/leaderboards/<str:board>', LeaderboardAPIView.as_view()),
+    path('users/leaderboards/<str:board>/templates', LeaderboardAPIView.as_view(templates=True)),
     path('users/<int:user_id>', UserGenericViewSet.as_view({'get': 'retrieve'})),
     path('users/<int:user_id>/profile', ProfileAPIView.as_view()),
 ]
@@ -11,6 +11,8 @@ from rest_framework.views import APIView
 from authentication.forms import UserCreationForm, UserChangeForm, LoginForm
 from authentication.models import User
 from authentication.serializers import UserSerializer
+from contents.purge import delete_user
+from core.log import log_event
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +26,7 @@ class UserViewSet(viewsets.ViewSet):
         if form.is_valid():
             instance = form.save()
             serializer = UserSerializer(instance)
-            logger.info("User '%s' has been created" % instance.name)
+            log_event(logger, 'user_created', user_id=instance.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -46,9 +48,9 @@ class CurrentUser(APIView):
     @classmethod
     def post(cls, request):
         if request.data.get("logout") and request.user.is_authenticated:
-            name = request.user.name
+            user_id = request.user.id
             logout(request)
-            logger.info("User '%s' logged out" % name)
+            log_event(logger, 'user_logged_out', user_id=user_id)
             return Response(status=status.HTTP_200_OK)
 
         form = LoginForm(request, data=request.POST or request.data)
@@ -60,7 +62,7 @@ class CurrentUser(APIView):
             if user is not None:
                 login(request, user)
                 token, created = Token.objects.get_or_create(user=user)
-                logger.info("User '%s' logged in" % user.name)
+                log_event(logger, 'user_logged_in', user_id=user.id)
                 if not remember_me:
                     request.session.set_expiry(0)
                 return Response({"token": token.key}, status=status.HTTP_200_OK)
@@ -74,7 +76,7 @@ class CurrentUser(APIView):
             if form.is_valid():
                 instance = form.save()
                 update_session_auth_hash(request, instance)  # Important!
-                logger.info("User '%s' changed password" % request.user.name)
+                log_event(logger, 'user_password_changed', user_id=request.user.id)
                 return Response(form.data, status=status.HTTP_200_OK)
             return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -84,15 +86,15 @@ class CurrentUser(APIView):
         form = UserChangeForm(instance=request.user, data=data, files=request.FILES)
         if form.is_valid():
             form.save()
-            logger.info("User '%s' has been updated" % request.user.name)
+            log_event(logger, 'user_updated', user_id=request.user.id)
             return Response(form.data, status=status.HTTP_200_OK)
         return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @classmethod
     def delete(cls, request):
-        name = request.user.name
-        request.user.delete()
-        logger.info("User '%s' has been deleted" % name)
+        user_id = request.user.id
+        delete_user(request.user)  # Purged in the background (purgedeleted command)
+        log_event(logger, 'user_deleted', user_id=user_id)
         return Response(status=status.HTTP_200_OK)
 
 
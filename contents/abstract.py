@@ -1,6 +1,7 @@
 import typing
 
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_better_admin_arrayfield.models.fields import ArrayField
 
@@ -23,6 +24,10 @@ class DeckMixin(models.Model):
     )
     date_created = models.DateTimeField(_('Date created'), auto_now_add=True)
     date_updated = models.DateTimeField(_('Last updated'), auto_now=True)
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="Marked as deleted, hidden by the default manager until purged (see contents/purge.py)"
+    )
 
     cards = typing.Any  # related_name
 
@@ -36,6 +41,8 @@ class DeckMixin(models.Model):
 
     @property
     def cards_count(self):
+        if hasattr(self, 'cards__count'):  # Annotated by `with_counts()` of list querysets
+            return self.cards__count
         return self.cards.all().count()
 
     def __str__(self):
@@ -57,8 +64,18 @@ class CardMixin(models.Model):
         abstract = True
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        self.deck.save()
-        return super(CardMixin, self).save(force_insert, force_update, using, update_fields)
+        result = super(CardMixin, self).save(force_insert, force_update, using, update_fields)
+        if not getattr(self, '_in_transition', False):  # Reviews (see `card_transition`) do not touch the deck row
+            self.touch_deck()
+        return result
+
+    def touch_deck(self):
+        """
+        Updates only the update date of the deck, the deck instance of the card may be stale
+        (a full save would write back its other fields, e.g. `deleted_at` of a deck deleted meanwhile)
+        """
+        deck_model = self._meta.get_field('deck').related_model
+        deck_model._base_manager.using(self._state.db).filter(pk=self.deck_id).update(date_updated=timezone.now())
 
     def __str__(self):
         return "%s from deck '%s'" % (self.name, self.deck.name)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.urls import reverse
 from django.utils.html import format_html
 from django_better_admin_arrayfield.admin.mixins import DynamicArrayMixin
@@ -20,6 +21,9 @@ class DeckTemplateAdmin(admin.ModelAdmin):
     exclude = ('downloaded', 'liked', 'disliked')
     filter_horizontal = ()
 
+    def get_queryset(self, request):
+        return super(DeckTemplateAdmin, self).get_queryset(request).annotate(Count('cards'))
+
     def cards(self, deck_template):
         return self.links_to_objects(deck_template.cards.all())
 
@@ -83,6 +87,7 @@ class CardTemplateAdmin(admin.ModelAdmin, DynamicArrayMixin):
     """
     inlines = (CardTemplateFrontContentInline, CardTemplateBackContentInline)
     list_display = ('name', 'deck')
+    list_select_related = ('deck',)
     ordering = ('deck',)
     filter_horizontal = ()
 
@@ -105,8 +110,12 @@ class DeckAdmin(admin.ModelAdmin):
     Shows some extra information
     """
     list_display = ('name', 'profile', 'favorite', 'cards_count')
+    list_select_related = ('profile__user',)
     filter_horizontal = ()
 
+    def get_queryset(self, request):
+        return super(DeckAdmin, self).get_queryset(request).annotate(Count('cards'))
+
     def cards(self, deck_template):
         return self.links_to_objects(deck_template.cards.all())
 
@@ -177,6 +186,7 @@ class CardAdmin(admin.ModelAdmin, DynamicArrayMixin):
     """
     inlines = [CardFrontContentInline, CardBackContentInline, ]
     list_display = ('name', 'deck', 'profile', 'state')
+    list_select_related = ('deck__profile__user',)
     ordering = ('deck__profile',)
     filter_horizontal = ()
 
@@ -0,0 +1,87 @@
+import logging
+
+from django.http import Http404
+
+from contents.helpers import ProfileDeckGetHelper, ProfileDeckCardGetHelper
+from contents.serializers import DeckListSerializer, CardListSerializer, CardFrontContentSerializer, \
+    CardBackContentSerializer, DeckListValuesSerializer, CardListValuesSerializer
+from contents.views import ProfileDeckListAPIView, CardListAPIView, NewCardListAPIView, LearningCardListAPIView, \
+    ToReviewCardListAPIView, CardFrontContentAPIView, CardBackContentAPIView
+from core.async_views import AsyncAPIView, AsyncListAPIView
+from core.log import log_event
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncProfileDeckListAPIView(AsyncListAPIView):
+    fallback_view = ProfileDeckListAPIView
+    serializer_class = DeckListSerializer
+    values_serializer_class = DeckListValuesSerializer
+
+    def get_queryset(self):
+        return self.filter_queryset(self.request.user.profile.decks.with_counts().prefetch_related('tags'))
+
+
+class AsyncCardListAPIView(AsyncListAPIView, ProfileDeckGetHelper):
+    fallback_view = CardListAPIView
+    serializer_class = CardListSerializer
+    values_serializer_class = CardListValuesSerializer
+
+    def get_deck_cards(self, deck):
+        return deck.cards.all()
+
+    def get_queryset(self):
+        deck = self.deck(self)
+        self.check_object_permissions(self.request, deck)
+        return self.get_deck_cards(deck)
+
+
+class AsyncNewCardListAPIView(AsyncCardListAPIView):
+    fallback_view = NewCardListAPIView
+
+    def get_deck_cards(self, deck):
+        return deck.get_queued_cards('new_cards')
+
+
+class AsyncLearningCardListAPIView(AsyncCardListAPIView):
+    fallback_view = LearningCardListAPIView
+
+    def get_deck_cards(self, deck):
+        return deck.get_queued_cards('learning_cards')
+
+
+class AsyncToReviewCardListAPIView(AsyncCardListAPIView):
+    fallback_view = ToReviewCardListAPIView
+
+    def get_deck_cards(self, deck):
+        return deck.get_queued_cards('to_review_cards')
+
+
+class AsyncCardFrontContentAPIView(AsyncAPIView, ProfileDeckCardGetHelper):
+    fallback_view = CardFrontContentAPIView
+
+    def get_data(self, request, *args, **kwargs):
+        card = self.card(self)
+        self.check_object_permissions(request, card)
+        content = card.resolved_front_content
+        if content is None:
+            raise Http404
+        data = CardFrontContentSerializer(content, context={'request': request}).data
+        log_event(logger, 'card_opened', user_id=request.user.id, card_id=card.id)
+        card.trigger_opened()
+        return data
+
+
+class AsyncCardBackContentAPIView(AsyncAPIView, ProfileDeckCardGetHelper):
+    fallback_view = CardBackContentAPIView
+
+    def get_data(self, request, *args, **kwargs):
+        card = self.card(self)
+        self.check_object_permissions(request, card)
+        content = card.resolved_back_content
+        if content is None:
+            raise Http404
+        data = CardBackContentSerializer(content, context={'request': request}).data
+        log_event(logger, 'card_viewed', user_id=request.user.id, card_id=card.id)
+        card.perform_action_view()
+        return data
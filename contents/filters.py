@@ -15,12 +15,13 @@ class DeckTemplateFilter(filters.FilterSet):
 
     @classmethod
     def filter(cls, queryset: QuerySet, name, value):
+        # Tags are evaluated to ids, decks can be on the other database (shard) than tags
         if name == 'tag':
-            tags = DeckTag.objects.filter(name__contains=value.lower())
-            return queryset.filter(tags__in=tags)
+            tags = list(DeckTag.objects.filter(name__contains=value.lower()).values_list('id', flat=True))
+            return queryset.filter(tags__in=tags).distinct()
         elif name == 'q':
-            tags = DeckTag.objects.filter(name__contains=value.lower())
-            return queryset.filter(Q(tags__in=tags) | Q(name__contains=value.lower()))
+            tags = list(DeckTag.objects.filter(name__contains=value.lower()).values_list('id', flat=True))
+            return queryset.filter(Q(tags__in=tags) | Q(name__contains=value.lower())).distinct()
 
 
 class DeckFilter(DeckTemplateFilter):
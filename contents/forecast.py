@@ -0,0 +1,92 @@
+"""
+Review workload forecast
+
+`scheduled_forecast` counts cards to review by their `next_date` (one GROUP BY query), overdue cards are due today
+`simulate_reviews` projects the following reviews as well: reviewed cards come back after the interval
+of the active scheduler (contents/schedulers.py), failed cards are learned again the next day
+"""
+import numpy
+from django.db.models import Count
+from django.utils import timezone
+
+from contents.constants import CardState
+from contents.schedulers import get_scheduler
+
+DEFAULT_SUCCESS_RATE = 0.9
+
+
+def scheduled_forecast(cards, days, today=None):
+    """
+    Count of cards to review per day, from today up to `days` days
+    """
+    today = today or timezone.now().date()
+    counts = [0] * days
+    rows = cards.filter(state=CardState.STATE_GOOD, next_date__lte=today + timezone.timedelta(days=days - 1)) \
+        .values('next_date').annotate(due=Count('id')).order_by()
+    for row in rows:
+        counts[max(0, (row['next_date'] - today).days)] += row['due']
+    return counts
+
+
+def simulation_input(cards, today=None):
+    """
+    Arrays of (due day offset, k, success count) of the learning and learned cards
+    Learning cards (state AGAIN or GOOD without successes yet) are due today
+    """
+    today = today or timezone.now().date()
+    rows = cards.filter(state__in=(CardState.STATE_AGAIN, CardState.STATE_GOOD)).order_by() \
+        .annotate(success_count=Count('statistics')).values_list('state', 'next_date', 'k', 'success_count')
+
+    due, k, successes = [], [], []
+    for state, next_date, card_k, success_count in rows.iterator():
+        learning = state == CardState.STATE_AGAIN or not success_count or next_date is None
+        due.append(0 if learning else max(0, (next_date - today).days))
+        k.append(card_k)
+        successes.append(success_count)
+    return numpy.array(due, dtype=numpy.int64), numpy.array(k, dtype=numpy.float64), \
+        numpy.array(successes, dtype=numpy.int64)
+
+
+def simulate_reviews(due, k, successes, days, success_rate=DEFAULT_SUCCESS_RATE, seed=None, scheduler=None):
+    """
+    Projected count of reviews per day, every due card is reviewed on its day and succeeds with `success_rate`
+    Costs O(days * cards), arrays are not modified
+    """
+    scheduler = scheduler or get_scheduler()
+    random = numpy.random.default_rng(seed)
+    due, k, successes = due.copy(), k.copy(), successes.copy()
+    reviews = numpy.zeros(days, dtype=numpy.int64)
+
+    for day in range(days):
+        index = numpy.flatnonzero(due == day)
+        if not index.size:
+            continue
+        reviews[day] = index.size
+
+        succeeded = random.random(index.size) < success_rate
+        passed, failed = index[succeeded], index[~succeeded]
+
+        due[passed] = day + scheduler.intervals(k[passed], successes[passed])
+        successes[passed] += 1
+        k[passed] = scheduler.succeeded_k(k[passed])
+
+        due[failed] = day + 1
+        k[failed] = scheduler.failed_k(k[failed])
+    return reviews
+
+
+def forecast(cards, days, projected=False, success_rate=DEFAULT_SUCCESS_RATE, seed=0):
+    """
+    Forecast response data: per-day scheduled reviews and (optionally) projected reviews
+    """
+    today = timezone.now().date()
+    scheduled = scheduled_forecast(cards, days, today)
+    projection = simulate_reviews(*simulation_input(cards, today), days, success_rate, seed) if projected else None
+
+    result = []
+    for offset in range(days):
+        item = {'date': today + timezone.timedelta(days=offset), 'due': scheduled[offset]}
+        if projection is not None:
+            item['projected'] = int(projection[offset])
+        result.append(item)
+    return {'days': days, 'forecast': result}
@@ -1,15 +1,69 @@
 import logging
 
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from rest_framework import views, status
+from rest_framework import views, status, generics
 from rest_framework.exceptions import APIException
 from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from applications.models import Profile
+from contents.models import Card, Deck
+from core.cache import response_cache
+from core.renderers import FastJSONRenderer
 
 logger = logging.getLogger(__name__)
 
 
+class RequestObjectResolver:
+    """
+    Request-scoped identity map of the current profile, its decks and cards
+    Card is loaded with its deck and both contents in one joined query, objects are memoized for the request
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.decks = {}
+        self.cards = {}
+
+    @classmethod
+    def of(cls, request):
+        request = getattr(request, '_request', request)  # Shared by DRF Request wrappers of the same request
+        resolver = getattr(request, 'object_resolver', None)
+        if resolver is None:
+            resolver = request.object_resolver = cls(request)
+        return resolver
+
+    @property
+    def profile(self):
+        return self.request.user.profile  # Cached on the user instance
+
+    def deck(self, deck_id):
+        deck_id = int(deck_id)
+        if deck_id not in self.decks:
+            self.decks[deck_id] = get_object_or_404(self.profile.decks.all(), id=deck_id)
+        return self.decks[deck_id]
+
+    def card(self, deck_id, card_id):
+        deck_id, card_id = int(deck_id), int(card_id)
+        if (deck_id, card_id) not in self.cards:
+            profile = self.profile
+            queryset = Card.objects.using(profile.decks.all().db) \
+                .select_related('deck', 'front_content', 'back_content') \
+                .filter(deck_id=deck_id, deck__profile_id=profile.id, deck__deleted_at=None)
+            card = get_object_or_404(queryset, id=card_id)
+
+            if deck_id in self.decks:
+                card.deck = self.decks[deck_id]
+            else:
+                Deck._meta.get_field('profile').set_cached_value(card.deck, profile)
+                self.decks[deck_id] = card.deck
+            self.cards[(deck_id, card_id)] = card
+        return self.cards[(deck_id, card_id)]
+
+
 class ProfileCheckHelper(views.APIView):
     class ProfileDoesNotExist(APIException):
         status_code = status.HTTP_400_BAD_REQUEST
@@ -19,23 +73,94 @@ class ProfileCheckHelper(views.APIView):
     def check_permissions(self, request):
         super(ProfileCheckHelper, self).check_permissions(request)
         try:
-            request.user.profile
+            RequestObjectResolver.of(request).profile
         except Profile.DoesNotExist as error:
             logger.error(error)
             raise self.ProfileDoesNotExist()
 
 
+class CardVersionConflictHelper(views.APIView):
+    """
+    Card updated by a concurrent request since it was read (`Card.VersionConflict`) is answered by 409,
+    the client retries with the fresh card
+    """
+
+    class CardVersionConflict(APIException):
+        status_code = status.HTTP_409_CONFLICT
+        default_detail = _('The card was changed by another request, try again.')
+        default_code = 'card_version_conflict'
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Card.VersionConflict):
+            exc = self.CardVersionConflict()
+        return super(CardVersionConflictHelper, self).handle_exception(exc)
+
+
 class ProfileDeckGetHelper:
     @classmethod
     def deck(cls, view):
-        filter_kwargs = {'id': view.kwargs.get('deck_id')}
-        return get_object_or_404(view.request.user.profile.decks.all(), **filter_kwargs)
+        return RequestObjectResolver.of(view.request).deck(view.kwargs.get('deck_id'))
 
 
 class ProfileDeckCardGetHelper(ProfileDeckGetHelper):
     @classmethod
     def card(cls, view):
-        deck = cls.deck(view)
-        view.check_object_permissions(view.request, deck)
-        filter_kwargs = {'id': view.kwargs.get('card_id')}
-        return get_object_or_404(deck.cards.all(), **filter_kwargs)
+        card = RequestObjectResolver.of(view.request).card(view.kwargs.get('deck_id'), view.kwargs.get('card_id'))
+        view.check_object_permissions(view.request, card.deck)
+        return card
+
+
+class ResponseCacheHelper:
+    """
+    Read-through cache for GET responses
+    Cache key embeds the version of (`cache_namespace`, `get_cache_identifier()`), bumped in contents/signals.py
+    """
+    cache_namespace = None
+
+    def get_cache_identifier(self):
+        return None
+
+    def get_cache_parts(self):
+        return self.request.user.pk, self.request.get_full_path()
+
+    def cached_response(self, render):
+        data = response_cache.get_or_set(
+            self.cache_namespace, self.get_cache_identifier(), self.get_cache_parts(), lambda: render().data
+        )
+        return Response(data)
+
+
+class ProfileResponseCacheHelper(ResponseCacheHelper):
+    """
+    Response cache of the profile's own data, daily statistics are part of the key
+    """
+    cache_namespace = 'profile'
+
+    def get_cache_identifier(self):
+        return RequestObjectResolver.of(self.request).profile.id
+
+    def get_cache_parts(self):
+        return super(ProfileResponseCacheHelper, self).get_cache_parts() + (timezone.now().date(),)
+
+
+class ValuesListAPIView(generics.ListAPIView):
+    """
+    Opt-in fast path of GET lists: pages are read and converted by `values_serializer_class` (see core/serializers.py)
+    and rendered by `FastJSONRenderer`, responses are the same as of the serializer class
+    Requests the values serializer does not support (`?expand=`) are served by the serializer class
+    """
+    values_serializer_class = None
+    renderer_classes = [FastJSONRenderer] + [
+        renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if not issubclass(renderer, JSONRenderer)
+    ]
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None or not self.values_serializer_class.supports(request):
+            return super(ValuesListAPIView, self).list(request, *args, **kwargs)
+
+        serializer = self.values_serializer_class(context=self.get_serializer_context())
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
@@ -0,0 +1,50 @@
+"""
+Statistics history of the profile
+
+Days are read from `ProfileDailySummary` rows (rolled up nightly by `rollupstatistics` command)
+with one range query of (profile, date) index, today is not rolled up yet
+Days older than `rollupstatistics --archive-days` (at least MAX_HISTORY_DAYS) are folded into `ProfileYearlySummary`
+rows, ranges reaching them get the archived years separately
+"""
+from django.utils import timezone
+
+HISTORY_DAYS = 365
+MAX_HISTORY_DAYS = 731
+
+
+def streaks(dates, last):
+    """
+    Current streak (consecutive active days ending with `last`, or the day before while `last` goes on)
+    and the longest streak of the sorted active dates
+    """
+    active = set(dates)
+    current = 0
+    day = last if last in active else last - timezone.timedelta(days=1)
+    while day in active:
+        current += 1
+        day -= timezone.timedelta(days=1)
+
+    longest = run = 0
+    previous = None
+    for date in dates:
+        run = run + 1 if previous and (date - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = date
+    return {'current': current, 'longest': longest}
+
+
+def profile_history(summaries, yearly_summaries, date_from, date_to):
+    """
+    History response data: active days (calendar heatmap), totals and streaks of the range
+    `archived` lists the years of the range with archived days, whole years that are not part of the days,
+    totals and streaks
+    """
+    days = list(summaries.filter(date__range=(date_from, date_to)).order_by('date')
+                .values('date', 'reviews', 'learned', 'failed', 'seconds'))
+    totals = {name: sum(day[name] for day in days) for name in ('reviews', 'learned', 'failed', 'seconds')}
+    archived = list(yearly_summaries.filter(year__range=(date_from.year, date_to.year)).order_by('year')
+                    .values('year', 'reviews', 'learned', 'failed', 'seconds', 'active_days'))
+    return {
+        'from': date_from, 'to': date_to, 'days': days, 'totals': totals, 'active_days': len(days),
+        'streak': streaks([day['date'] for day in days], date_to), 'archived': archived,
+    }
@@ -0,0 +1,210 @@
+# Generated by Django 4.0.4 on 2026-10-19 17:55
+
+import contents.models
+import contents.tools
+import contents.validators
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django_better_admin_arrayfield.models.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('applications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Card',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='<Unnamed card>', max_length=128, verbose_name='Name')),
+                ('state', models.SmallIntegerField(choices=[(0, 'Card state: IDLE (None)'), (1, 'Card state: Viewed'), (2, 'Card state: Again'), (3, 'Card state: Good')], default=0)),
+                ('opened_date', models.DateTimeField(blank=True, null=True)),
+                ('next_date', models.DateField(blank=True, null=True)),
+                ('k', models.FloatField(default=2.5, validators=[django.core.validators.MinValueValidator(1.0), django.core.validators.MaxValueValidator(5.0)], verbose_name='Coefficient of re-learning the card')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CardTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='<Unnamed card>', max_length=128, verbose_name='Name')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DeckTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', contents.models.TagField(max_length=16, unique=True, verbose_name='name')),
+            ],
+            options={
+                'verbose_name': 'Deck #TAG',
+                'verbose_name_plural': 'Deck TAGs',
+            },
+        ),
+        migrations.CreateModel(
+            name='DeckTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='<Unnamed deck>', max_length=128, verbose_name='Name')),
+                ('preview', models.ImageField(blank=True, null=True, upload_to=contents.tools.get_deck_preview_path, verbose_name='Preview')),
+                ('date_created', models.DateTimeField(auto_now_add=True, verbose_name='Date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Last updated')),
+                ('shared_link_key', models.CharField(blank=True, max_length=32, null=True, unique=True, validators=[django.core.validators.MinLengthValidator(32)], verbose_name='Shared key')),
+                ('public', models.BooleanField(default=False, help_text='Designates whether this deck template is public.')),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deck_templates', to='applications.profile')),
+                ('disliked', models.ManyToManyField(related_name='disliked_deck_templates', to='applications.profile')),
+                ('downloaded', models.ManyToManyField(related_name='downloaded_deck_templates', to='applications.profile')),
+                ('liked', models.ManyToManyField(related_name='liked_deck_templates', to='applications.profile')),
+                ('shared', models.ManyToManyField(blank=True, related_name='shared_deck_templates', to='applications.profile')),
+                ('tags', models.ManyToManyField(blank=True, help_text='Deck TAGs, used to sort by special tags.', related_name='%(class)s_list', to='contents.decktag')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Deck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='<Unnamed deck>', max_length=128, verbose_name='Name')),
+                ('preview', models.ImageField(blank=True, null=True, upload_to=contents.tools.get_deck_preview_path, verbose_name='Preview')),
+                ('date_created', models.DateTimeField(auto_now_add=True, verbose_name='Date created')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Last updated')),
+                ('favorite', models.BooleanField(default=False)),
+                ('profile', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='decks', to='applications.profile')),
+                ('tags', models.ManyToManyField(blank=True, db_constraint=False, help_text='Deck TAGs, used to sort by special tags.', related_name='deck_list', to='contents.decktag')),
+                ('template', models.ForeignKey(blank=True, db_constraint=False, help_text='To import from existing templates', null=True, on_delete=django.db.models.deletion.SET_NULL, to='contents.decktemplate')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CardTemplateFrontContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=128)),
+                ('helper_text', models.CharField(blank=True, max_length=128, null=True)),
+                ('photo', models.ImageField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, verbose_name='Image file')),
+                ('audio', models.FileField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, validators=[contents.validators.AudioFileMimeValidator()], verbose_name='Audio file')),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='front_content', to='contents.cardtemplate')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CardTemplateBackContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('definition', models.TextField(verbose_name='Definition')),
+                ('examples', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.CharField(max_length=128), blank=True, default=list, size=8)),
+                ('audio', models.FileField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, validators=[contents.validators.AudioFileMimeValidator()], verbose_name='Audio file')),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='back_content', to='contents.cardtemplate')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='cardtemplate',
+            name='deck',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='contents.decktemplate'),
+        ),
+        migrations.CreateModel(
+            name='CardFrontContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=128)),
+                ('helper_text', models.CharField(blank=True, max_length=128, null=True)),
+                ('photo', models.ImageField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, verbose_name='Image file')),
+                ('audio', models.FileField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, validators=[contents.validators.AudioFileMimeValidator()], verbose_name='Audio file')),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='front_content', to='contents.card')),
+                ('template', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contents.cardtemplatefrontcontent')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CardBackContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('definition', models.TextField(verbose_name='Definition')),
+                ('examples', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.CharField(max_length=128), blank=True, default=list, size=8)),
+                ('audio', models.FileField(blank=True, null=True, upload_to=contents.tools.get_card_content_path, validators=[contents.validators.AudioFileMimeValidator()], verbose_name='Audio file')),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='back_content', to='contents.card')),
+                ('template', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contents.cardtemplatebackcontent')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='deck',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='contents.deck'),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='template',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contents.cardtemplate'),
+        ),
+        migrations.CreateModel(
+            name='DeckDailyStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(auto_now_add=True)),
+                ('seconds_gone', models.IntegerField(default=0)),
+                ('cards_failed', models.ManyToManyField(related_name='statistics_to_cards_failed', to='contents.card')),
+                ('cards_learned', models.ManyToManyField(related_name='statistics_to_cards_learned', to='contents.card')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='contents.deck')),
+            ],
+            options={
+                'unique_together': {('deck', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DeckDailyQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('new_cards', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('learning_cards', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('to_review_cards', django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_queues', to='contents.deck')),
+            ],
+            options={
+                'unique_together': {('deck', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CardSucceededStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(auto_now_add=True)),
+                ('date_time', models.DateTimeField(auto_now_add=True)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='contents.card')),
+            ],
+            options={
+                'unique_together': {('card', 'date')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'state', 'next_date'], name='card_deck_state_next_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('state', 3)), fields=['deck', 'opened_date'], name='card_deck_good_opened_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-19 17:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardStudyStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('success', models.BooleanField()),
+                ('action', models.CharField(blank=True, help_text='Performed action, empty if it had no effect', max_length=8)),
+                ('opened_at', models.DateTimeField()),
+                ('viewed_at', models.DateTimeField(blank=True, null=True)),
+                ('answered_at', models.DateTimeField(blank=True, null=True)),
+                ('date_time', models.DateTimeField(auto_now_add=True)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_steps', to='contents.card')),
+            ],
+            options={
+                'unique_together': {('card', 'key')},
+            },
+        ),
+    ]
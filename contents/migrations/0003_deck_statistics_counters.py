@@ -0,0 +1,36 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_relations(apps, schema_editor):
+    DeckDailyStatistics = apps.get_model('contents', 'DeckDailyStatistics')
+    statistics = DeckDailyStatistics.objects.using(schema_editor.connection.alias)
+    for field, counter in (('cards_learned', 'learned_count'), ('cards_failed', 'failed_count')):
+        through = DeckDailyStatistics._meta.get_field(field).remote_field.through
+        counts = through.objects.filter(deckdailystatistics_id=OuterRef('pk')).order_by() \
+            .values('deckdailystatistics_id').annotate(count=Count('id')).values('count')
+        statistics.update(**{counter: Coalesce(Subquery(counts), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0002_card_study_step'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deckdailystatistics',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deckdailystatistics',
+            name='learned_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_relations, migrations.RunPython.noop, hints={'model_name': 'deckdailystatistics'}),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0003_deck_statistics_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented by every update'),
+        ),
+    ]
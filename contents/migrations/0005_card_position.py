@@ -0,0 +1,35 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+POSITION_GAP = 1024
+
+
+def number_positions(apps, schema_editor):
+    """
+    Existing cards keep the order of their creation (ids)
+    """
+    Card = apps.get_model('contents', 'Card')
+    Card.objects.using(schema_editor.connection.alias).update(position=F('id') * POSITION_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0004_card_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='position',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Order of the new cards in the deck'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_positions, migrations.RunPython.noop, hints={'model_name': 'card'}),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'state', 'position'], name='card_deck_state_position_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0002_initial'),
+        ('contents', '0005_card_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileYearlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('learned', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('active_days', models.PositiveSmallIntegerField(default=0)),
+                ('profile', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='yearly_summaries', to='applications.profile')),
+            ],
+            options={
+                'unique_together': {('profile', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfileDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('learned', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('profile', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='applications.profile')),
+            ],
+            options={
+                'unique_together': {('profile', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DeckDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('learned', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('date', models.DateField()),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='contents.deck')),
+            ],
+            options={
+                'unique_together': {('deck', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0006_statistics_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='template_version',
+            field=models.PositiveIntegerField(blank=True, help_text='Version of the template the cards are copied or updated from', null=True),
+        ),
+        migrations.CreateModel(
+            name='DeckTemplateVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('cards', models.JSONField(default=dict, help_text='Digests of the text and media of every card template')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('deck_template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='contents.decktemplate')),
+            ],
+            options={
+                'unique_together': {('deck_template', 'version')},
+            },
+        ),
+    ]
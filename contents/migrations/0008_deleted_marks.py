@@ -0,0 +1,27 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0007_template_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Marked as deleted, hidden by the default manager until purged (see contents/purge.py)', null=True),
+        ),
+        migrations.AddField(
+            model_name='decktemplate',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Marked as deleted, hidden by the default manager until purged (see contents/purge.py)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deck',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='deck_deleted_idx'),
+        ),
+    ]
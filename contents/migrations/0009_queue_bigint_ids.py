@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:35
+
+from django.db import migrations, models
+import django_better_admin_arrayfield.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0008_deleted_marks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deckdailyqueue',
+            name='learning_cards',
+            field=django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AlterField(
+            model_name='deckdailyqueue',
+            name='new_cards',
+            field=django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AlterField(
+            model_name='deckdailyqueue',
+            name='to_review_cards',
+            field=django_better_admin_arrayfield.models.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0009_queue_bigint_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='decktemplate',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='deck_template_deleted_idx'),
+        ),
+    ]
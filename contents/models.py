@@ -1,19 +1,27 @@
+import functools
+import hashlib
+import json
 import logging
+import random
 import typing
 
-from django.core.files.base import ContentFile
-from django.core.files.images import ImageFile
 from django.core.validators import MinLengthValidator, MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Case, When, Count, Q
+from django.db import models, router, transaction, connections, DatabaseError, IntegrityError
+from django.db.models import Count, Max, Min, Sum, Q, F, Func, Value, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django_better_admin_arrayfield.models.fields import ArrayField
 
+from applications.models import Profile
 from contents.abstract import DeckMixin, CardMixin, CardBackContentMixin, CardFrontContentMixin
 from contents.constants import CardState
-from contents.tools import random_string
+from contents.schedulers import get_scheduler
+from contents.tools import random_string, copy_file, delete_file
 from contents.validators import validate_tag_name
-from lldeck.settings import PROFILE_MODEL
+from core.cache import response_cache
+from core.log import log_event
+from lldeck.settings import PROFILE_MODEL, DECK_TAG_MODEL
 
 logger = logging.getLogger(__name__)
 
@@ -45,47 +53,62 @@ class DeckTag(models.Model):
         return "[TAG] %s" % self.name
 
 
+def count_subquery(queryset, field):
+    """
+    Count of related rows as a correlated subquery
+    Used instead of joins when several relations are counted, their joined rows would multiply each other
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*')).values('count')
+    ), 0)
+
+
 class DeckTemplateManager(models.Manager):
     """
     Deck Template Manager allows creating templates from existing decks
     * Moved from managers.py due to circular import
     """
 
+    def get_queryset(self):
+        return super(DeckTemplateManager, self).get_queryset().filter(deleted_at=None)
+
+    def with_counts(self):
+        """
+        Counters of DeckTemplate(List)Serializer annotated in the same query
+        """
+        return self.annotate(
+            cards__count=count_subquery(CardTemplate.objects.all(), 'deck'),
+            downloaded__count=count_subquery(DeckTemplate.downloaded.through.objects.all(), 'decktemplate'),
+            liked__count=count_subquery(DeckTemplate.liked.through.objects.all(), 'decktemplate'),
+            disliked__count=count_subquery(DeckTemplate.disliked.through.objects.all(), 'decktemplate'),
+        )
+
     def popular(self):
-        return self.filter(public=True).annotate(Count('downloaded')).annotate(Count('liked')) \
-            .order_by('-downloaded__count', '-liked__count')
+        return self.with_counts().filter(public=True).order_by('-downloaded__count', '-liked__count')
 
     def create_from_deck(self, deck):
         deck_template = self.create(name=deck.name, creator=deck.profile, preview=deck.preview)
         deck_template.tags.set(deck.tags.all())
-        for card in deck.cards.all() or []:
+        for card in deck.cards.select_related('front_content', 'back_content') or []:
             card_template = CardTemplate.objects.create(name=card.name, deck=deck_template)
-            try:
-                CardTemplateFrontContent.objects.create(
-                    word=card.front_content.word,
-                    helper_text=card.front_content.helper_text,
-                    photo=ImageFile(
-                        ContentFile(
-                            card.front_content.photo.read(),
-                            card.front_content.photo.name)
-                    ) if card.front_content.photo else card.front_content.photo,
-                    audio=ContentFile(
-                        card.front_content.audio.read(),
-                        card.front_content.audio.name
-                    ) if card.front_content.audio else card.front_content.audio,
-                    card=card_template
-                )
-                CardTemplateBackContent.objects.create(
-                    definition=card.back_content.definition,
-                    examples=card.back_content.examples,
-                    audio=ContentFile(
-                        card.back_content.audio.read(),
-                        card.back_content.audio.name
-                    ) if card.back_content.audio else card.back_content.audio,
-                    card=card_template
-                )
-            except Card.front_content.RelatedObjectDoesNotExist or Card.back_content.RelatedObjectDoesNotExist as error:
-                logger.error(error)
+            front_content, back_content = card.resolved_front_content, card.resolved_back_content
+            if front_content is None or back_content is None:
+                logger.error("Card %s does not have content", card.id)
+                continue
+            CardTemplateFrontContent.objects.create(
+                word=front_content.word,
+                helper_text=front_content.helper_text,
+                photo=copy_file(front_content.photo, image=True),
+                audio=copy_file(front_content.audio),
+                card=card_template
+            )
+            CardTemplateBackContent.objects.create(
+                definition=back_content.definition,
+                examples=back_content.examples,
+                audio=copy_file(back_content.audio),
+                card=card_template
+            )
+        DeckTemplateVersion.objects.publish(deck_template)
         return deck_template
 
 
@@ -106,6 +129,15 @@ class DeckTemplate(DeckMixin):
     downloaded = models.ManyToManyField(to=PROFILE_MODEL, related_name="downloaded_deck_templates")
 
     objects = DeckTemplateManager()
+    all_objects = models.Manager()  # With the deleted ones
+
+    class Meta:
+        indexes = [
+            # Deck templates waiting for the purge (purgedeleted command)
+            models.Index(
+                fields=['deleted_at'], name='deck_template_deleted_idx', condition=Q(deleted_at__isnull=False)
+            ),
+        ]
 
     def generate_shared_link_key(self):
         key = random_string()
@@ -132,14 +164,20 @@ class DeckTemplate(DeckMixin):
 
     @property
     def downloads(self):
+        if hasattr(self, 'downloaded__count'):
+            return self.downloaded__count
         return self.downloaded.all().count()
 
     @property
     def likes(self):
+        if hasattr(self, 'liked__count'):
+            return self.liked__count
         return self.liked.all().count()
 
     @property
     def dislikes(self):
+        if hasattr(self, 'disliked__count'):
+            return self.disliked__count
         return self.disliked.all().count()
 
 
@@ -176,21 +214,122 @@ class CardTemplateBackContent(CardBackContentMixin):
         return "Back of card template '%s'" % self.card.name
 
 
+class DeckTemplateVersionManager(models.Manager):
+    # Content of the card template, changes of text and media are told apart
+    TEXT_FIELDS = (
+        'name', 'front_content__word', 'front_content__helper_text', 'back_content__definition',
+        'back_content__examples',
+    )
+    MEDIA_FIELDS = ('front_content__photo', 'front_content__audio', 'back_content__audio')
+
+    @classmethod
+    def digest(cls, values):
+        return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()[:16]
+
+    def snapshot(self, deck_template):
+        """
+        {card template id: [text digest, media digest]} of the current cards of the template, one query
+        """
+        rows = CardTemplate.objects.filter(deck=deck_template).order_by('id') \
+            .values_list('id', *self.TEXT_FIELDS, *self.MEDIA_FIELDS)
+        split = 1 + len(self.TEXT_FIELDS)
+        return {str(row[0]): [self.digest(row[1:split]), self.digest(row[split:])] for row in rows}
+
+    def preview(self, deck_template):
+        """
+        Latest version of the template, an unsaved next version when cards of the template were changed
+        Returns (version, changed), nothing is written
+        """
+        cards = self.snapshot(deck_template)
+        latest = deck_template.versions.order_by('-version').first()
+        if latest and latest.cards == cards:
+            return latest, False
+        return self.model(deck_template=deck_template, version=latest.version + 1 if latest else 1, cards=cards), True
+
+    def publish(self, deck_template):
+        """
+        Latest version of the template, a new version is created when cards of the template were changed
+        The template row is locked, concurrent publishes wait and see the created version
+        Returns (version, created)
+        """
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            DeckTemplate.all_objects.select_for_update().filter(id=deck_template.id).values_list('id').first()
+            version, changed = self.preview(deck_template)
+            if changed:
+                version.save()
+            return version, changed
+
+
+class DeckTemplateVersion(models.Model):
+    """
+    Internal model class for snapshots of the deck template's cards, decks are updated by their difference
+    (see contents/template_versions.py)
+    """
+    deck_template = models.ForeignKey(DeckTemplate, on_delete=models.CASCADE, related_name="versions")
+    version = models.PositiveIntegerField()
+    cards = models.JSONField(default=dict, help_text="Digests of the text and media of every card template")
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = DeckTemplateVersionManager()
+
+    class Meta:
+        unique_together = ('deck_template', 'version')
+
+    def __str__(self):
+        return "Version %s of template deck '%s'" % (self.version, self.deck_template.name)
+
+
+class DeckManager(models.Manager):
+    def get_queryset(self):
+        return super(DeckManager, self).get_queryset().filter(deleted_at=None)
+
+    def with_counts(self):
+        """
+        Cards count annotated in the same query (distinct, tag filters join the other to-many relation)
+        """
+        return self.annotate(Count('cards', distinct=True))
+
+
 class Deck(DeckMixin):
+    """
+    User's (profile's) deck, stored on the profile's shard (see core/sharding.py)
+    Relations to `default` database models are without db constraints
+    """
     template = models.ForeignKey(
         DeckTemplate, on_delete=models.SET_NULL,
         help_text="To import from existing templates",
-        null=True, blank=True
+        null=True, blank=True, db_constraint=False
+    )
+    template_version = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Version of the template the cards are copied or updated from"
     )
     favorite = models.BooleanField(default=False)
-    profile = models.ForeignKey(to=PROFILE_MODEL, on_delete=models.CASCADE, related_name="decks")
+    profile = models.ForeignKey(to=PROFILE_MODEL, on_delete=models.CASCADE, related_name="decks", db_constraint=False)
+    tags = models.ManyToManyField(
+        to=DECK_TAG_MODEL,
+        related_name="deck_list",
+        help_text="Deck TAGs, used to sort by special tags.",
+        blank=True, db_constraint=False
+    )
+
+    objects = DeckManager()
+    all_objects = models.Manager()  # With the deleted ones
+
+    class Meta:
+        indexes = [
+            # Decks waiting for the purge (purgedeleted command)
+            models.Index(fields=['deleted_at'], name='deck_deleted_idx', condition=Q(deleted_at__isnull=False)),
+        ]
 
     @property
     def stat_total_reviews(self):
-        count = 0
-        for stat in self.statistics.all():
-            count += stat.total_reviews
-        return count
+        """
+        Rolled up days (`rollupstatistics` command) are counted from the summaries, the following days from statistics
+        """
+        summary = self.daily_summaries.aggregate(reviews=Sum('reviews'), last=Max('date'))
+        statistics = self.statistics.filter(date__gt=summary['last']) if summary['last'] else self.statistics.all()
+        recent = statistics.aggregate(reviews=Sum(F('learned_count') + F('failed_count')))
+        return (summary['reviews'] or 0) + (recent['reviews'] or 0)
 
     @property
     def stat_learned_today_count(self):
@@ -214,112 +353,243 @@ class Deck(DeckMixin):
 
     @property
     def learning_today_count(self):
+        return self.get_learning_today_cards().count()
+
+    def get_learning_today_cards(self):
+        # Range of the day instead of `opened_date__date`, to use index of `opened_date`
+        day_start = timezone.make_aware(timezone.datetime.combine(timezone.now().date(), timezone.datetime.min.time()))
         return self.cards.filter(
-            opened_date__date=timezone.now().date(),
+            opened_date__gte=day_start, opened_date__lt=day_start + timezone.timedelta(days=1),
             statistics__date=None, state=CardState.STATE_GOOD
-        ).count()
+        )
 
     def get_today_statistics(self):
-        if self.statistics.last() and self.statistics.last().date == timezone.now().date():
-            return self.statistics.last()
+        return self.statistics.filter(date=timezone.now().date()).first()
 
-    def get_daily_new_cards(self):
-        # Configuration to get daily new cards up to max count
+    def get_daily_new_card_ids(self):
+        """
+        Ids of today's new cards up to the aim of the profile, viewed cards first, then idle ones, by position
+        Every state is a bounded range scan of (deck, state, position) index
+        """
         max_count = max(0, self.profile.aim - (
                 self.stat_learned_today_count + self.learning_today_count + self.stat_failed_and_not_learned_today_count
         ))
-        priority_list = [CardState.STATE_VIEWED, CardState.STATE_IDLE]
-        preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(priority_list)])
-
-        # Getting and ordering cards
-        cards = self.cards.filter(state__in=priority_list).order_by(preserved)
-
-        # Up to max count
-        if cards.count() > max_count:
-            cards = cards[:max_count]
+        card_ids = []
+        for state in (CardState.STATE_VIEWED, CardState.STATE_IDLE):
+            if len(card_ids) >= max_count:
+                break
+            card_ids += self.cards.filter(state=state).order_by('position') \
+                .values_list('id', flat=True)[:max_count - len(card_ids)]
+        return card_ids
 
-        return cards
+    def get_daily_new_cards(self):
+        return self.get_ordered_cards(self.get_daily_new_card_ids())
+
+    def get_ordered_cards(self, card_ids):
+        """
+        Cards of the given ids in the order of ids, ordered by `array_position` of the ids array (one parameter)
+        """
+        if not card_ids:
+            return self.cards.none()
+        ids = Cast(Value(list(card_ids)), output_field=ArrayField(models.BigIntegerField()))
+        position = Func(ids, F('id'), function='array_position', output_field=models.IntegerField())
+        return self.cards.filter(id__in=card_ids).order_by(position)
+
+    def next_card_position(self):
+        position = self.cards.aggregate(position=Max('position'))['position']
+        return (position or 0) + Card.POSITION_GAP
+
+    def renumber_card_positions(self):
+        """
+        Spreads positions of the deck's cards by `Card.POSITION_GAP` keeping their order, when there is no gap left
+        """
+        cards = [
+            Card(id=card_id, position=number * Card.POSITION_GAP, version=F('version') + 1)
+            for number, card_id in enumerate(self.cards.order_by('position', 'id').values_list('id', flat=True), 1)
+        ]
+        Card.objects.using(self.cards.all().db).bulk_update(cards, ['position', 'version'], batch_size=1000)
+
+    def shuffle_new_cards(self, seed=None):
+        """
+        Random order of the new (idle and viewed) cards, they exchange their positions
+        Returns count of the shuffled cards
+        """
+        cards = list(self.cards.filter(state__in=(CardState.STATE_IDLE, CardState.STATE_VIEWED))
+                     .values_list('id', 'position'))
+        positions = [position for card_id, position in cards]
+        random.Random(seed).shuffle(positions)
+        with transaction.atomic(using=self.cards.all().db):
+            Card.objects.using(self.cards.all().db).bulk_update([
+                Card(id=card_id, position=position, version=F('version') + 1)
+                for (card_id, previous), position in zip(cards, positions)
+            ], ['position', 'version'], batch_size=1000)
+            self.forget_daily_queue()
+        return len(cards)
 
     @property
     def daily_new_cards_count(self):
-        return self.get_daily_new_cards().count()
+        return len(self.daily_queue.new_cards)
 
     def get_learning_cards(self):
         return self.cards.filter(Q(state=CardState.STATE_AGAIN) | Q(statistics__date=None, state=CardState.STATE_GOOD))
 
     @property
     def learning_cards_count(self):
-        return self.get_learning_cards().count()
+        return len(self.daily_queue.learning_cards)
 
     def get_to_review_cards(self):
         return self.cards.filter(state=CardState.STATE_GOOD, next_date__lte=timezone.now().date())
 
     @property
     def to_review_cards_count(self):
-        return self.get_to_review_cards().count()
+        return len(self.daily_queue.to_review_cards)
+
+    @property
+    def daily_queue(self):
+        """
+        Queue of today, stored by `buildstudyqueues` command, by the first card action or by the first read of the day
+        """
+        queue = getattr(self, '_daily_queue', None)
+        if queue is None or queue.date != timezone.now().date():
+            today = timezone.now().date()
+            queue = self.daily_queues.filter(date=today).first() or DeckDailyQueue.store(self, today)
+            self._daily_queue = queue
+        return queue
+
+    def get_queued_cards(self, queue):
+        """
+        Cards of today's queue ('new_cards', 'learning_cards' or 'to_review_cards') in the queue order
+        """
+        return self.get_ordered_cards(getattr(self.daily_queue, queue))
+
+    def update_daily_queue(self, card):
+        """
+        Moves the card between queues of today after its action, single UPDATE without reading the queue
+        New cards queue only shrinks, it is the daily portion of new cards
+        """
+        memberships = {
+            'new_cards': card.state in (CardState.STATE_IDLE, CardState.STATE_VIEWED),
+            'learning_cards': card.state == CardState.STATE_AGAIN or (
+                    card.state == CardState.STATE_GOOD and not card.statistics.exists()
+            ),
+            'to_review_cards': card.state == CardState.STATE_GOOD and card.next_date is not None
+                               and card.next_date <= timezone.now().date(),
+        }
+        output_field = ArrayField(models.BigIntegerField())
+        updates = {}
+        for queue, member in memberships.items():
+            if queue == 'new_cards' and member:
+                continue
+            updates[queue] = Func(F(queue), Value(card.id), function='array_remove', output_field=output_field)
+            if member:  # (Re)queued at the end
+                updates[queue] = Func(
+                    updates[queue], Value(card.id), function='array_append', output_field=output_field
+                )
+        if not self.daily_queues.filter(date=timezone.now().date()).update(**updates):
+            DeckDailyQueue.materialize(self)  # Not stored yet (or forgotten), built from the updated cards
+        self._daily_queue = None
+
+    def forget_daily_queue(self):
+        self.daily_queues.filter(date=timezone.now().date()).delete()
+        self._daily_queue = None
 
     def trigger_fail_statistics(self, card):
-        self.update_statistics(card).cards_failed.add(card)
+        self.update_statistics(card, failed=True)
 
     def trigger_success_statistics(self, card):
-        self.update_statistics(card).cards_learned.add(card)
+        self.update_statistics(card, learned=True)
 
-    def update_statistics(self, card):
+    def update_statistics(self, card, learned=False, failed=False):
+        """
+        Returns id of today's statistics, the card is added to its learned or failed cards
+        """
         seconds = timezone.now().timestamp() - card.opened_date.timestamp() if card and card.opened_date else 0
-        stat, created = DeckDailyStatistics.objects.get_or_create(deck=self, date=timezone.now().date())
-        stat.seconds_gone += seconds
-        stat.save()
-        return stat
+        stat_id, recorded = DeckDailyStatistics.objects.record(
+            self, timezone.now().date(), seconds,
+            learned=card if learned else None, failed=card if failed else None
+        )
+        if recorded:  # Profiles are on `default`, counted once the review is committed on the shard
+            transaction.on_commit(
+                lambda: Profile.objects.record_reviews(self.profile_id, count=recorded),
+                using=router.db_for_write(DeckDailyStatistics, instance=self)
+            )
+        return stat_id
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None, use_template=False):
         if self.template and not self.pk:
             use_template = True
-
+            self.template_version = DeckTemplateVersion.objects.publish(self.template)[0].version
+
+        if update_fields is None and not self._state.adding and not force_insert:
+            # The mark of deletion is written only by `delete_deck`, a stale instance does not restore the deck
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'deleted_at'
+            ]
         super(Deck, self).save(force_insert, force_update, using, update_fields)
 
         if use_template:
             self.preview = self.template.preview
             self.tags.set(self.template.tags.all())
             self.template.downloaded.add(self.profile)
-            for card_template in self.template.cards.all() or []:
-                card = Card.objects.create(name=card_template.name, template=card_template, deck=self)
-                try:
-                    CardFrontContent.objects.create(
-                        template=card_template.front_content,
-                        word=card_template.front_content.word,
-                        helper_text=card_template.front_content.helper_text,
-                        photo=ImageFile(
-                            ContentFile(
-                                card_template.front_content.photo.read(),
-                                card_template.front_content.photo.name
-                            )
-                        ) if card_template.front_content.photo else card_template.front_content.photo,
-                        audio=ContentFile(
-                            card_template.front_content.audio.read(),
-                            card_template.front_content.audio.name
-                        ) if card_template.front_content.audio else card_template.front_content.audio,
-                        card=card
-                    )
-                    CardBackContent.objects.create(
-                        template=card_template.back_content,
-                        definition=card_template.back_content.definition,
-                        examples=card_template.back_content.examples,
-                        audio=ContentFile(
-                            card_template.back_content.audio.read(),
-                            card_template.back_content.audio.name
-                        ) if card_template.back_content.audio else card_template.back_content.audio,
-                        card=card
-                    )
-                except CardTemplate.front_content.RelatedObjectDoesNotExist as error:
-                    logger.error(error)
-                except CardTemplate.back_content.RelatedObjectDoesNotExist as error:
-                    logger.error(error)
+            # Content is shared with the card templates until the cards are edited (see `Card.get_content`)
+            Card.objects.using(self.cards.all().db).bulk_create([
+                Card(deck=self, name=card_template.name, template=card_template, position=number * Card.POSITION_GAP)
+                for number, card_template in enumerate(self.template.cards.all() or [], 1)
+            ])
+            response_cache.bump('profile', self.profile_id, using=self._state.db)  # Bulk create does not send signals
+
+
+class DeckDailyStatisticsManager(models.Manager):
+    def record(self, deck, date, seconds=0, learned=None, failed=None):
+        """
+        Adds seconds and the learned / failed card to the deck's statistics of the date, the row is never read first:
+        INSERT ... ON CONFLICT DO UPDATE creates the row or increments its seconds (the row stays locked until
+        the end of the transaction), the relation is inserted with ON CONFLICT DO NOTHING and the counter
+        is incremented by the inserted relations only, concurrent records of the same day can not lose updates
+        Raw queries do not send signals, callers save the card afterwards (profile cache is bumped by its signal)
+        Returns (id of the statistics, count of the inserted learned / failed relations)
+        """
+        using = router.db_for_write(self.model, instance=deck)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (deck_id, date, seconds_gone, learned_count, failed_count) '
+                'VALUES (%s, %s, %s, 0, 0) ON CONFLICT (deck_id, date) '
+                'DO UPDATE SET seconds_gone = {table}.seconds_gone + EXCLUDED.seconds_gone '
+                'RETURNING id'.format(table=table),
+                [deck.pk, date, int(seconds)]
+            )
+            stat_id = cursor.fetchone()[0]
+
+            inserted = 0
+            for name, counter, card in (('cards_learned', 'learned_count', learned),
+                                        ('cards_failed', 'failed_count', failed)):
+                if card is None:
+                    continue
+                field = self.model._meta.get_field(name)
+                cursor.execute(
+                    'WITH inserted AS ('
+                    'INSERT INTO {through} ({source}, {target}) VALUES (%s, %s) ON CONFLICT DO NOTHING RETURNING 1'
+                    ') UPDATE {table} SET {counter} = {counter} + (SELECT COUNT(*) FROM inserted) WHERE id = %s '
+                    'RETURNING (SELECT COUNT(*) FROM inserted)'.format(
+                        through=quote(field.remote_field.through._meta.db_table), source=quote(field.m2m_column_name()),
+                        target=quote(field.m2m_reverse_name()), table=table, counter=quote(counter)
+                    ),
+                    [stat_id, card.pk, stat_id]
+                )
+                inserted += cursor.fetchone()[0]
+        return stat_id, inserted
 
 
 class DeckDailyStatistics(models.Model):
     """
     Internal model class for User's deck's statistics
     Every query related deck triggered and recorded here
+    Counters of the learned / failed cards relations are kept in `learned_count` / `failed_count`
     """
     deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="statistics")
 
@@ -327,9 +597,13 @@ class DeckDailyStatistics(models.Model):
     seconds_gone = models.IntegerField(default=0)
     cards_learned = models.ManyToManyField(to="contents.Card", related_name="statistics_to_cards_learned")
     cards_failed = models.ManyToManyField(to="contents.Card", related_name="statistics_to_cards_failed")
+    learned_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    objects = DeckDailyStatisticsManager()
 
     class Meta:
-        unique_together = ('deck', 'date')
+        unique_together = ('deck', 'date')  # Index of (deck, date) used by today's statistics lookups
 
     @property
     def cards_not_yet_learned_but_failed_count(self):
@@ -337,20 +611,159 @@ class DeckDailyStatistics(models.Model):
 
     @property
     def cards_learned_count(self):
-        return self.cards_learned.all().count()
+        return self.learned_count
 
     @property
     def cards_failed_count(self):
-        return self.cards_failed.all().count()
+        return self.failed_count
 
     @property
     def total_reviews(self):
         return self.cards_learned_count + self.cards_failed_count
 
 
+class StatisticsSummary(models.Model):
+    """
+    Abstract Base class of statistics rolled up by `rollupstatistics` command
+    """
+    reviews = models.PositiveIntegerField(default=0)
+    learned = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    seconds = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DeckDailySummary(StatisticsSummary):
+    """
+    Internal model class for the deck's day of statistics without relations to cards
+    """
+    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="daily_summaries")
+    date = models.DateField()
+
+    class Meta:
+        unique_together = ('deck', 'date')
+
+
+class ProfileDailySummary(StatisticsSummary):
+    """
+    Internal model class for the profile's day of statistics (all decks), history and heatmap of the profile
+    """
+    profile = models.ForeignKey(
+        to=PROFILE_MODEL, on_delete=models.CASCADE, related_name="daily_summaries", db_constraint=False
+    )
+    date = models.DateField()
+
+    class Meta:
+        unique_together = ('profile', 'date')  # Index of (profile, date) used by history range queries
+
+
+class ProfileYearlySummary(StatisticsSummary):
+    """
+    Internal model class for the profile's archived year of daily summaries
+    """
+    profile = models.ForeignKey(
+        to=PROFILE_MODEL, on_delete=models.CASCADE, related_name="yearly_summaries", db_constraint=False
+    )
+    year = models.PositiveSmallIntegerField()
+    active_days = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('profile', 'year')
+
+
+class DeckDailyQueue(models.Model):
+    """
+    Internal model class for deck's study queues of the day, ordered lists of card ids
+    Stored by `buildstudyqueues` command, the first card action or the first read of the day, updated by card actions
+    """
+    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="daily_queues")
+
+    date = models.DateField()
+    new_cards = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    learning_cards = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    to_review_cards = ArrayField(models.BigIntegerField(), default=list, blank=True)
+
+    class Meta:
+        unique_together = ('deck', 'date')
+
+    @classmethod
+    def build(cls, deck, date):
+        """
+        Queues of the date from the current cards of the deck, not saved
+        """
+        return cls(
+            deck=deck, date=date, new_cards=deck.get_daily_new_card_ids(),
+            learning_cards=list(deck.get_learning_cards().order_by('opened_date').values_list('id', flat=True)),
+            to_review_cards=list(deck.get_to_review_cards().order_by('next_date').values_list('id', flat=True)),
+        )
+
+    @classmethod
+    def store(cls, deck, date):
+        """
+        Stores the queue of the date built by a read, INSERT ... ON CONFLICT DO NOTHING: concurrent reads
+        do not fail, the first stored queue is kept (queues built at the same time are equal)
+        """
+        queue = cls.build(deck, date)
+        queues = cls.objects.db_manager(router.db_for_write(cls, instance=deck))
+        queues.filter(deck_id=deck.id, date__lt=date).delete()
+        queues.bulk_create([queue], ignore_conflicts=True)
+        return queue
+
+    @classmethod
+    def materialize(cls, deck, rebuild=False):
+        """
+        Stores the queue of today built from the current cards, replacing the stored one (card actions,
+        `buildstudyqueues` command)
+        """
+        today = timezone.now().date()
+        queue = None if rebuild else deck.daily_queues.filter(date=today).first()
+        if queue is None:
+            built = cls.build(deck, today)
+            deck.daily_queues.filter(date__lt=today).delete()
+            queue, created = deck.daily_queues.update_or_create(date=today, defaults={
+                'new_cards': built.new_cards, 'learning_cards': built.learning_cards,
+                'to_review_cards': built.to_review_cards,
+            })
+        return queue
+
+
+def card_transition(method):
+    """
+    Card state transition: runs in a transaction and is retried on the fresh card on version conflicts
+    (up to `Card.TRANSITION_RETRIES` times), the card row is never locked for the read of the transition
+    Nested transitions are retried by the outermost one
+    """
+
+    @functools.wraps(method)
+    def wrapper(card, *args, **kwargs):
+        if getattr(card, '_in_transition', False):
+            return method(card, *args, **kwargs)
+
+        attempt = 0
+        card._in_transition = True
+        try:
+            while True:
+                try:
+                    with transaction.atomic(using=router.db_for_write(Card, instance=card)):
+                        return method(card, *args, **kwargs)
+                except Card.VersionConflict:
+                    attempt += 1
+                    log_event(logger, 'card_version_conflict', card_id=card.id, attempt=attempt,
+                              transition=method.__name__)
+                    if attempt > Card.TRANSITION_RETRIES:
+                        raise
+                    card.refresh_from_db(fields=Card.TRANSITION_FIELDS)
+        finally:
+            card._in_transition = False
+
+    return wrapper
+
+
 class Card(CardMixin):
     deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="cards")
-    template = models.ForeignKey(CardTemplate, on_delete=models.SET_NULL, null=True, blank=True)
+    template = models.ForeignKey(CardTemplate, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
     state = models.SmallIntegerField(choices=CardState.CARD_STATES, default=CardState.STATE_IDLE)
 
     opened_date = models.DateTimeField(null=True, blank=True)
@@ -359,6 +772,30 @@ class Card(CardMixin):
         _('Coefficient of re-learning the card'), default=2.5,
         validators=[MinValueValidator(1.0), MaxValueValidator(5.0)]
     )
+    version = models.PositiveIntegerField(default=0, editable=False, help_text="Incremented by every update")
+    position = models.BigIntegerField(editable=False, help_text="Order of the new cards in the deck")
+
+    TRANSITION_RETRIES = 3
+    TRANSITION_FIELDS = ('state', 'k', 'opened_date', 'next_date', 'position', 'version')
+    POSITION_GAP = 1024  # Cards are moved between neighbours without renumbering until the gap is exhausted
+
+    class VersionConflict(DatabaseError):
+        """
+        The card was updated by another request since it was read
+        """
+
+    class Meta:
+        indexes = [
+            # Study queues by state, cards to review (next_date <= today) and forecast of the deck
+            models.Index(fields=['deck', 'state', 'next_date'], name='card_deck_state_next_date_idx'),
+            # New cards of the day in their order (get_daily_new_card_ids)
+            models.Index(fields=['deck', 'state', 'position'], name='card_deck_state_position_idx'),
+            # Cards opened today and learned without successes yet (learning_today_count)
+            models.Index(
+                fields=['deck', 'opened_date'], name='card_deck_good_opened_idx',
+                condition=Q(state=CardState.STATE_GOOD)
+            ),
+        ]
 
     @property
     def success_count(self):
@@ -366,55 +803,219 @@ class Card(CardMixin):
 
     @property
     def last_success_date(self):
-        if self.statistics.last():
-            return self.statistics.last().date
+        return self.statistics.order_by('-date').values_list('date', flat=True).first()
 
     @property
     def is_succeeded_today(self):
-        return self.statistics.last() and self.statistics.last().date == timezone.now().date()
+        return self.statistics.filter(date=timezone.now().date()).exists()
 
     @property
     def is_opened_today(self):
         if self.opened_date:
             return self.opened_date.date() == timezone.now().date()
 
+    def get_content(self, side):
+        """
+        Content of the side ('front_content' or 'back_content'): the own content of the card, otherwise the content
+        of its card template which is shared until the first edit (copy-on-write, see `materialize_content`)
+        None without both
+        """
+        content = getattr(self, side, None)
+        if content is None and self.template_id is not None:
+            shared = self.__dict__.setdefault('_shared_contents', {})
+            if side not in shared:
+                model = CardTemplateFrontContent if side == 'front_content' else CardTemplateBackContent
+                shared[side] = model.objects.filter(card_id=self.template_id).first()
+            content = shared[side]
+        return content
+
+    @property
+    def resolved_front_content(self):
+        return self.get_content('front_content')
+
+    @property
+    def resolved_back_content(self):
+        return self.get_content('back_content')
+
+    @classmethod
+    def prefetch_contents(cls, cards, sides=('front_content', 'back_content')):
+        """
+        Reads contents of the sides for all the cards (of one shard) by two queries per side, `get_content`
+        of the cards does not query then
+        """
+        if not cards:
+            return
+        db = cards[0]._state.db
+        for side in sides:
+            rel = cls._meta.get_field(side)
+            own = {
+                content.card_id: content
+                for content in rel.related_model.objects.using(db).filter(card_id__in=[card.id for card in cards])
+            }
+            template_ids = {card.template_id for card in cards if card.id not in own and card.template_id is not None}
+            model = CardTemplateFrontContent if side == 'front_content' else CardTemplateBackContent
+            shared = {content.card_id: content for content in model.objects.filter(card_id__in=template_ids)} \
+                if template_ids else {}
+
+            for card in cards:
+                content = own.get(card.id)
+                rel.set_cached_value(card, content)
+                if content is not None:
+                    rel.field.set_cached_value(content, card)
+                elif card.template_id is not None:
+                    card.__dict__.setdefault('_shared_contents', {})[side] = shared.get(card.template_id)
+
+    def materialize_content(self, side, deleted=None):
+        """
+        Own content of the side, the shared content of the card template is copied (with its files) on the first write
+        `deleted` is the shared content being deleted, the copy is not linked to it
+        """
+        content = getattr(self, side, None)
+        shared = deleted or self.get_content(side)
+        if content is not None or shared is None:
+            return content
+
+        if side == 'front_content':
+            content = CardFrontContent(
+                card=self, template=None if deleted else shared, word=shared.word,
+                helper_text=shared.helper_text, photo=copy_file(shared.photo, image=True),
+                audio=copy_file(shared.audio),
+            )
+        else:
+            content = CardBackContent(
+                card=self, template=None if deleted else shared, definition=shared.definition,
+                examples=list(shared.examples), audio=copy_file(shared.audio),
+            )
+        try:
+            with transaction.atomic(using=self._state.db):
+                content.save_base(using=self._state.db)  # The card itself is not changed
+        except IntegrityError:  # Copied by a concurrent request
+            for field_file in (getattr(content, 'photo', None), content.audio):
+                if field_file:
+                    delete_file(field_file)
+            content = type(content).objects.using(self._state.db).get(card_id=self.id)
+            content.card = self
+        return content
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if self.position is None:  # Appended to the end of the deck
+            self.position = self.deck.next_card_position()
+        super(Card, self).save(force_insert, force_update, using, update_fields)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        Optimistic concurrency: UPDATE ... SET version = version + 1 WHERE id = %s AND version = <read version>
+        Raises `Card.VersionConflict` when the row exists with another version
+        """
+        version_field = self._meta.get_field('version')
+        values = [value for value in values if value[0] != version_field]
+        values.append((version_field, None, F('version') + 1))
+        updated = super(Card, self)._do_update(
+            base_qs.filter(version=self.version), using, pk_val, values, update_fields, forced_update
+        )
+        if updated:
+            self.version += 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise Card.VersionConflict("Card %s was updated since version %s" % (pk_val, self.version))
+        return updated
+
     def k_increase(self, decrease=False, commit=True):
-        if decrease and self.k > 1.0:
-            self.k -= 0.1
-        elif not decrease and self.k < 5.0:
-            self.k += 0.1
+        scheduler = get_scheduler()
+        self.k = float(scheduler.failed_k(self.k) if decrease else scheduler.succeeded_k(self.k))
 
         if commit:
-            self.save()
+            self.save(update_fields=['k'])
 
+    @card_transition
     def trigger_opened(self):
         self.opened_date = timezone.now()
-        self.save()
+        self.save(update_fields=['opened_date'])
 
+    @card_transition
     def perform_action_view(self):
         if self.state == CardState.STATE_IDLE and self.is_opened_today:
             self.state = CardState.STATE_VIEWED
-            self.save()
+            self.save(update_fields=['state'])
             return True
 
+    @card_transition
     def perform_action_success(self):
         if not self.is_succeeded_today and self.is_opened_today and self.state == CardState.STATE_GOOD:
-            CardSucceededStatistics.objects.get_or_create(card=self, date=timezone.now().date())
+            self.statistics.get_or_create(date=timezone.now().date())
+            self.deck.update_daily_queue(self)
             return True
         elif self.state != CardState.STATE_IDLE:
             self.state = CardState.STATE_GOOD
-            self.save()
+            self.save(update_fields=['state'])
+            self.deck.update_daily_queue(self)
             return True
 
+    @card_transition
     def perform_action_fail(self):
         if not self.is_succeeded_today and self.is_opened_today and self.state != CardState.STATE_IDLE:
             self.deck.trigger_fail_statistics(self)
             self.state = CardState.STATE_AGAIN
             self.k_increase(decrease=True, commit=False)
-            self.k_increase(decrease=True, commit=False)
-            self.save()
+            self.save(update_fields=['state', 'k'])
+            self.deck.update_daily_queue(self)
             return True
 
+    @card_transition
+    def move(self, after=None):
+        """
+        Places the card right after the given card of the same deck (to the beginning with None)
+        The position is taken between the neighbours, positions of the deck are renumbered only without a gap
+        """
+        cards = self.deck.cards.exclude(id=self.id)
+        while True:
+            if after is not None:  # Read in every attempt, a retried transition or a renumbering moved it meanwhile
+                after.refresh_from_db(fields=['position'])
+            lower = after.position if after else None
+            upper = (cards.filter(position__gt=lower) if after else cards).aggregate(position=Min('position'))
+            upper = upper['position']
+            if lower is None:
+                position = upper - Card.POSITION_GAP if upper is not None else Card.POSITION_GAP
+            elif upper is None:
+                position = lower + Card.POSITION_GAP
+            elif upper - lower > 1:
+                position = (lower + upper) // 2
+            else:
+                self.deck.renumber_card_positions()
+                self.refresh_from_db(fields=['position', 'version'])
+                continue
+            break
+
+        self.position = position
+        self.save(update_fields=['position'])
+        self.deck.forget_daily_queue()
+
+    @card_transition
+    def perform_study_step(self, key, success, opened_at=None, viewed_at=None, answered_at=None):
+        """
+        Open, view and answer of the card in one transaction, recorded with the client's idempotency key
+        Returns (step, created), retries of the same key return the recorded step without changes
+        """
+        now = timezone.now()
+        opened_at = opened_at if opened_at and opened_at <= now and opened_at.date() == now.date() else now
+
+        step, created = self.study_steps.get_or_create(key=key, defaults={
+            'success': success, 'opened_at': opened_at, 'viewed_at': viewed_at, 'answered_at': answered_at,
+        })
+        if not created:
+            return step, False
+
+        self.opened_date = opened_at
+        if self.state == CardState.STATE_IDLE:
+            self.state = CardState.STATE_VIEWED
+        done = self.perform_action_success() if success else self.perform_action_fail()
+        # Saved after the action, rows are locked in the order of actions: statistics, deck, card
+        self.save(update_fields=['opened_date'] if done else ['opened_date', 'state'])
+
+        if done:
+            step.action = CardStudyStep.ACTION_SUCCESS if success else CardStudyStep.ACTION_FAIL
+            step.save(update_fields=['action'])
+        return step, True
+
 
 class CardSucceededStatistics(models.Model):
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="statistics")
@@ -423,21 +1024,49 @@ class CardSucceededStatistics(models.Model):
     date_time = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('card', 'date')
+        unique_together = ('card', 'date')  # Index of (card, date) used by success lookups of the card
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         if not self.pk:
-            self.card.next_date = self.date + timezone.timedelta(days=int(self.card.k ** self.card.success_count))
+            interval = get_scheduler().interval(self.card.k, self.card.success_count)
+            self.card.next_date = self.date + timezone.timedelta(days=interval)
             self.card.deck.trigger_success_statistics(self.card)
-            self.card.k_increase()
+            self.card.k_increase(commit=False)
+            self.card.save(update_fields=['k', 'next_date'])
         super(CardSucceededStatistics, self).save(force_insert, force_update, using, update_fields)
 
 
+class CardStudyStep(models.Model):
+    """
+    Internal model class for study steps (open, view and answer of the card) submitted at once
+    Client's idempotency key is unique per card, retried submissions are not counted again
+    """
+    ACTION_SUCCESS = 'success'
+    ACTION_FAIL = 'fail'
+
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="study_steps")
+    key = models.CharField(max_length=64)
+
+    success = models.BooleanField()
+    action = models.CharField(max_length=8, blank=True, help_text="Performed action, empty if it had no effect")
+    opened_at = models.DateTimeField()
+    viewed_at = models.DateTimeField(null=True, blank=True)
+    answered_at = models.DateTimeField(null=True, blank=True)
+    date_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('card', 'key')
+
+
 class CardFrontContent(CardFrontContentMixin):
-    template = models.ForeignKey(CardTemplateFrontContent, on_delete=models.SET_NULL, null=True, blank=True)
+    template = models.ForeignKey(
+        CardTemplateFrontContent, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
     card = models.OneToOneField(Card, related_name="front_content", on_delete=models.CASCADE)
 
 
 class CardBackContent(CardBackContentMixin):
-    template = models.ForeignKey(CardTemplateBackContent, on_delete=models.SET_NULL, null=True, blank=True)
+    template = models.ForeignKey(
+        CardTemplateBackContent, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
     card = models.OneToOneField(Card, related_name="back_content", on_delete=models.CASCADE)
@@ -0,0 +1,173 @@
+"""
+Deletion of decks, deck templates and accounts in the background
+
+Deleting only marks the deck, the deck template or the user (`deleted_at`), default managers hide marked rows at once
+`purgedeleted` command (background worker) deletes them later in bounded batches: rows are deleted by raw DELETE
+queries without collecting the cascade in memory and without signals, every batch in its own short transaction,
+content files of a batch are deleted after it is committed
+"""
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from applications.models import Profile
+from contents.models import Deck, DeckTemplate, CardTemplate, Card, CardFrontContent, CardBackContent, \
+    CardSucceededStatistics, CardStudyStep, DeckDailyStatistics, DeckDailyQueue, DeckDailySummary, \
+    ProfileDailySummary, ProfileYearlySummary
+from core.cache import response_cache
+from core.log import log_event
+from core.sharding import shards
+
+logger = logging.getLogger(__name__)
+
+# Rows referencing cards: (model, card field, file fields)
+CARD_ROWS = (
+    (CardStudyStep, 'card', ()),
+    (CardSucceededStatistics, 'card', ()),
+    (DeckDailyStatistics.cards_learned.through, 'card', ()),
+    (DeckDailyStatistics.cards_failed.through, 'card', ()),
+    (CardFrontContent, 'card', ('photo', 'audio')),
+    (CardBackContent, 'card', ('audio',)),
+)
+
+STATISTICS_ROWS = (
+    (DeckDailyStatistics.cards_learned.through, 'deckdailystatistics', ()),
+    (DeckDailyStatistics.cards_failed.through, 'deckdailystatistics', ()),
+)
+
+
+def delete_deck(deck):
+    """
+    Only the mark is written, the deck instance may be stale
+    """
+    deck.deleted_at = timezone.now()
+    Deck.all_objects.using(deck._state.db).filter(id=deck.id).update(deleted_at=deck.deleted_at)
+    response_cache.bump('profile', deck.profile_id, using=deck._state.db)  # Bulk updates do not send signals
+
+
+def delete_deck_template(deck_template):
+    """
+    Cards of the decks downloaded from the template keep its content until the purge (see `purge_deck_template`)
+    """
+    deck_template.deleted_at = timezone.now()
+    DeckTemplate.all_objects.filter(id=deck_template.id).update(deleted_at=deck_template.deleted_at)
+    response_cache.bump('deck_template', deck_template.id)  # Bulk updates do not send signals
+    response_cache.bump('public_deck_templates')
+
+
+def delete_user(user):
+    """
+    Unique fields are released at once (the email can be registered again), tokens are revoked
+    and the profile is hidden from leaderboards
+    """
+    now = timezone.now()
+    profile = Profile.objects.filter(user_id=user.id).first()
+    with transaction.atomic():
+        user.deleted_at, user.is_active = now, False
+        user.email, user.phone_number = 'deleted-%s@deleted.invalid' % user.id, None
+        user.save(update_fields=['deleted_at', 'is_active', 'email', 'phone_number'])
+        Token.objects.filter(user_id=user.id).delete()
+        if profile is not None:
+            profile.is_private = True
+            profile.save(update_fields=['is_private'])
+            deck_template_ids = list(profile.deck_templates.values_list('id', flat=True))
+            DeckTemplate.all_objects.filter(id__in=deck_template_ids).update(deleted_at=now)
+
+    if profile is not None:
+        profile.decks.update(deleted_at=now)
+        for deck_template_id in deck_template_ids:  # Bulk updates do not send signals
+            response_cache.bump('deck_template', deck_template_id)
+        response_cache.bump('public_deck_templates')
+        response_cache.bump('profile', profile.id)
+
+
+def delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError as error:
+            logger.warning("File %s is not deleted: %s", name, error)
+
+
+def delete_in_batches(queryset, batch_size, related=()):
+    """
+    Deletes rows of the queryset by batches of primary keys, rows of the `related` (model, field, file fields)
+    referencing them are deleted first in the same transaction, their files after the commit
+    Returns count of the deleted rows
+    """
+    db, model = queryset.db, queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+
+        names = []
+        with transaction.atomic(using=db):
+            for related_model, field, file_fields in related:
+                rows = related_model._base_manager.using(db).filter(**{'%s__in' % field: ids})
+                if file_fields:
+                    names += [name for values in rows.values_list(*file_fields) for name in values if name]
+                rows._raw_delete(db)
+            model._base_manager.using(db).filter(pk__in=ids)._raw_delete(db)
+        delete_files(names)
+        deleted += len(ids)
+
+
+def purge_deck(deck, batch_size=1000):
+    """
+    Returns count of the deleted cards
+    """
+    db = deck._state.db
+    cards = delete_in_batches(Card.objects.using(db).filter(deck_id=deck.id), batch_size, CARD_ROWS)
+    delete_in_batches(DeckDailyStatistics.objects.using(db).filter(deck_id=deck.id), batch_size, STATISTICS_ROWS)
+    delete_in_batches(DeckDailyQueue.objects.using(db).filter(deck_id=deck.id), batch_size)
+    delete_in_batches(DeckDailySummary.objects.using(db).filter(deck_id=deck.id), batch_size)
+    with transaction.atomic(using=db):
+        Deck.tags.through.objects.using(db).filter(deck_id=deck.id)._raw_delete(db)
+        Deck.all_objects.using(db).filter(id=deck.id)._raw_delete(db)
+
+    # Remaining (empty) directories of the cards, files of the deck live under contents/deck-<id>/
+    shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'contents', 'deck-%s' % deck.id), ignore_errors=True)
+    log_event(logger, 'deck_purged', deck_id=deck.id, profile_id=deck.profile_id, cards=cards)
+    return cards
+
+
+def purge_deck_template(deck_template, batch_size=1000):
+    """
+    Card templates are deleted with signals: cards sharing their content get private copies (see `Card.get_content`)
+    """
+    deck_template_id = deck_template.id
+    card_templates = CardTemplate.objects.filter(deck_id=deck_template_id)
+    while True:
+        ids = list(card_templates.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        CardTemplate.objects.filter(id__in=ids).delete()
+    deck_template.delete()
+    log_event(logger, 'deck_template_purged', deck_template_id=deck_template_id)
+
+
+def purge_user(user, batch_size=1000):
+    """
+    Decks, statistics and templates are purged by batches, the rest of the account (profile, tokens, likes)
+    is deleted by the regular cascade
+    """
+    user_id = user.id
+    profile = Profile.objects.filter(user_id=user_id).first()
+    if profile is not None:
+        shard = profile.shard or shards()[0]
+        for deck in Deck.all_objects.using(shard).filter(profile_id=profile.id).order_by('id'):
+            purge_deck(deck, batch_size)
+        delete_in_batches(ProfileDailySummary.objects.using(shard).filter(profile_id=profile.id), batch_size)
+        delete_in_batches(ProfileYearlySummary.objects.using(shard).filter(profile_id=profile.id), batch_size)
+        for deck_template in DeckTemplate.all_objects.filter(creator_id=profile.id).order_by('id'):
+            purge_deck_template(deck_template, batch_size)
+    user.delete()
+    log_event(logger, 'user_purged', user_id=user_id)
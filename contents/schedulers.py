@@ -0,0 +1,79 @@
+"""
+Card scheduling algorithms
+
+Scheduler computes the interval (days) until the next review after a success and the new coefficient `k` of a card
+Methods accept numbers and NumPy arrays, so the same formulas reschedule cards one by one (card actions)
+and in vectorized batches (`reschedule` command)
+The active scheduler is `CARD_SCHEDULER` setting
+"""
+from functools import lru_cache
+
+import numpy
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+MAX_INTERVAL = 36500  # days
+
+
+class BaseScheduler:
+    min_k = 1.0
+    max_k = 5.0
+
+    def intervals(self, k, success_count):
+        """
+        Days until the next review after a success, `success_count` does not include this success
+        """
+        raise NotImplementedError
+
+    def succeeded_k(self, k):
+        raise NotImplementedError
+
+    def failed_k(self, k):
+        raise NotImplementedError
+
+    def interval(self, k, success_count):
+        return int(self.intervals(k, success_count))
+
+    def clip(self, intervals):
+        return numpy.clip(numpy.floor(intervals), 1, MAX_INTERVAL).astype(numpy.int64)
+
+
+class DefaultScheduler(BaseScheduler):
+    """
+    `k ** success_count` days, `k` grows by 0.1 after a success and drops by 0.2 after a fail
+    """
+
+    def intervals(self, k, success_count):
+        return self.clip(numpy.power(k, success_count))
+
+    def succeeded_k(self, k):
+        return numpy.where(k < self.max_k, k + 0.1, k)
+
+    def failed_k(self, k):
+        for i in range(2):
+            k = numpy.where(k > self.min_k, k - 0.1, k)
+        return k
+
+
+class SM2Scheduler(BaseScheduler):
+    """
+    SuperMemo 2 style: 1 day, 6 days, then the previous interval multiplied by the easiness factor `k`
+    Success is graded as "correct response after a hesitation" (k is kept), fail as "incorrect response" (k - 0.32)
+    """
+    min_k = 1.3
+
+    def intervals(self, k, success_count):
+        success_count = numpy.asarray(success_count)
+        later = 6 * numpy.power(k, numpy.maximum(success_count - 1, 0))
+        return self.clip(numpy.where(success_count == 0, 1, numpy.where(success_count == 1, 6, numpy.round(later))))
+
+    def succeeded_k(self, k):
+        return numpy.minimum(k, self.max_k)
+
+    def failed_k(self, k):
+        return numpy.maximum(k - 0.32, self.min_k)
+
+
+@lru_cache(maxsize=None)
+def get_scheduler(path=None):
+    return import_string(path or settings.CARD_SCHEDULER)()
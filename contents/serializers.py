@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from contents.abstract import DeckMixin
 from contents.models import DeckTag, Deck, DeckTemplate, Card, CardFrontContent, CardBackContent
+from core.serializers import ValuesSerializer, SparseFieldsMixin, ExpandableListSerializer
 
 
 class DeckTagSerializer(serializers.HyperlinkedModelSerializer):
@@ -10,7 +11,7 @@ class DeckTagSerializer(serializers.HyperlinkedModelSerializer):
         fields = ("name",)
 
 
-class DeckListSerializer(serializers.ModelSerializer):
+class DeckListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = DeckTagSerializer(read_only=True, many=True)
     cards_count = serializers.ReadOnlyField()
 
@@ -22,6 +23,37 @@ class DeckListSerializer(serializers.ModelSerializer):
         raise serializers.ValidationError("Create and update not allowed")
 
 
+class DeckListValuesSerializer(ValuesSerializer):
+    """
+    Fast path of `DeckListSerializer`, decks annotated by `with_counts()`
+    Tags of the page are read by one query
+    """
+    fields = (
+        ('id', 'id', None), ('name', 'name', None), ('preview', 'preview', 'preview_url'), ('tags', 'id', 'deck_tags'),
+        ('cards_count', 'cards__count', None), ('favorite', 'favorite', None),
+    )
+
+    def values(self, queryset):
+        self.db = queryset.db
+        return super(DeckListValuesSerializer, self).values(queryset)
+
+    def prepare(self, rows):
+        self.tags = {}
+        if not rows or 'deck_tags' not in [converter for name, lookup, converter in self.active_fields]:
+            return
+        index = self.columns().index('id')
+        tags = Deck.tags.through.objects.using(self.db).filter(deck_id__in=[row[index] for row in rows]) \
+            .order_by('id').values_list('deck_id', 'decktag__name')
+        for deck_id, name in tags:
+            self.tags.setdefault(deck_id, []).append({'name': name})
+
+    def preview_url(self, name):
+        return self.file_url(Deck._meta.get_field('preview'), name)
+
+    def deck_tags(self, deck_id):
+        return self.tags.get(deck_id, [])
+
+
 class DeckMixinSerializer(serializers.ModelSerializer):
     cards_count = serializers.ReadOnlyField()
     date_created = serializers.ReadOnlyField()
@@ -33,7 +65,7 @@ class DeckMixinSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'preview', 'tags', 'date_created', 'date_updated', 'cards_count')
 
 
-class DeckSerializer(DeckMixinSerializer):
+class DeckSerializer(SparseFieldsMixin, DeckMixinSerializer):
     favorite = serializers.BooleanField(required=False)
 
     stat_learned_today_count = serializers.ReadOnlyField()
@@ -58,20 +90,20 @@ class DeckSerializer(DeckMixinSerializer):
             raise serializers.ValidationError("Invalid deck template")
 
     def create(self, validated_data):
-        validated_data.setdefault('profile', self.context.get('request').user.profile)
+        profile = validated_data.pop('profile', None) or self.context.get('request').user.profile
 
         tags = validated_data.get('tags')
         if tags is not None:
             validated_data.pop('tags')
 
-        instance = Deck.objects.create(**validated_data)
+        instance = profile.decks.create(**validated_data)  # Related manager routes to the profile's shard
 
         if tags is not None:
             instance.tags.set(tags)
         return instance
 
 
-class DeckTemplateListSerializer(serializers.ModelSerializer):
+class DeckTemplateListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cards_count = serializers.ReadOnlyField()
     downloads = serializers.ReadOnlyField()
     likes = serializers.ReadOnlyField()
@@ -85,14 +117,54 @@ class DeckTemplateListSerializer(serializers.ModelSerializer):
         raise serializers.ValidationError("Create or update not allowed")
 
 
-class CardListSerializer(serializers.ModelSerializer):
+class DeckTemplateListValuesSerializer(ValuesSerializer):
+    """
+    Fast path of `DeckTemplateListSerializer`, deck templates annotated by `with_counts()`
+    """
+    fields = (
+        ('id', 'id', None), ('name', 'name', None), ('cards_count', 'cards__count', None),
+        ('downloads', 'downloaded__count', None), ('likes', 'liked__count', None),
+        ('dislikes', 'disliked__count', None),
+    )
+
+
+class CardListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    `?expand=front_content,back_content` inlines the contents (own or shared, see `Card.get_content`),
+    read for the whole page by `Card.prefetch_contents`
+    """
+    expandable_fields = {'front_content': 'get_front_content_field', 'back_content': 'get_back_content_field'}
+
     class Meta:
         model = Card
         fields = ('id', 'name', 'state', 'front_content', 'back_content')
+        list_serializer_class = ExpandableListSerializer
 
     def validate(self, attrs):
         raise serializers.ValidationError("Create or update not allowed")
 
+    @classmethod
+    def get_front_content_field(cls):
+        return CardFrontContentSerializer(source='resolved_front_content', read_only=True)
+
+    @classmethod
+    def get_back_content_field(cls):
+        return CardBackContentSerializer(source='resolved_back_content', read_only=True)
+
+    def prefetch_expanded(self, instances, names):
+        Card.prefetch_contents(instances, names)
+
+
+class CardListValuesSerializer(ValuesSerializer):
+    """
+    Fast path of `CardListSerializer`, ids of the own contents are joined to the cards query
+    """
+    fields = (
+        ('id', 'id', None), ('name', 'name', None), ('state', 'state', None),
+        ('front_content', 'front_content', None), ('back_content', 'back_content', None),
+    )
+    expandable_fields = ('front_content', 'back_content')
+
 
 class CardFrontContentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -136,14 +208,13 @@ class CardFullSerializer(serializers.ModelSerializer):
         back_content = validated_data['back_content']
         validated_data.pop('back_content')
 
-        validated_data.setdefault('deck', self.context['deck'])
-        instance = Card.objects.create(**validated_data)
+        instance = self.context['deck'].cards.create(**validated_data)
 
         front_content.setdefault('card', instance)
-        CardFrontContent.objects.create(**front_content)
+        CardFrontContent.objects.db_manager(instance._state.db).create(**front_content)
 
         back_content.setdefault('card', instance)
-        CardBackContent.objects.create(**back_content)
+        CardBackContent.objects.db_manager(instance._state.db).create(**back_content)
         return instance
 
 
@@ -160,6 +231,30 @@ class ActionSerializer(serializers.ModelSerializer):
         fields = ()
 
 
+class CardPositionSerializer(serializers.Serializer):
+    """
+    Id of the card of the same deck to place the card after, the card is placed first without it
+    """
+    after = serializers.IntegerField(required=False, allow_null=True)
+
+
+class StudyStepSerializer(serializers.Serializer):
+    """
+    Open, view and answer of the card, the key is also accepted as `Idempotency-Key` header
+    """
+    idempotency_key = serializers.CharField(max_length=64, required=False)
+    success = serializers.BooleanField()
+    opened_at = serializers.DateTimeField(required=False)
+    viewed_at = serializers.DateTimeField(required=False)
+    answered_at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        timings = [attrs.get(name) for name in ('opened_at', 'viewed_at', 'answered_at') if attrs.get(name)]
+        if timings != sorted(timings):
+            raise serializers.ValidationError("Expected opened_at <= viewed_at <= answered_at")
+        return attrs
+
+
 class DeckTemplateSerializer(serializers.ModelSerializer):
     cards_count = serializers.ReadOnlyField()
     downloads = serializers.ReadOnlyField()
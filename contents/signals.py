@@ -1,9 +1,14 @@
 import logging
 
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import post_delete, pre_save, post_save, m2m_changed, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import CardFrontContent, CardTemplateFrontContent, CardTemplateBackContent, CardBackContent
+from applications.models import Profile
+from core.cache import response_cache
+from core.sharding import shards
+from .models import CardFrontContent, CardTemplateFrontContent, CardTemplateBackContent, CardBackContent, Deck, Card, \
+    DeckDailyStatistics, DeckDailyQueue, CardSucceededStatistics, DeckTemplate, CardTemplate, DeckTag
 from .tools import delete_file, delete_empty_dirs, delete_old_files
 
 
@@ -45,3 +50,163 @@ def back_content_changed(sender, **kwargs):
         delete_old_files(previous.audio, kwargs.get("instance").audio)
     except sender.DoesNotExist as error:
         logging.debug(error)
+
+
+# Response cache invalidation (see core/cache.py), only version numbers are bumped
+
+def bump_profile_cache(profile_id, using=None):
+    if profile_id is not None:
+        response_cache.bump('profile', profile_id, using=using)
+
+
+def bump_deck_template_cache(deck_template_id, using=None):
+    response_cache.bump('deck_template', deck_template_id, using=using)
+    response_cache.bump('public_deck_templates', using=using)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_cache_changed(sender, **kwargs):
+    bump_profile_cache(kwargs.get("instance").id, kwargs.get("using"))
+
+
+@receiver(post_save, sender=Deck)
+@receiver(post_delete, sender=Deck)
+@receiver(m2m_changed, sender=Deck.tags.through)
+def deck_cache_changed(sender, **kwargs):
+    if str(kwargs.get("action")).startswith('pre_'):
+        return
+    instance = kwargs.get("instance")
+    if isinstance(instance, Deck):
+        bump_profile_cache(instance.profile_id, kwargs.get("using"))
+    else:  # Reverse side of the relation (tag instance)
+        decks = Deck.objects.using(kwargs.get("using")).filter(id__in=kwargs.get("pk_set") or [])
+        for profile_id in decks.values_list('profile_id', flat=True).distinct():
+            bump_profile_cache(profile_id, kwargs.get("using"))
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+@receiver(post_save, sender=DeckDailyStatistics)
+@receiver(post_delete, sender=DeckDailyStatistics)
+@receiver(m2m_changed, sender=DeckDailyStatistics.cards_learned.through)
+@receiver(m2m_changed, sender=DeckDailyStatistics.cards_failed.through)
+def deck_related_cache_changed(sender, **kwargs):
+    if str(kwargs.get("action")).startswith('pre_'):
+        return
+    instance = kwargs.get("instance")
+    if isinstance(instance, (Card, DeckDailyStatistics)):
+        decks = Deck.objects.using(instance._state.db).filter(id=instance.deck_id)
+        bump_profile_cache(decks.values_list('profile_id', flat=True).first(), instance._state.db)
+
+
+@receiver(post_save, sender=CardSucceededStatistics)
+@receiver(post_delete, sender=CardSucceededStatistics)
+@receiver(post_save, sender=CardFrontContent)
+@receiver(post_delete, sender=CardFrontContent)
+@receiver(post_save, sender=CardBackContent)
+@receiver(post_delete, sender=CardBackContent)
+def card_related_cache_changed(sender, **kwargs):
+    instance = kwargs.get("instance")
+    cards = Card.objects.using(instance._state.db).filter(id=instance.card_id)
+    bump_profile_cache(cards.values_list('deck__profile_id', flat=True).first(), instance._state.db)
+
+
+@receiver(post_save, sender=DeckTemplate)
+@receiver(post_delete, sender=DeckTemplate)
+@receiver(m2m_changed, sender=DeckTemplate.tags.through)
+@receiver(m2m_changed, sender=DeckTemplate.shared.through)
+@receiver(m2m_changed, sender=DeckTemplate.liked.through)
+@receiver(m2m_changed, sender=DeckTemplate.disliked.through)
+@receiver(m2m_changed, sender=DeckTemplate.downloaded.through)
+def deck_template_cache_changed(sender, **kwargs):
+    if str(kwargs.get("action")).startswith('pre_'):
+        return
+    instance = kwargs.get("instance")
+    if isinstance(instance, DeckTemplate):
+        bump_deck_template_cache(instance.id, kwargs.get("using"))
+    else:  # Reverse side of the relation, profile or tag instance
+        for deck_template_id in kwargs.get("pk_set") or []:
+            bump_deck_template_cache(deck_template_id, kwargs.get("using"))
+
+
+@receiver(post_save, sender=CardTemplate)
+@receiver(post_delete, sender=CardTemplate)
+def card_template_cache_changed(sender, **kwargs):
+    bump_deck_template_cache(kwargs.get("instance").deck_id, kwargs.get("using"))
+
+
+# Study queues of today (see DeckDailyQueue) are materialized again after cards or daily aim are changed
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def card_queue_changed(sender, **kwargs):
+    if kwargs.get("created", True):
+        instance = kwargs.get("instance")
+        DeckDailyQueue.objects.using(instance._state.db).filter(
+            deck_id=instance.deck_id, date=timezone.now().date()
+        ).delete()
+
+
+@receiver(post_save, sender=Profile)
+def profile_queue_changed(sender, **kwargs):
+    instance = kwargs.get("instance")
+    if not kwargs.get("created"):
+        DeckDailyQueue.objects.using(instance.shard or shards()[0]).filter(
+            deck__profile_id=instance.id, date=timezone.now().date()
+        ).delete()
+
+
+# Cross-shard relations (see core/sharding.py), cascades of `default` do not reach rows of the other shards
+
+@receiver(pre_delete, sender=Profile)
+def profile_shard_deleted(sender, **kwargs):
+    instance = kwargs.get("instance")
+    if instance.shard and instance.shard != kwargs.get("using"):
+        for deck in Deck.all_objects.using(instance.shard).filter(profile_id=instance.id):
+            deck.delete()
+
+
+@receiver(pre_delete, sender=DeckTemplate)
+@receiver(pre_delete, sender=CardTemplate)
+@receiver(pre_delete, sender=CardTemplateFrontContent)
+@receiver(pre_delete, sender=CardTemplateBackContent)
+def template_shards_deleted(sender, **kwargs):
+    model = {
+        DeckTemplate: Deck, CardTemplate: Card,
+        CardTemplateFrontContent: CardFrontContent, CardTemplateBackContent: CardBackContent,
+    }[sender]
+    for shard in shards():
+        if shard != kwargs.get("using"):
+            model.objects.using(shard).filter(template_id=kwargs.get("instance").id).update(template=None)
+
+
+@receiver(pre_delete, sender=CardTemplateFrontContent)
+@receiver(pre_delete, sender=CardTemplateBackContent)
+def shared_content_deleted(sender, **kwargs):
+    """
+    Cards sharing the content of the card template (not edited yet, see `Card.get_content`) get private copies
+    """
+    instance = kwargs.get("instance")
+    side = 'front_content' if sender is CardTemplateFrontContent else 'back_content'
+    for shard in shards():
+        cards = Card.objects.using(shard).filter(
+            template_id=instance.card_id, deck__deleted_at=None, **{side + '__isnull': True}
+        )
+        for card in cards.iterator():
+            card.materialize_content(side, deleted=instance)
+
+
+@receiver(post_save, sender=DeckTag)
+def deck_tag_replicated(sender, **kwargs):
+    instance = kwargs.get("instance")
+    if kwargs.get("using") == shards()[0]:  # Replicas do not replicate further
+        for shard in shards()[1:]:
+            DeckTag.objects.using(shard).update_or_create(id=instance.id, defaults={'name': instance.name})
+
+
+@receiver(post_delete, sender=DeckTag)
+def deck_tag_replica_deleted(sender, **kwargs):
+    if kwargs.get("using") == shards()[0]:
+        for shard in shards()[1:]:
+            DeckTag.objects.using(shard).filter(id=kwargs.get("instance").id).delete()
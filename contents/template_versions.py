@@ -0,0 +1,94 @@
+"""
+Updates of decks from new versions of their templates
+
+The latest version of the template (`DeckTemplateVersion`) is compared with the version the deck was copied
+or updated from, cards of the deck are matched to card templates by `Card.template`
+Only the difference is applied: added cards are created in bulk, changed cards get the new names in bulk
+(their content is shared with the card templates until edited), cards of removed card templates are deleted
+Review state of the cards (state, k, dates, statistics and position) is kept
+"""
+from django.db import transaction
+
+from contents.models import Card, CardTemplate, DeckTemplateVersion
+from core.cache import response_cache
+
+
+def base_version(deck):
+    if deck.template_version is None:
+        return None
+    return deck.template.versions.filter(version=deck.template_version).first()
+
+
+def template_diff(deck, base, latest):
+    """
+    Card template ids (sorted lists) to add, change and remove to update the deck from `base` to `latest` version
+    Without the base version every matched card is changed
+    """
+    existing = set(deck.cards.exclude(template=None).values_list('template_id', flat=True))
+    latest_ids = {int(card_id) for card_id in latest.cards}
+
+    if base is None:
+        added, removed, changed = latest_ids - existing, existing - latest_ids, latest_ids & existing
+    else:
+        base_ids = {int(card_id) for card_id in base.cards}
+        added = latest_ids - base_ids - existing  # Cards deleted by the user are not restored
+        removed = (base_ids - latest_ids) & existing
+        changed = {
+            card_id for card_id in latest_ids & base_ids & existing
+            if latest.cards[str(card_id)] != base.cards[str(card_id)]
+        }
+    return {'added': sorted(added), 'changed': sorted(changed), 'removed': sorted(removed)}
+
+
+def add_cards(deck, card_templates):
+    """
+    Cards share the content of their card templates until they are edited (see `Card.get_content`)
+    """
+    position = deck.next_card_position()
+    Card.objects.using(deck.cards.all().db).bulk_create([
+        Card(deck=deck, name=card_template.name, template=card_template,
+             position=position + number * Card.POSITION_GAP)
+        for number, card_template in enumerate(card_templates)
+    ])
+
+
+def change_cards(deck, card_templates):
+    """
+    Names are updated in bulk, shared content is already the latest one
+    Private copies of the content (cards edited by the user) are kept
+    """
+    by_template = {card_template.id: card_template for card_template in card_templates}
+    cards = list(deck.cards.filter(template_id__in=by_template))
+    for card in cards:
+        card.name = by_template[card.template_id].name
+    Card.objects.using(deck.cards.all().db).bulk_update(cards, ['name'])
+
+
+def update_from_template(deck, dry_run=False):
+    """
+    Updates the deck to the latest version of its template (published now if the template was changed)
+    Dry run only compares with the current cards of the template, no version is published
+    Returns the difference with the version: {'version', 'added', 'changed', 'removed'} (card template ids)
+    """
+    if dry_run:
+        latest, published = DeckTemplateVersion.objects.preview(deck.template)
+    else:
+        latest, published = DeckTemplateVersion.objects.publish(deck.template)
+    base = base_version(deck)
+    diff = template_diff(deck, base, latest)
+    if dry_run or deck.template_version == latest.version and not any(diff.values()):
+        return dict(diff, version=latest.version)
+
+    card_templates = CardTemplate.objects.filter(id__in=diff['added'] + diff['changed']).order_by('id')
+
+    with transaction.atomic(using=deck.cards.all().db):
+        if diff['removed']:
+            deck.cards.filter(template_id__in=diff['removed']).delete()
+        add_cards(deck, [card_template for card_template in card_templates if card_template.id in diff['added']])
+        change_cards(deck, [card_template for card_template in card_templates if card_template.id in diff['changed']])
+        deck.template_version = latest.version
+        deck.save(update_fields=['template_version'])
+        deck.forget_daily_queue()
+
+    response_cache.bump('profile', deck.profile_id, using=deck.cards.all().db)  # Bulk operations do not send signals
+    return dict(diff, version=latest.version)
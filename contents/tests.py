@@ -1,3 +1,265 @@
-from django.test import TestCase
+import os
+import threading
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import pre_save
+from django.test import TestCase, TransactionTestCase, tag
+from django.utils import timezone
+
+from applications.models import Profile
+from contents.constants import CardState
+from contents.models import Deck, DeckDailyStatistics, Card
+from contents.schedulers import get_scheduler
+from core.sharding import shards
+
+
+class ConcurrencyTestCase(TransactionTestCase):
+    """
+    Seeded deck of `threads` cards, `run_threads` runs the target in the threads at once (separate connections)
+    """
+    databases = '__all__'
+    threads = int(os.environ.get('CONCURRENCY_THREADS', 16))
+    iterations = int(os.environ.get('CONCURRENCY_ITERATIONS', 25))
+
+    def setUp(self):
+        call_command(
+            'seed', users=1, decks=1, cards=self.threads, templates=0, template_cards=0, tags=1, days=1,
+            workers=1, seed=1, stdout=StringIO()
+        )
+        self.deck = next(filter(None, (Deck.objects.using(shard).order_by('id').first() for shard in shards())))
+        self.cards = list(self.deck.cards.order_by('id'))
+        self.date = timezone.now().date() + timezone.timedelta(days=1)  # Seeded history has no statistics of it
+
+    def run_threads(self, target, threads=None):
+        threads = threads or self.threads
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def run(number):
+            try:
+                barrier.wait()
+                target(number)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=run, args=(number,)) for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+
+@tag('concurrency')
+class DeckDailyStatisticsConcurrencyTestCase(ConcurrencyTestCase):
+    """
+    Records statistics of the same deck and day from many threads at once,
+    every recorded second and relation has to be counted exactly once, without integrity errors
+
+    Run: python manage.py test contents --tag concurrency
+    """
+
+    def test_concurrent_records(self):
+        def record(number):
+            card = self.cards[number]
+            for iteration in range(self.iterations):
+                DeckDailyStatistics.objects.record(
+                    self.deck, self.date, seconds=3,
+                    learned=card if iteration % 2 == 0 else None, failed=card if iteration % 5 == 0 else None
+                )
+
+        self.run_threads(record)
+
+        stat = self.deck.statistics.get(date=self.date)
+        self.assertEqual(stat.seconds_gone, self.threads * self.iterations * 3)
+        self.assertEqual(stat.learned_count, self.threads)
+        self.assertEqual(stat.failed_count, self.threads)
+        self.assertEqual(stat.cards_learned.count(), stat.learned_count)
+        self.assertEqual(stat.cards_failed.count(), stat.failed_count)
+
+    def test_concurrent_records_of_one_card(self):
+        card = self.cards[0]
+        self.run_threads(lambda number: DeckDailyStatistics.objects.record(self.deck, self.date, 1, learned=card))
+
+        stat = self.deck.statistics.get(date=self.date)
+        self.assertEqual(stat.seconds_gone, self.threads)
+        self.assertEqual(stat.learned_count, 1)
+        self.assertEqual(list(stat.cards_learned.values_list('id', flat=True)), [card.id])
+
+
+@tag('concurrency')
+class CardTransitionConcurrencyTestCase(ConcurrencyTestCase):
+    """
+    Study steps of the same card from several threads at once, every transition has to be applied exactly once:
+    the losing one is retried on the fresh card (`Card.VersionConflict`), retried keys are not applied again
+
+    Run: python manage.py test contents --tag concurrency
+    """
+
+    def setUp(self):
+        super(CardTransitionConcurrencyTestCase, self).setUp()
+        self.db = self.deck._state.db
+        for card in self.cards:
+            card.statistics.all().delete()
+            card.study_steps.all().delete()
+        Card.objects.using(self.db).filter(id__in=[card.id for card in self.cards]).update(
+            state=CardState.STATE_IDLE, k=2.5, opened_date=None, next_date=None
+        )
+
+    def fresh(self, card):
+        return Card.objects.using(self.db).get(id=card.id)
+
+    def test_concurrent_transitions(self):
+        card, reference = self.cards[0], self.fresh(self.cards[1])
+        version = reference.version
+        for key in ('first', 'second'):  # The same transitions one after another
+            reference.perform_study_step(key, success=False)
+        reference.refresh_from_db()
+
+        instances = [self.fresh(card), self.fresh(card)]  # Both read before any of them is applied
+        started = instances[0].version
+        self.run_threads(lambda number: instances[number].perform_study_step('key-%s' % number, success=False), 2)
+
+        card = self.fresh(card)
+        self.assertEqual(card.study_steps.count(), 2)
+        self.assertEqual(card.state, reference.state)
+        self.assertAlmostEqual(card.k, float(get_scheduler().failed_k(get_scheduler().failed_k(2.5))))
+        self.assertAlmostEqual(card.k, reference.k)
+        self.assertEqual(card.version - started, reference.version - version)
+
+    def test_concurrent_retries_of_one_key(self):
+        card, reference = self.cards[0], self.fresh(self.cards[1])
+        version = reference.version
+        reference.perform_study_step('key', success=False)
+        reference.refresh_from_db()
+
+        instances = [self.fresh(card) for number in range(self.threads)]
+        started = instances[0].version
+        results = []
+        self.run_threads(lambda number: results.append(instances[number].perform_study_step('key', success=False)[1]))
+
+        card = self.fresh(card)
+        self.assertEqual(sorted(results), [False] * (self.threads - 1) + [True])
+        self.assertEqual(card.study_steps.count(), 1)
+        self.assertEqual(card.state, reference.state)
+        self.assertAlmostEqual(card.k, reference.k)
+        self.assertEqual(card.version - started, reference.version - version)
+
+    def test_version_conflict_after_retries(self):
+        """
+        Another writer updates the card before every save of the transition, it is answered by 409
+        once `Card.TRANSITION_RETRIES` are exhausted
+        """
+        card = self.fresh(self.cards[0])
+        Card.objects.using(self.db).filter(id=card.id).update(
+            state=CardState.STATE_VIEWED, opened_date=timezone.now()
+        )
+        saves = []
+
+        def concurrent_update(sender, instance, **kwargs):
+            if instance.id == card.id:
+                saves.append(instance.version)
+                Card.objects.using(self.db).filter(id=card.id).update(version=F('version') + 1)
+
+        pre_save.connect(concurrent_update, sender=Card, dispatch_uid='concurrent_update')
+        self.addCleanup(pre_save.disconnect, sender=Card, dispatch_uid='concurrent_update')
+
+        self.client.force_login(self.deck.profile.user)
+        response = self.client.put('/contents/decks/my/%s/cards/%s/action?success=0' % (self.deck.id, card.id))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(saves), Card.TRANSITION_RETRIES + 1)
+        self.assertEqual(self.fresh(card).state, CardState.STATE_VIEWED)
+
+
+class NewCardOrderTestCase(TestCase):
+    """
+    Order of the new cards: moves between neighbours, renumbering without a gap, shuffle and the daily new cards
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed', users=1, decks=1, cards=8, templates=0, template_cards=0, tags=1, days=1,
+            workers=1, seed=1, stdout=StringIO()
+        )
+
+    def setUp(self):
+        deck = next(filter(None, (Deck.objects.using(shard).order_by('id').first() for shard in shards())))
+        Profile.objects.filter(id=deck.profile_id).update(aim=10 ** 6)  # Every new card is a daily one
+        self.deck = Deck.objects.using(deck._state.db).get(id=deck.id)
+        self.cards = self.deck.cards.all()
+
+    def set_states(self, states):
+        """
+        States of the cards in the order of their positions, returns the cards
+        """
+        cards = list(self.cards.order_by('position', 'id'))
+        for card, state in zip(cards, states):
+            self.cards.filter(id=card.id).update(state=state)
+        return cards
+
+    def order(self):
+        return list(self.cards.order_by('position', 'id').values_list('id', flat=True))
+
+    def test_move(self):
+        ids = self.order()
+        card = self.cards.get(id=ids[-1])
+        card.move(self.cards.get(id=ids[0]))
+        self.assertEqual(self.order(), [ids[0], ids[-1]] + ids[1:-1])
+
+        card.move(None)
+        self.assertEqual(self.order(), [ids[-1]] + ids[:-1])
+
+    def test_move_renumbers_without_gap(self):
+        ids = self.order()
+        for position, card_id in enumerate(ids):
+            self.cards.filter(id=card_id).update(position=position)
+
+        card = self.cards.get(id=ids[-1])
+        card.move(self.cards.get(id=ids[0]))
+        self.assertEqual(self.order(), [ids[0], ids[-1]] + ids[1:-1])
+        positions = sorted(self.cards.values_list('position', flat=True))
+        self.assertEqual(positions[:2], [Card.POSITION_GAP, Card.POSITION_GAP + Card.POSITION_GAP // 2])
+        self.assertTrue(all(upper - lower >= Card.POSITION_GAP // 2 for lower, upper in zip(positions, positions[1:])))
+
+    def test_move_after_stale_card(self):
+        ids = self.order()
+        after = self.cards.get(id=ids[0])
+        self.cards.get(id=ids[0]).move(self.cards.get(id=ids[-1]))  # Moved by another request since it was read
+
+        card = self.cards.get(id=ids[1])
+        card.move(after)
+        self.assertEqual(self.order()[-2:], [ids[0], ids[1]])
+
+    def test_daily_new_card_ids(self):
+        cards = self.set_states([
+            CardState.STATE_IDLE, CardState.STATE_VIEWED, CardState.STATE_GOOD, CardState.STATE_IDLE,
+            CardState.STATE_VIEWED, CardState.STATE_AGAIN, CardState.STATE_IDLE, CardState.STATE_IDLE,
+        ])
+        viewed = [cards[1].id, cards[4].id]
+        idle = [cards[0].id, cards[3].id, cards[6].id, cards[7].id]
+        self.assertEqual(self.deck.get_daily_new_card_ids(), viewed + idle)
+        self.assertEqual(list(self.deck.get_daily_new_cards().values_list('id', flat=True)), viewed + idle)
+
+    def test_shuffle_new_cards(self):
+        cards = self.set_states([CardState.STATE_IDLE] * 6 + [CardState.STATE_GOOD] * 2)
+        positions = dict(self.cards.values_list('id', 'position'))
+        versions = dict(self.cards.values_list('id', 'version'))
+
+        self.assertEqual(self.deck.shuffle_new_cards(seed=1), 6)
+        shuffled = dict(self.cards.values_list('id', 'position'))
+        self.assertEqual(sorted(shuffled.values()), sorted(positions.values()))
+        for card in cards[6:]:
+            self.assertEqual(shuffled[card.id], positions[card.id])
+        for card in cards[:6]:
+            self.assertEqual(self.cards.get(id=card.id).version, versions[card.id] + 1)
+
+        new_ids = [card_id for card_id in self.order() if card_id in {card.id for card in cards[:6]}]
+        self.assertEqual(self.deck.get_daily_new_card_ids(), new_ids)
+        self.assertEqual(list(self.deck.get_queued_cards('new_cards').values_list('id', flat=True)), new_ids)
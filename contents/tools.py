@@ -4,20 +4,26 @@ import random
 import string
 import uuid
 
+from django.core.files.base import ContentFile
+from django.core.files.images import ImageFile
+
+from core.log import log_event
+
 logger = logging.getLogger(__name__)
 
 
 def get_card_content_path(instance, filename):
-    logger.info("Content file '%s' was uploaded for card '%s'" % (filename, instance.card.name))
+    log_event(logger, 'content_file_uploaded', filename=filename, card_id=instance.card_id)
+    deck_model = instance.card._meta.get_field('deck').related_model
     return os.path.join(
         "contents",
-        "%s-%s" % (instance.card.deck.__class__.__name__.lower(), instance.card.deck.id),
+        "%s-%s" % (deck_model.__name__.lower(), instance.card.deck_id),
         "card-%s" % instance.card.id, str(uuid.uuid1()) + os.path.splitext(filename)[1]
     )
 
 
 def get_deck_preview_path(instance, filename):
-    logger.info("Preview file '%s' was uploaded for deck '%s'" % (filename, instance.name))
+    log_event(logger, 'preview_file_uploaded', filename=filename, model=instance.__class__.__name__, id=instance.id)
     return os.path.join(
         "previews",
         instance.__class__.__name__.lower(),
@@ -35,6 +41,13 @@ def delete_file(file):
         os.remove(file.path)
 
 
+def copy_file(field_file, image=False):
+    if not field_file:
+        return field_file
+    content = ContentFile(field_file.read(), field_file.name)
+    return ImageFile(content) if image else content
+
+
 def delete_empty_dirs(file_path, recursion=True):
     parent = os.path.abspath(os.path.join(file_path, os.pardir))
     if os.path.isdir(parent) and not os.listdir(parent):
@@ -1,26 +1,37 @@
 from django.urls import path, re_path
 
+from contents.async_views import (
+    AsyncProfileDeckListAPIView, AsyncCardListAPIView, AsyncNewCardListAPIView, AsyncLearningCardListAPIView,
+    AsyncToReviewCardListAPIView, AsyncCardFrontContentAPIView, AsyncCardBackContentAPIView
+)
 from contents.views import (
-    ProfileDeckListAPIView, PublicDeckTemplateListAPIView, NewCardListAPIView, ToReviewCardListAPIView,
-    LearningCardListAPIView, ProfileDeckAPIView, CardListAPIView, CardAPIView, CardBackContentAPIView,
-    CardFrontContentAPIView, CardActionAPIView, DeckTemplateListAPIView, DeckTemplateAPIView
+    PublicDeckTemplateListAPIView, ProfileDeckAPIView, CardAPIView, CardActionAPIView, DeckTemplateListAPIView,
+    DeckTemplateAPIView, DeckForecastAPIView, ProfileForecastAPIView, CardStudyStepAPIView, CardPositionAPIView,
+    NewCardShuffleAPIView, DeckTemplateUpdateAPIView
 )
+from core.async_views import read_path_view
 
 urlpatterns = [
-    path('decks/my', ProfileDeckListAPIView.as_view()),
+    path('decks/my', read_path_view(AsyncProfileDeckListAPIView)),
+    path('decks/my/forecast', ProfileForecastAPIView.as_view()),
     path('decks/my/<int:deck_id>', ProfileDeckAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards', CardListAPIView.as_view()),
+    path('decks/my/<int:deck_id>/forecast', DeckForecastAPIView.as_view()),
+    path('decks/my/<int:deck_id>/template-update', DeckTemplateUpdateAPIView.as_view()),
+    path('decks/my/<int:deck_id>/cards', read_path_view(AsyncCardListAPIView)),
     path('decks/my/<int:deck_id>/cards/<int:card_id>', CardAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards/<int:card_id>/back', CardBackContentAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards/<int:card_id>/front', CardFrontContentAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards/new', NewCardListAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards/learning', LearningCardListAPIView.as_view()),
-    path('decks/my/<int:deck_id>/cards/to-review', ToReviewCardListAPIView.as_view()),
+    path('decks/my/<int:deck_id>/cards/<int:card_id>/back', read_path_view(AsyncCardBackContentAPIView)),
+    path('decks/my/<int:deck_id>/cards/<int:card_id>/front', read_path_view(AsyncCardFrontContentAPIView)),
+    path('decks/my/<int:deck_id>/cards/<int:card_id>/step', CardStudyStepAPIView.as_view()),
+    path('decks/my/<int:deck_id>/cards/<int:card_id>/position', CardPositionAPIView.as_view()),
+    path('decks/my/<int:deck_id>/cards/new', read_path_view(AsyncNewCardListAPIView)),
+    path('decks/my/<int:deck_id>/cards/new/shuffle', NewCardShuffleAPIView.as_view()),
+    path('decks/my/<int:deck_id>/cards/learning', read_path_view(AsyncLearningCardListAPIView)),
+    path('decks/my/<int:deck_id>/cards/to-review', read_path_view(AsyncToReviewCardListAPIView)),
     path('deck-templates/my', DeckTemplateListAPIView.as_view()),
     path('deck-templates/my/<int:deck_id>', DeckTemplateAPIView.as_view()),
     path('deck-templates/popular', PublicDeckTemplateListAPIView.as_view()),
     re_path(
         r'^decks/my/(?P<deck_id>\d+)/cards/(?P<card_id>\d+)/action(?:success=(?P<success>\d+))?$',
-        CardActionAPIView.as_view()
+        CardActionAPIView.as_view(), name='card-action'
     ),
 ]
@@ -1,5 +1,6 @@
 import logging
 
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, generics
 from rest_framework.generics import get_object_or_404
@@ -7,22 +8,30 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 
 from contents.filters import DeckTemplateFilter, DeckFilter
-from contents.helpers import ProfileCheckHelper, ProfileDeckGetHelper, ProfileDeckCardGetHelper
-from contents.models import DeckTemplate
+from contents.forecast import forecast
+from contents.helpers import ProfileCheckHelper, ProfileDeckGetHelper, ProfileDeckCardGetHelper, ResponseCacheHelper, \
+    ProfileResponseCacheHelper, ValuesListAPIView, CardVersionConflictHelper
+from contents.models import DeckTemplate, Card
+from contents.purge import delete_deck, delete_deck_template
+from contents.template_versions import update_from_template
 from contents.serializers import DeckSerializer, DeckTemplateListSerializer, CardListSerializer, DeckListSerializer, \
     CardFullSerializer, CardSerializer, CardFrontContentSerializer, CardBackContentSerializer, ActionSerializer, \
-    DeckTemplateSerializer
+    DeckTemplateSerializer, StudyStepSerializer, CardPositionSerializer, DeckListValuesSerializer, \
+    CardListValuesSerializer, DeckTemplateListValuesSerializer
+from core.cache import response_cache
+from core.log import log_event
 
 logger = logging.getLogger(__name__)
 
 
-class ProfileDeckListAPIView(generics.ListCreateAPIView, ProfileCheckHelper):
+class ProfileDeckListAPIView(generics.ListCreateAPIView, ProfileCheckHelper, ValuesListAPIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     filter_backends = (DjangoFilterBackend,)
     filter_class = DeckFilter
+    values_serializer_class = DeckListValuesSerializer
 
     def get_queryset(self):
-        return self.request.user.profile.decks.all()
+        return self.request.user.profile.decks.with_counts().prefetch_related('tags')
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -30,19 +39,27 @@ class ProfileDeckListAPIView(generics.ListCreateAPIView, ProfileCheckHelper):
         return DeckSerializer
 
 
-class PublicDeckTemplateListAPIView(generics.ListAPIView):
+class PublicDeckTemplateListAPIView(ValuesListAPIView, ResponseCacheHelper):
     queryset = DeckTemplate.objects.popular()
     serializer_class = DeckTemplateListSerializer
+    values_serializer_class = DeckTemplateListValuesSerializer
     filter_backends = (DjangoFilterBackend,)
     filter_class = DeckTemplateFilter
+    cache_namespace = 'public_deck_templates'
 
+    def get_cache_parts(self):
+        return self.request.get_full_path(),
 
-class ProfileDeckAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper):
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(PublicDeckTemplateListAPIView, self).list(request, *args, **kwargs))
+
+
+class ProfileDeckAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper, ProfileResponseCacheHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = DeckSerializer
 
     def get_queryset(self):
-        return self.request.user.profile.decks.all()
+        return self.request.user.profile.decks.with_counts().prefetch_related('tags')
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -51,9 +68,17 @@ class ProfileDeckAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelp
         self.check_object_permissions(self.request, deck)
         return deck
 
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(ProfileDeckAPIView, self).retrieve(request, *args, **kwargs))
+
+    def perform_destroy(self, instance):
+        delete_deck(instance)  # Purged in the background (purgedeleted command)
+        log_event(logger, 'deck_deleted', user_id=self.request.user.id, deck_id=instance.id)
+
 
-class CardListAPIView(generics.ListCreateAPIView, ProfileCheckHelper, ProfileDeckGetHelper):
+class CardListAPIView(generics.ListCreateAPIView, ProfileCheckHelper, ProfileDeckGetHelper, ValuesListAPIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    values_serializer_class = CardListValuesSerializer
 
     def get_queryset(self):
         deck = self.deck(self)
@@ -71,7 +96,8 @@ class CardListAPIView(generics.ListCreateAPIView, ProfileCheckHelper, ProfileDec
         return context
 
 
-class CardAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper, ProfileDeckCardGetHelper):
+class CardAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                  ProfileDeckCardGetHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = CardSerializer
 
@@ -81,7 +107,8 @@ class CardAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper, Pro
         return card
 
 
-class CardActionAPIView(generics.UpdateAPIView, ProfileCheckHelper, ProfileDeckCardGetHelper):
+class CardActionAPIView(generics.UpdateAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                        ProfileDeckCardGetHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = ActionSerializer
 
@@ -95,80 +122,227 @@ class CardActionAPIView(generics.UpdateAPIView, ProfileCheckHelper, ProfileDeckC
         if str(request.query_params.get('success')).isnumeric():
             if int(request.query_params.get('success')) > 0:
                 card.perform_action_success()
-                logger.info("User '%s' performed action <success> to the card '%s'" % (self.request.user.name, card))
+                log_event(logger, 'card_action', user_id=request.user.id, card_id=card.id, action='success')
                 return Response({"action": "success"}, status=status.HTTP_200_OK)
             card.perform_action_fail()
-            logger.info("User '%s' performed action <fail> to the card '%s'" % (self.request.user.name, card))
+            log_event(logger, 'card_action', user_id=request.user.id, card_id=card.id, action='fail')
             return Response({"action": "fail"}, status=status.HTTP_200_OK)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class CardFrontContentAPIView(generics.RetrieveUpdateAPIView, ProfileCheckHelper, ProfileDeckCardGetHelper):
+class CardStudyStepAPIView(generics.GenericAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                           ProfileDeckCardGetHelper):
+    """
+    Open, view and answer of the card in one request (replaces front, back and action requests of the review)
+    Requires idempotency key, retried requests return the recorded result
+    """
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+    serializer_class = StudyStepSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        key = data.pop('idempotency_key', None)
+        key = request.headers.get('Idempotency-Key') or key
+        if not key or len(key) > 64:
+            return Response({"idempotency_key": ["Idempotency key (up to 64 characters) is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        card = self.card(self)
+        step, created = card.perform_study_step(key, **data)
+        log_event(logger, 'card_study_step', user_id=request.user.id, card_id=card.id, action=step.action or None,
+                  replayed=not created)
+        return Response({
+            "action": step.action or None, "state": card.state, "next_date": card.next_date, "replayed": not created
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class CardPositionAPIView(generics.GenericAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                          ProfileDeckCardGetHelper):
+    """
+    Moves the card in the order of new cards of the deck
+    """
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+    serializer_class = CardPositionSerializer
+
+    def put(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        card = self.card(self)
+
+        after = serializer.validated_data.get('after')
+        if after is not None:
+            after = card.deck.cards.filter(id=after).exclude(id=card.id).first()
+            if after is None:
+                return Response({"after": ["Card of the deck is expected."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        card.move(after)
+        log_event(logger, 'card_moved', user_id=request.user.id, card_id=card.id, after=after.id if after else None)
+        return Response({"id": card.id, "position": card.position}, status=status.HTTP_200_OK)
+
+
+class NewCardShuffleAPIView(generics.GenericAPIView, ProfileCheckHelper, ProfileDeckGetHelper):
+    """
+    Random order of the new cards of the deck
+    """
+
+    def post(self, request, *args, **kwargs):
+        deck = self.deck(self)
+        self.check_object_permissions(request, deck)
+        count = deck.shuffle_new_cards()
+        response_cache.bump('profile', deck.profile_id, using=deck._state.db)  # Bulk update does not send signals
+        log_event(logger, 'new_cards_shuffled', user_id=request.user.id, deck_id=deck.id, count=count)
+        return Response({"shuffled": count}, status=status.HTTP_200_OK)
+
+
+class CardFrontContentAPIView(generics.RetrieveUpdateAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                              ProfileDeckCardGetHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = CardFrontContentSerializer
 
     def get_object(self):
         card = self.card(self)
         self.check_object_permissions(self.request, card)
-        return card.front_content
+        content = card.resolved_front_content  # Shared content of the card template until the first edit
+        if content is None:
+            raise Http404
+        return content
+
+    def perform_update(self, serializer):
+        serializer.instance = self.card(self).materialize_content('front_content')
+        serializer.save()
 
     def retrieve(self, request, *args, **kwargs):
         result = super(CardFrontContentAPIView, self).retrieve(request, *args, **kwargs)
-        logger.info("User '%s' <opened> the card '%s'" % (self.request.user.name, self.get_object().card))
-        card = self.get_object().card
+        card = self.card(self)
+        log_event(logger, 'card_opened', user_id=request.user.id, card_id=card.id)
         card.trigger_opened()
         return result
 
 
-class CardBackContentAPIView(generics.RetrieveUpdateAPIView, ProfileCheckHelper, ProfileDeckCardGetHelper):
+class CardBackContentAPIView(generics.RetrieveUpdateAPIView, ProfileCheckHelper, CardVersionConflictHelper,
+                             ProfileDeckCardGetHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     serializer_class = CardBackContentSerializer
 
     def get_object(self):
         card = self.card(self)
         self.check_object_permissions(self.request, card)
-        return card.back_content
+        content = card.resolved_back_content  # Shared content of the card template until the first edit
+        if content is None:
+            raise Http404
+        return content
+
+    def perform_update(self, serializer):
+        serializer.instance = self.card(self).materialize_content('back_content')
+        serializer.save()
 
     def retrieve(self, request, *args, **kwargs):
         result = super(CardBackContentAPIView, self).retrieve(request, *args, **kwargs)
-        logger.info("User '%s' <viewed> the card '%s'" % (self.request.user.name, self.get_object().card))
-        card = self.get_object().card
+        card = self.card(self)
+        log_event(logger, 'card_viewed', user_id=request.user.id, card_id=card.id)
         card.perform_action_view()
         return result
 
 
-class NewCardListAPIView(generics.ListAPIView, ProfileDeckGetHelper):
+class NewCardListAPIView(ValuesListAPIView, ProfileDeckGetHelper):
     serializer_class = CardListSerializer
+    values_serializer_class = CardListValuesSerializer
 
     def get_queryset(self):
         deck = self.deck(self)
         self.check_object_permissions(self.request, deck)
-        return deck.get_daily_new_cards()
+        return deck.get_queued_cards('new_cards')
 
 
-class LearningCardListAPIView(generics.ListAPIView, ProfileDeckGetHelper):
+class LearningCardListAPIView(ValuesListAPIView, ProfileDeckGetHelper):
     serializer_class = CardListSerializer
+    values_serializer_class = CardListValuesSerializer
 
     def get_queryset(self):
         deck = self.deck(self)
         self.check_object_permissions(self.request, deck)
-        return deck.get_learning_cards()
+        return deck.get_queued_cards('learning_cards')
 
 
-class ToReviewCardListAPIView(generics.ListAPIView, ProfileDeckGetHelper):
+class ToReviewCardListAPIView(ValuesListAPIView, ProfileDeckGetHelper):
     serializer_class = CardListSerializer
+    values_serializer_class = CardListValuesSerializer
 
     def get_queryset(self):
         deck = self.deck(self)
         self.check_object_permissions(self.request, deck)
-        return deck.get_to_review_cards()
+        return deck.get_queued_cards('to_review_cards')
+
+
+class ForecastAPIView(generics.GenericAPIView, ProfileCheckHelper, ProfileResponseCacheHelper):
+    """
+    Count of cards to review per day for the next `days` days (1 - 365, default 30)
+    `projected=1` adds simulated reviews of the following days (see contents/forecast.py)
+    """
+    default_days = 30
+    max_days = 365
+
+    def get_cards(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        days = request.query_params.get('days', self.default_days)
+        if not str(days).isnumeric() or not 0 < int(days) <= self.max_days:
+            return Response({"days": ["Expected number of days from 1 to %s." % self.max_days]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        projected = str(request.query_params.get('projected')) in ('1', 'true')
+        return self.cached_response(lambda: Response(forecast(self.get_cards(), int(days), projected)))
+
+
+class DeckForecastAPIView(ForecastAPIView, ProfileDeckGetHelper):
+    def get_cards(self):
+        deck = self.deck(self)
+        self.check_object_permissions(self.request, deck)
+        return deck.cards.all()
+
+
+class ProfileForecastAPIView(ForecastAPIView):
+    def get_cards(self):
+        profile = self.request.user.profile
+        return Card.objects.using(profile.decks.all().db).filter(deck__profile=profile, deck__deleted_at=None)
 
 
-class DeckTemplateListAPIView(generics.ListCreateAPIView, ProfileCheckHelper):
+class DeckTemplateUpdateAPIView(generics.GenericAPIView, ProfileCheckHelper, ProfileDeckGetHelper):
+    """
+    Difference of the deck with the latest version of its template (GET) and update of the deck to it (POST),
+    review state of the cards is kept
+    """
+
+    def get_template_deck(self):
+        deck = self.deck(self)
+        self.check_object_permissions(self.request, deck)
+        return deck if deck.template_id and deck.template and deck.template.deleted_at is None else None
+
+    def get(self, request, *args, **kwargs):
+        deck = self.get_template_deck()
+        if deck is None:
+            return Response({"template": ["Deck is not created from a template."]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dict(update_from_template(deck, dry_run=True), current=deck.template_version))
+
+    def post(self, request, *args, **kwargs):
+        deck = self.get_template_deck()
+        if deck is None:
+            return Response({"template": ["Deck is not created from a template."]}, status=status.HTTP_400_BAD_REQUEST)
+        diff = update_from_template(deck)
+        log_event(logger, 'deck_updated_from_template', user_id=request.user.id, deck_id=deck.id,
+                  version=diff['version'], added=len(diff['added']), changed=len(diff['changed']),
+                  removed=len(diff['removed']))
+        return Response(diff, status=status.HTTP_200_OK)
+
+
+class DeckTemplateListAPIView(generics.ListCreateAPIView, ProfileCheckHelper, ValuesListAPIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    values_serializer_class = DeckTemplateListValuesSerializer
 
     def get_queryset(self):
-        return self.request.user.profile.deck_templates.all()
+        return self.request.user.profile.deck_templates.with_counts()
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -176,14 +350,18 @@ class DeckTemplateListAPIView(generics.ListCreateAPIView, ProfileCheckHelper):
         return DeckTemplateSerializer
 
 
-class DeckTemplateAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper):
+class DeckTemplateAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHelper, ResponseCacheHelper):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    cache_namespace = 'deck_template'
+
+    def get_cache_identifier(self):
+        return self.kwargs.get('deck_id')
 
     def get_serializer_class(self):
         return DeckTemplateSerializer
 
     def get_queryset(self):
-        return self.request.user.profile.deck_templates.all()
+        return self.request.user.profile.deck_templates.with_counts().prefetch_related('tags', 'shared')
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -191,3 +369,10 @@ class DeckTemplateAPIView(generics.RetrieveUpdateDestroyAPIView, ProfileCheckHel
         deck_template = get_object_or_404(queryset, **filter_kwargs)
         self.check_object_permissions(self.request, deck_template)
         return deck_template
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(DeckTemplateAPIView, self).retrieve(request, *args, **kwargs))
+
+    def perform_destroy(self, instance):
+        delete_deck_template(instance)  # Purged in the background (purgedeleted command)
+        log_event(logger, 'deck_template_deleted', user_id=self.request.user.id, deck_template_id=instance.id)
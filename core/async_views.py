@@ -0,0 +1,145 @@
+"""
+Async (ASGI) read path
+
+Async views answer GET requests without holding a worker, other methods are delegated to the sync DRF view
+(`fallback_view`). Django 4.0 has no async ORM methods, database work runs in `database_sync_to_async`
+threads (not thread-sensitive), so concurrent requests do not queue behind each other
+Enabled with SERVER_MODE=asgi (see settings and entrypoint.sh), otherwise `read_path_view` serves sync views
+"""
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from applications.models import Profile
+from contents.helpers import ProfileCheckHelper
+from core.metrics import current_request_metrics
+from core.renderers import FastJSONRenderer
+
+
+def database_sync_to_async(func):
+    """
+    Runs ORM code in the thread pool, outside of the event loop
+    Metrics of the current request (core/metrics.py) are recorded in the worker thread as well
+    """
+
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            with ExitStack() as stack:
+                metrics = current_request_metrics.get()
+                if metrics is not None:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(metrics))
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(inner, thread_sensitive=False)
+
+
+def read_path_view(async_view):
+    """
+    URL conf helper, returns async view in ASGI mode and its sync DRF fallback otherwise
+    """
+    if settings.ASYNC_READ_PATH:
+        return async_view.as_view()
+    return async_view.fallback_view.as_view()
+
+
+class AsyncAPIView(View):
+    """
+    Base async GET view: profile check and JSON rendering
+    Authentication, permissions, throttles, object permissions and error responses are those of the sync DRF view
+    (`fallback_view`), the same URL answers the same in both modes
+    Subclasses implement sync `get_data(request, *args, **kwargs)`, executed by `database_sync_to_async`
+    """
+    fallback_view = None
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncAPIView, cls).as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine  # Django 4.0 does not detect async class views
+        view.csrf_exempt = True  # Checked by DRF SessionAuthentication (fallback view is csrf exempt as well)
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            fallback = self.fallback_view.as_view()
+            return await database_sync_to_async(fallback)(request, *args, **kwargs)
+        return await database_sync_to_async(self.handle)(request, *args, **kwargs)
+
+    def handle(self, request, *args, **kwargs):
+        """
+        Errors are handled and rendered by the fallback view (DRF exception handler, content negotiation)
+        """
+        view = self.view = self.fallback_view()
+        view.setup(request, *args, **kwargs)
+        view.request = self.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            self.initial(self.request, *args, **kwargs)
+            data = self.get_data(self.request, *args, **kwargs)
+        except Exception as error:
+            response = view.finalize_response(self.request, view.handle_exception(error), *args, **kwargs)
+            return response.render()
+        return self.render(data)
+
+    def initial(self, request, *args, **kwargs):
+        self.view.initial(request, *args, **kwargs)  # Authentication, permissions and throttles
+        try:
+            request.user.profile
+        except Profile.DoesNotExist:
+            raise ProfileCheckHelper.ProfileDoesNotExist()
+
+    def check_object_permissions(self, request, obj):
+        self.view.check_object_permissions(request, obj)
+
+    def filter_queryset(self, queryset):
+        """
+        Filter backends of the fallback view, invalid filter parameters are answered by 400 as well
+        """
+        return self.view.filter_queryset(queryset)
+
+    def get_data(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status_code, content_type=self.renderer.media_type)
+
+
+class AsyncListAPIView(AsyncAPIView):
+    """
+    Paginated list, the same response format as DRF generic list views
+    `values_serializer_class` opts in the fast path of the serializer (see core/serializers.py)
+    """
+    serializer_class = None
+    values_serializer_class = None
+    renderer = FastJSONRenderer()
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+    def get_data(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        paginator = self.pagination_class()
+        if self.values_serializer_class is not None and self.values_serializer_class.supports(request):
+            serializer = self.values_serializer_class(context=self.get_serializer_context())
+            page = paginator.paginate_queryset(serializer.values(queryset), request, view=self)
+            return paginator.get_paginated_response(serializer.to_representation(page)).data
+
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data).data
@@ -0,0 +1,109 @@
+"""
+Versioned read-through cache on top of the configured cache backend (memcached)
+
+Every key embeds the current version number of a namespace (e.g. a profile or a deck template).
+Invalidation is a single `incr` of that version (see contents/signals.py), old entries are never
+read again and simply expire. Versions are bumped once the write commits, a request in between would
+cache the old data under the new version. Misses are computed by a single request only (single-flight lock),
+other requests wait for the value instead of hitting the database at the same time.
+"""
+import functools
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    key_prefix = 'lldeck'
+    lock_timeout = 10  # seconds, lock is released earlier when the value is computed
+    lock_wait = 2.0  # seconds to wait for other request to compute the value
+    lock_wait_interval = 0.05
+
+    def __init__(self, alias='default', timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @classmethod
+    def version_key(cls, namespace, identifier=None):
+        return "%s:version:%s:%s" % (cls.key_prefix, namespace, identifier if identifier is not None else '*')
+
+    @classmethod
+    def new_version(cls):
+        # Time based so an evicted version key never starts again from an already used number
+        return int(time.time() * 1000)
+
+    def get_version(self, namespace, identifier=None):
+        key = self.version_key(namespace, identifier)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, self.new_version(), None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, namespace, identifier=None, using=None):
+        """
+        Bumped when the current transaction of the `using` database (default) commits, at once outside of transactions
+        """
+        transaction.on_commit(functools.partial(self.bump_now, namespace, identifier), using=using)
+
+    def bump_now(self, namespace, identifier=None):
+        key = self.version_key(namespace, identifier)
+        try:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, self.new_version(), None)
+        except Exception as error:  # Cache backend is not available
+            logger.warning("Could not bump cache version '%s': %s", key, error)
+
+    def make_key(self, namespace, identifier, *parts):
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+        return "%s:%s:%s:%s:%s" % (
+            self.key_prefix, namespace, identifier, self.get_version(namespace, identifier), digest
+        )
+
+    def get_or_set(self, namespace, identifier, parts, producer, timeout=None):
+        """
+        Returns cached value of `producer()` for given namespace version and key parts
+        Falls back to `producer()` if cache backend is not available
+        """
+        try:
+            key = self.make_key(namespace, identifier, *parts)
+            value = self.cache.get(key)
+        except Exception as error:  # Cache backend is not available
+            logger.warning("Response cache is not available: %s", error)
+            return producer()
+
+        if value is not None:
+            return value
+
+        lock_key = "%s:lock" % key
+        if self.cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                value = producer()
+                self.cache.set(key, value, timeout or self.timeout or settings.RESPONSE_CACHE_TIMEOUT)
+            finally:
+                self.cache.delete(lock_key)
+            return value
+
+        # Someone else is computing this value, wait for it instead of querying the database
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_wait_interval)
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+        return producer()
+
+
+response_cache = VersionedCache()
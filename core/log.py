@@ -0,0 +1,190 @@
+"""
+Asynchronous logging pipeline
+
+Request threads only put log records to the queue (`AsyncFileHandler`), messages are formatted
+and written to files in batches by the single listener thread (`LogListener`)
+The queue is bounded, records are dropped (and counted) when it is full, e.g. while the disk is not writable
+Use `log_event` with ids instead of model instances, formatting must not query the database
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """
+    Logs structured event, e.g. log_event(logger, 'card_opened', user_id=1, card_id=2)
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Appends event fields to the message as `key=value` pairs (or JSON line with `json_lines=True`)
+    """
+
+    def __init__(self, fmt=None, datefmt=None, style='%', json_lines=False, **kwargs):
+        super(StructuredFormatter, self).__init__(fmt, datefmt, style, **kwargs)
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None)
+        if self.json_lines:
+            return json.dumps({
+                'time': self.formatTime(record, self.datefmt),
+                'level': record.levelname,
+                'logger': record.name,
+                'event': getattr(record, 'event', None) or record.getMessage(),
+                **(fields or {}),
+            }, default=str)
+
+        message = super(StructuredFormatter, self).format(record)
+        if fields:
+            message += ' ' + ' '.join('%s=%s' % (key, value) for key, value in fields.items())
+        return message
+
+
+class BatchFileHandler(logging.FileHandler):
+    """
+    File handler writing formatted records in batches of `capacity` lines
+    Remaining lines are written by `flush()`, called by the listener at most `flush_interval` after a record
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, delay=False, capacity=100):
+        super(BatchFileHandler, self).__init__(filename, mode, encoding, delay)
+        self.capacity = capacity
+        self.buffer = []
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+        if len(self.buffer) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            lines, self.buffer = self.buffer, []  # Lost when the write fails, the buffer stays bounded
+            if lines:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(''.join(lines))
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super(BatchFileHandler, self).close()
+
+
+class LogListener:
+    """
+    Single background thread handling queued records of every `AsyncFileHandler`
+    Errors of handlers are reported by their `handleError` (stderr), the thread keeps running
+    """
+    flush_interval = 1.0  # seconds a handled record may stay buffered before the lines are written
+    max_queued = 10000  # records, new ones are dropped when the queue is full
+    stop_record = None
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=self.max_queued)
+        self.handlers = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.dropped = 0
+
+    def register(self, handler):
+        with self.lock:
+            self.handlers.append(handler)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='log-listener', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def run(self):
+        deadline = None  # Flush time of the oldest buffered record, a steady trickle does not postpone it
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                if record is self.stop_record:
+                    self.flush()
+                    break
+                try:
+                    record.target_handler.handle(record)
+                except Exception:
+                    record.target_handler.handleError(record)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if deadline is not None and time.monotonic() >= deadline:
+                self.flush()
+                deadline = None
+
+    def put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            sys.stderr.write("Log queue is full, %s records are dropped\n" % dropped)
+        for handler in list(self.handlers):
+            try:
+                handler.flush()
+            except Exception:
+                handler.handleError(logging.makeLogRecord({'msg': 'Flush of %s' % handler}))
+
+    def stop(self):
+        with self.lock:
+            if self.thread is not None:
+                self.queue.put(self.stop_record)
+                self.thread.join()
+                self.thread = None
+
+
+listener = LogListener()
+
+
+class AsyncFileHandler(logging.handlers.QueueHandler):
+    """
+    Drop-in replacement of `logging.FileHandler` for LOGGING settings
+    Records are passed as is (not formatted) to the listener thread which writes them with `BatchFileHandler`
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, delay=True, capacity=100):
+        super(AsyncFileHandler, self).__init__(listener.queue)
+        self.target = BatchFileHandler(filename, mode, encoding, delay, capacity)
+        listener.register(self.target)
+
+    def setFormatter(self, fmt):
+        super(AsyncFileHandler, self).setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def enqueue(self, record):
+        listener.put(record)
+
+    def prepare(self, record):
+        record = copy.copy(record)  # The same record can be queued by several handlers
+        record.target_handler = self.target
+        return record
+
+    def close(self):
+        self.target.flush()
+        super(AsyncFileHandler, self).close()
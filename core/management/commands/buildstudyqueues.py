@@ -0,0 +1,32 @@
+import time
+
+from django.core.management import BaseCommand
+
+from contents.models import Deck, DeckDailyQueue
+from core.sharding import shards
+
+
+class Command(BaseCommand):
+    help = "Materialize today's study queues (new, learning and to review cards) of decks, scheduled after midnight"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--profile', type=int, nargs='*', help='Ids of profiles (default: all)', )
+        parser.add_argument('--rebuild', action="store_true", help="Rebuild queues already materialized today", )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = 0
+        for shard in shards():
+            shard_count = 0
+            decks = Deck.objects.using(shard).order_by('id')
+            if options['profile']:
+                decks = decks.filter(profile_id__in=options['profile'])
+            for deck in decks.iterator():
+                DeckDailyQueue.materialize(deck, rebuild=options['rebuild'])
+                shard_count += 1
+            self.stdout.write('%s: %s decks' % (shard, shard_count))
+            count += shard_count
+
+        self.stdout.write(self.style.SUCCESS(
+            'Study queues of %s decks are materialized in %.1fs' % (count, time.monotonic() - started)
+        ))
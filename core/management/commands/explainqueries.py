@@ -0,0 +1,101 @@
+import re
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from contents.constants import CardState
+from contents.models import Deck
+from core.sharding import shards
+
+INDEX_SCAN = re.compile(r'(?:Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)? (?:using|on) (\w+)')
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the scheduling hot path queries on a seeded dataset and report indexes they use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--deck', type=int, default=None, help='Id of the deck (default: the largest one)', )
+        parser.add_argument('--shard', type=str, default=None, help='Database alias (default: the first shard)', )
+        parser.add_argument('--analyze', action="store_true", help="Run EXPLAIN ANALYZE (executes the queries)", )
+        parser.add_argument('--verbose-plans', action="store_true", help="Print full query plans", )
+        parser.add_argument('--strict', action="store_true", help="Fail if an expected index is not used", )
+
+    def handle(self, *args, **options):
+        shard = options['shard'] or shards()[0]
+        if shard not in shards():
+            raise CommandError("Unknown shard '%s'" % shard)
+
+        deck = self.get_deck(shard, options['deck'])
+        card = deck.cards.filter(statistics__isnull=False).first() or deck.cards.first()
+        if card is None:
+            raise CommandError("Deck %s has no cards, seed the database first (seed command)" % deck.id)
+        self.stdout.write('Deck %s (%s cards) on %s\n' % (deck.id, deck.cards_count, shard))
+
+        with connections[shard].cursor() as cursor:
+            cursor.execute('ANALYZE')  # Fresh planner statistics after seeding
+
+        missing = []
+        for name, queryset, expected in self.get_queries(deck, card):
+            plan = queryset.explain(analyze=options['analyze'])
+            indexes = INDEX_SCAN.findall(plan)
+            sequential = SEQ_SCAN.findall(plan)
+            used = expected in indexes
+            if not used:
+                missing.append(name)
+
+            status = self.style.SUCCESS('[index]') if used else self.style.ERROR('[no index]')
+            self.stdout.write('%s %s' % (status, name))
+            self.stdout.write('    expected: %s, indexes: %s, sequential scans: %s' % (
+                expected, ', '.join(indexes) or '-', ', '.join(sequential) or '-'
+            ))
+            if options['verbose_plans']:
+                self.stdout.write('\n'.join('    | %s' % line for line in plan.splitlines()))
+
+        if missing and options['strict']:
+            raise CommandError('Expected indexes are not used: %s' % ', '.join(missing))
+
+    @classmethod
+    def get_deck(cls, shard, deck_id):
+        decks = Deck.objects.using(shard).all()
+        if deck_id is not None:
+            decks = decks.filter(id=deck_id)
+        else:
+            decks = decks.annotate(Count('cards')).order_by('-cards__count')
+        deck = decks.first()
+        if deck is None:
+            raise CommandError("No decks found on %s, seed the database first (seed command)" % shard)
+        return deck
+
+    @classmethod
+    def get_queries(cls, deck, card):
+        """
+        List of (name, queryset, expected index)
+        Unique (deck, date) and (card, date) indexes are named by Django, their names are read from the schema
+        """
+        today = timezone.now().date()
+        return [
+            ('Cards to review (get_to_review_cards)', deck.get_to_review_cards(), 'card_deck_state_next_date_idx'),
+            ('New cards (get_daily_new_card_ids)',
+             deck.cards.filter(state=CardState.STATE_IDLE).order_by('position').values_list('id', flat=True)[:20],
+             'card_deck_state_position_idx'),
+            ('Forecast (GROUP BY next_date)',
+             deck.cards.filter(state=CardState.STATE_GOOD, next_date__lte=today + timezone.timedelta(days=30))
+             .values('next_date').annotate(Count('id')).order_by(), 'card_deck_state_next_date_idx'),
+            ('Learning today (learning_today_count)', deck.get_learning_today_cards(), 'card_deck_good_opened_idx'),
+            ('Today statistics (get_today_statistics)', deck.statistics.filter(date=today),
+             cls.unique_index(deck.statistics.model, deck.statistics.all().db, ['deck_id', 'date'])),
+            ('Card succeeded today (is_succeeded_today)', card.statistics.filter(date=today),
+             cls.unique_index(card.statistics.model, card.statistics.all().db, ['card_id', 'date'])),
+        ]
+
+    @classmethod
+    def unique_index(cls, model, using, columns):
+        with connections[using].cursor() as cursor:
+            constraints = connections[using].introspection.get_constraints(cursor, model._meta.db_table)
+        for name, constraint in constraints.items():
+            if (constraint['index'] or constraint['unique']) and constraint['columns'] == columns:
+                return name
+        return '<missing unique (%s) index>' % ', '.join(columns)
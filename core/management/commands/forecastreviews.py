@@ -0,0 +1,43 @@
+import time
+
+import numpy
+from django.core.management import BaseCommand
+
+from contents.forecast import simulation_input, simulate_reviews, scheduled_forecast, DEFAULT_SUCCESS_RATE
+from contents.models import Card
+from core.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Project review load of all users (or given profiles) for the next days, used for capacity planning'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', type=int, default=30, help='Count of days to project', )
+        parser.add_argument('-p', '--profile', type=int, nargs='*', help='Ids of profiles (default: all)', )
+        parser.add_argument('-r', '--success-rate', type=float, default=DEFAULT_SUCCESS_RATE,
+                            help='Share of successful reviews', )
+        parser.add_argument('-s', '--seed', type=int, default=None, help='Random seed of the simulation', )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = options['days']
+        scheduled = numpy.zeros(days, dtype=numpy.int64)
+        arrays = []
+        for shard in shards():
+            cards = Card.objects.using(shard).filter(deck__deleted_at=None)
+            if options['profile']:
+                cards = cards.filter(deck__profile_id__in=options['profile'])
+            scheduled += scheduled_forecast(cards, days)
+            arrays.append(simulation_input(cards))
+
+        due, k, successes = (numpy.concatenate(columns) for columns in zip(*arrays))
+        projected = simulate_reviews(due, k, successes, days, options['success_rate'], options['seed'])
+
+        self.stdout.write('Day\tScheduled\tProjected')
+        for day in range(days):
+            self.stdout.write('%s\t%s\t%s' % (day, scheduled[day], projected[day]))
+        self.stdout.write(self.style.SUCCESS(
+            'Cards: %s, projected reviews: %s (peak %s per day), took %.1fs' % (
+                due.size, projected.sum(), projected.max() if days else 0, time.monotonic() - started
+            )
+        ))
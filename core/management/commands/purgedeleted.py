@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from contents.models import Deck, DeckTemplate
+from contents.purge import purge_deck, purge_deck_template, purge_user
+from core.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Purge decks, deck templates and accounts marked as deleted in bounded batches, run as a background worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=1000, help='Rows per DELETE', )
+        parser.add_argument(
+            '--watch', type=float, default=None,
+            help='Keep running, checking for deleted decks, deck templates and accounts every given seconds', )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            decks, cards, deck_templates, users = self.purge(options['batch_size'])
+            if decks or deck_templates or users or options['watch'] is None:
+                self.stdout.write(self.style.SUCCESS(
+                    'Purged %s decks (%s cards), %s deck templates and %s accounts in %.1fs' % (
+                        decks, cards, deck_templates, users, time.monotonic() - started
+                    )
+                ))
+            if options['watch'] is None:
+                return
+            time.sleep(options['watch'])
+
+    @classmethod
+    def purge(cls, batch_size):
+        """
+        Returns counts of the purged decks, cards, deck templates and accounts
+        Deck templates of the deleted accounts are purged with them
+        """
+        decks = cards = deck_templates = users = 0
+        for shard in shards():
+            for deck in Deck.all_objects.using(shard).filter(deleted_at__isnull=False).order_by('deleted_at'):
+                cards += purge_deck(deck, batch_size)
+                decks += 1
+
+        deleted_users = get_user_model().all_objects.filter(deleted_at__isnull=False)
+        for deck_template in DeckTemplate.all_objects.filter(deleted_at__isnull=False) \
+                .exclude(creator__user__in=deleted_users).order_by('deleted_at'):
+            purge_deck_template(deck_template, batch_size)
+            deck_templates += 1
+
+        for user in deleted_users.order_by('deleted_at'):
+            purge_user(user, batch_size)
+            users += 1
+        return decks, cards, deck_templates, users
@@ -0,0 +1,184 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from applications.models import Profile
+from contents.models import Deck, Card, CardFrontContent, CardBackContent, DeckDailyStatistics, DeckDailyQueue, \
+    CardSucceededStatistics, CardStudyStep, DeckDailySummary, ProfileDailySummary, ProfileYearlySummary
+from core.sharding import shards, choose_shard, forget_profile_shard, SHARD_SLOTS
+
+# Copy order (parents first), rows are deleted from the source shard in the reverse order
+SHARDED_ROWS = (
+    (Deck, 'profile_id'),
+    (Deck.tags.through, 'deck__profile_id'),
+    (Card, 'deck__profile_id'),
+    (CardFrontContent, 'card__deck__profile_id'),
+    (CardBackContent, 'card__deck__profile_id'),
+    (DeckDailyStatistics, 'deck__profile_id'),
+    (DeckDailyQueue, 'deck__profile_id'),
+    (DeckDailyStatistics.cards_learned.through, 'deckdailystatistics__deck__profile_id'),
+    (DeckDailyStatistics.cards_failed.through, 'deckdailystatistics__deck__profile_id'),
+    (CardSucceededStatistics, 'card__deck__profile_id'),
+    (CardStudyStep, 'card__deck__profile_id'),
+    (DeckDailySummary, 'deck__profile_id'),
+    (ProfileDailySummary, 'profile_id'),
+    (ProfileYearlySummary, 'profile_id'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Move profiles (decks, cards, contents and statistics) between database shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--profile', type=int, nargs='*', help='Ids of profiles to move', )
+        parser.add_argument('-t', '--to', type=str, help='Target shard alias (default: placement of the profile)', )
+        parser.add_argument('-l', '--limit', type=int, default=None, help='Max count of profiles to move', )
+        parser.add_argument('-b', '--batch-size', type=int, default=5000, help='Rows per bulk insert', )
+        parser.add_argument(
+            '-s', '--settle', type=float, default=5.0,
+            help='Seconds to wait for requests with the old shard map before rows written by them are merged', )
+        parser.add_argument('--dry-run', action="store_true", help="Only print planned moves", )
+        parser.add_argument(
+            '--setup-sequences', action="store_true",
+            help="Interleave id sequences of sharded tables, required once after adding shards", )
+
+    def handle(self, *args, **options):
+        if options['to'] and options['to'] not in shards():
+            raise CommandError("Unknown shard '%s', configured: %s" % (options['to'], ', '.join(shards())))
+
+        if options['setup_sequences']:
+            self.setup_sequences()
+            return
+
+        profiles = Profile.objects.using('default').order_by('id')
+        if options['profile']:
+            profiles = profiles.filter(id__in=options['profile'])
+
+        moved = 0
+        for profile in profiles.iterator():
+            target = options['to'] or choose_shard(profile.user_id)
+            source = profile.shard or shards()[0]
+            if source == target:
+                continue
+            if options['limit'] is not None and moved >= options['limit']:
+                break
+
+            self.stdout.write("Profile %s: %s -> %s" % (profile.id, source, target))
+            if not options['dry_run']:
+                self.move_profile(profile, source, target, options['batch_size'])
+                time.sleep(options['settle'])
+                conflicts = self.merge_leftovers(profile, source, target, options['batch_size'])
+                if conflicts:
+                    self.stderr.write("Profile %s: rows written to %s during the move conflict with %s: %s" % (
+                        profile.id, source, target, ', '.join('%s %s' % item for item in conflicts.items())
+                    ))
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS('Moved profiles: %s' % moved))
+
+    @classmethod
+    def move_profile(cls, profile, source, target, batch_size):
+        """
+        Copies rows of the profile to the target shard (keeping ids), switches shard map and deletes the copied rows
+        1. The profile row is locked on `default` (concurrent moves wait), copied rows are locked on the source
+           until their deletion (updates of them wait)
+        2. The target transaction commits, then the shard map is switched (committed on `default`)
+           and its cached entries are cleared in every process (see core/sharding.py)
+        3. The copied rows are deleted from the source
+        A failure before the switch leaves the profile on the source (copies are removed from the target)
+        Rows written to the source during the move (by requests that read the old shard map) are merged later
+        by `merge_leftovers`
+        Rows are deleted without signals: content files are shared by both copies
+        Base managers include the decks marked as deleted (see contents/purge.py)
+        """
+        copied = None
+        with transaction.atomic(using=source):
+            try:
+                with transaction.atomic(using='default'):
+                    Profile.objects.using('default').select_for_update().filter(id=profile.id).values_list('id').first()
+                    with transaction.atomic(using=target):
+                        copied = cls.copy_rows(profile, source, target, batch_size)
+                    Profile.objects.using('default').filter(id=profile.id).update(shard=target)
+            except Exception:
+                if copied is not None and target != 'default':  # Committed on the target before the failed switch
+                    cls.delete_rows(target, copied)
+                raise
+            forget_profile_shard(profile.id)
+            cls.delete_rows(source, copied)
+
+    @classmethod
+    def merge_leftovers(cls, profile, source, target, batch_size):
+        """
+        Copies rows of the profile still written to the source after the move to the target and deletes them
+        Ids are unique across shards, rows conflicting with the target by other unique fields (e.g. statistics
+        of the same deck and day) are kept on the source, their counts are returned to be reported
+        """
+        conflicts = {}
+        with transaction.atomic(using=source):
+            with transaction.atomic(using=target):
+                leftovers = cls.copy_rows(profile, source, target, batch_size, ignore_conflicts=True)
+                merged = []
+                for model, ids in leftovers:
+                    inserted = set()
+                    for i in range(0, len(ids), 5000):
+                        rows = model._base_manager.using(target).filter(pk__in=ids[i:i + 5000])
+                        inserted.update(rows.values_list('pk', flat=True))
+                    if len(inserted) < len(ids):
+                        conflicts[model._meta.label] = len(ids) - len(inserted)
+                    merged.append((model, [pk for pk in ids if pk in inserted]))
+                cls.delete_rows(source, merged)
+        return conflicts
+
+    @classmethod
+    def copy_rows(cls, profile, source, target, batch_size, ignore_conflicts=False):
+        """
+        Returns [(model, copied ids)] in the copy order
+        """
+        copied = []
+        for model, profile_lookup in SHARDED_ROWS:
+            rows = model._base_manager.using(source).filter(**{profile_lookup: profile.id}) \
+                .select_for_update(of=('self',)).order_by('pk')
+            ids, batch = [], []
+            for row in rows.iterator(chunk_size=batch_size):
+                ids.append(row.pk)
+                row._state.db = None
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    model._base_manager.using(target).bulk_create(batch, ignore_conflicts=ignore_conflicts)
+                    batch = []
+            model._base_manager.using(target).bulk_create(batch, ignore_conflicts=ignore_conflicts)
+            copied.append((model, ids))
+        return copied
+
+    @classmethod
+    def delete_rows(cls, using, copied):
+        for model, ids in reversed(copied):
+            for i in range(0, len(ids), 5000):
+                model._base_manager.using(using).filter(pk__in=ids[i:i + 5000])._raw_delete(using)
+
+    def setup_sequences(self):
+        """
+        Shard N generates ids N, N + SHARD_SLOTS, N + 2 * SHARD_SLOTS... above the current max id of all shards
+        """
+        if len(shards()) > SHARD_SLOTS:
+            raise CommandError("At most %s shards are supported" % SHARD_SLOTS)
+
+        for model, profile_lookup in SHARDED_ROWS:
+            table = model._meta.db_table
+            last_id = 0
+            for shard in shards():
+                with connections[shard].cursor() as cursor:
+                    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM %s" % connections[shard].ops.quote_name(table))
+                    last_id = max(last_id, cursor.fetchone()[0])
+
+            for index, shard in enumerate(shards()):
+                start = (last_id // SHARD_SLOTS + 1) * SHARD_SLOTS + index
+                with connections[shard].cursor() as cursor:
+                    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                    sequence = cursor.fetchone()[0]
+                    cursor.execute("ALTER SEQUENCE %s INCREMENT BY %s" % (sequence, SHARD_SLOTS))
+                    cursor.execute("SELECT setval(%s, %s, false)", [sequence, start])
+            self.stdout.write("%s: ids interleaved from %s" % (table, last_id))
+
+        self.stdout.write(self.style.SUCCESS('Sequences of %s shards are set up' % len(shards())))
@@ -0,0 +1,91 @@
+import time
+
+import numpy
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, F
+from django.utils import timezone
+
+from contents.constants import CardState
+from contents.models import Card, Deck, DeckDailyQueue
+from contents.schedulers import get_scheduler
+from core.cache import response_cache
+from core.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Recompute next review dates of learned cards with the scheduler, in vectorized batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--deck', type=int, nargs='*', help='Ids of decks (default: all)', )
+        parser.add_argument('-p', '--profile', type=int, nargs='*', help='Ids of profiles (default: all)', )
+        parser.add_argument('--scheduler', type=str, default=None,
+                            help='Dotted path of the scheduler class (default: CARD_SCHEDULER setting)', )
+        parser.add_argument('-b', '--batch-size', type=int, default=10000, help='Cards per batch', )
+        parser.add_argument('--dry-run', action="store_true", help="Compute without writing", )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        scheduler = get_scheduler(options['scheduler'])
+        total = changed = 0
+
+        for shard in shards():
+            decks = Deck.objects.using(shard).all()
+            if options['deck']:
+                decks = decks.filter(id__in=options['deck'])
+            if options['profile']:
+                decks = decks.filter(profile_id__in=options['profile'])
+            cards = Card.objects.using(shard).filter(deck__in=decks, state=CardState.STATE_GOOD).order_by() \
+                .annotate(success_count=Count('statistics'), last_success=Max('statistics__date')) \
+                .filter(success_count__gt=0).values_list('id', 'next_date', 'k', 'success_count', 'last_success')
+
+            batch = []
+            for row in cards.iterator(chunk_size=options['batch_size']):
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    changed += self.reschedule(shard, scheduler, batch, options)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                changed += self.reschedule(shard, scheduler, batch, options)
+                total += len(batch)
+
+            if not options['dry_run']:
+                self.invalidate(shard, decks)
+            self.stdout.write('%s: %s cards' % (shard, total))
+
+        self.stdout.write(self.style.SUCCESS('Rescheduled cards: %s of %s%s in %.1fs' % (
+            changed, total, ' (dry run)' if options['dry_run'] else '', time.monotonic() - started
+        )))
+
+    @classmethod
+    def reschedule(cls, shard, scheduler, rows, options):
+        """
+        Next date is the last success date plus the interval of the success (current `k` is used)
+        Returns count of cards with changed next date
+        """
+        ids, next_dates, k, success_counts, last_successes = zip(*rows)
+        intervals = scheduler.intervals(numpy.array(k, dtype=numpy.float64),
+                                        numpy.array(success_counts, dtype=numpy.int64) - 1)
+        computed = (numpy.array(last_successes, dtype='datetime64[D]') + intervals.astype('timedelta64[D]')) \
+            .astype(object)
+
+        updated = [
+            Card(id=card_id, next_date=next_date, version=F('version') + 1)  # Stale transitions are retried
+            for card_id, previous, next_date in zip(ids, next_dates, computed) if previous != next_date
+        ]
+        if updated and not options['dry_run']:
+            with transaction.atomic(using=shard):
+                Card.objects.using(shard).bulk_update(
+                    updated, ['next_date', 'version'], batch_size=options['batch_size']
+                )
+        return len(updated)
+
+    @classmethod
+    def invalidate(cls, shard, decks):
+        """
+        bulk_update does not send signals: study queues of today and profile responses are dropped here
+        """
+        DeckDailyQueue.objects.using(shard).filter(deck__in=decks, date=timezone.now().date()).delete()
+        for profile_id in decks.order_by().values_list('profile_id', flat=True).distinct():
+            response_cache.bump('profile', profile_id, using=shard)
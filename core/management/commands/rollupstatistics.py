@@ -0,0 +1,138 @@
+import datetime
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum, F, Count, Exists, OuterRef
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from contents.models import DeckDailyStatistics, DeckDailySummary, ProfileDailySummary, ProfileYearlySummary
+from contents.history import MAX_HISTORY_DAYS
+from core.cache import response_cache
+from core.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Roll up daily deck statistics into deck and profile summaries (history), scheduled after midnight'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, default=None, help='Last day, YYYY-MM-DD (default: yesterday)', )
+        parser.add_argument('--days', type=int, default=1, help='Count of days to roll up, ending with the date', )
+        parser.add_argument('-p', '--profile', type=int, nargs='*', help='Ids of profiles (default: all)', )
+        parser.add_argument('-b', '--batch-size', type=int, default=5000, help='Rows per bulk insert', )
+        parser.add_argument(
+            '--archive-days', type=int, default=None,
+            help='Archive statistics older than the count of days (at least %s, the history range): raw statistics '
+                 'are deleted (summaries are kept), profile daily summaries are folded into yearly summaries'
+                 % MAX_HISTORY_DAYS, )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        today = timezone.now().date()
+        try:
+            last = datetime.date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError("Invalid date '%s', expected YYYY-MM-DD" % options['date'])
+        last = last or today - timezone.timedelta(days=1)
+        if last >= today:
+            raise CommandError("Only past days can be rolled up, today's statistics are still changing")
+        first = last - timezone.timedelta(days=max(1, options['days']) - 1)
+        if options['archive_days'] is not None and options['archive_days'] < MAX_HISTORY_DAYS:
+            raise CommandError("At least %s days are kept, history of the profile is read from them" % MAX_HISTORY_DAYS)
+
+        for shard in shards():
+            statistics = DeckDailyStatistics.objects.using(shard).all()
+            if options['profile']:
+                statistics = statistics.filter(deck__profile_id__in=options['profile'])
+
+            profile_ids = self.roll_up(shard, statistics, first, last, options)
+            if options['archive_days'] is not None:
+                cutoff = today - timezone.timedelta(days=options['archive_days'])
+                profile_ids |= self.archive(shard, statistics, cutoff, options)
+
+            for profile_id in profile_ids:
+                response_cache.bump('profile', profile_id, using=shard)
+            self.stdout.write('%s: %s profiles' % (shard, len(profile_ids)))
+
+        self.stdout.write(self.style.SUCCESS('Statistics from %s to %s are rolled up in %.1fs' % (
+            first, last, time.monotonic() - started
+        )))
+
+    @classmethod
+    def roll_up(cls, shard, statistics, first, last, options):
+        """
+        Replaces summaries of the days, rolling up is repeatable
+        Summaries of the archived days (raw statistics are deleted) are kept
+        Returns ids of the rolled up profiles
+        """
+        statistics = statistics.filter(date__range=(first, last)).order_by()
+        decks = statistics.values_list('deck_id', 'date', 'learned_count', 'failed_count', 'seconds_gone')
+        profiles = statistics.values('deck__profile_id', 'date').annotate(
+            learned=Sum('learned_count'), failed=Sum('failed_count'), seconds=Sum('seconds_gone')
+        ).values_list('deck__profile_id', 'date', 'learned', 'failed', 'seconds')
+
+        with transaction.atomic(using=shard):
+            DeckDailySummary.objects.using(shard).filter(date__range=(first, last)).filter(Exists(
+                statistics.filter(deck_id=OuterRef('deck_id'), date=OuterRef('date'))
+            )).delete()
+            ProfileDailySummary.objects.using(shard).filter(date__range=(first, last)).filter(Exists(
+                statistics.filter(deck__profile_id=OuterRef('profile_id'), date=OuterRef('date'))
+            )).delete()
+
+            DeckDailySummary.objects.using(shard).bulk_create([
+                DeckDailySummary(
+                    deck_id=deck_id, date=date, reviews=learned + failed, learned=learned, failed=failed,
+                    seconds=seconds
+                ) for deck_id, date, learned, failed, seconds in decks.iterator(chunk_size=options['batch_size'])
+            ], batch_size=options['batch_size'])
+
+            rows = list(profiles)
+            ProfileDailySummary.objects.using(shard).bulk_create([
+                ProfileDailySummary(
+                    profile_id=profile_id, date=date, reviews=learned + failed, learned=learned, failed=failed,
+                    seconds=seconds
+                ) for profile_id, date, learned, failed, seconds in rows
+            ], batch_size=options['batch_size'])
+        return {row[0] for row in rows}
+
+    @classmethod
+    def archive(cls, shard, statistics, cutoff, options):
+        """
+        Rolls up the days before the cutoff which are not rolled up yet, deletes their raw statistics
+        and folds profile daily summaries into yearly ones
+        Returns ids of the archived profiles
+        """
+        profile_ids = set()
+        archived = statistics.filter(date__lt=cutoff)
+        first = archived.order_by('date').values_list('date', flat=True).first()
+        if first is not None:
+            profile_ids |= cls.roll_up(shard, statistics, first, cutoff - timezone.timedelta(days=1), options)
+            # Deleted without signals, caches of the profiles are bumped once
+            archived_ids = archived.values('id')
+            with transaction.atomic(using=shard):
+                for through in (DeckDailyStatistics.cards_learned.through, DeckDailyStatistics.cards_failed.through):
+                    through.objects.using(shard).filter(deckdailystatistics_id__in=archived_ids)._raw_delete(shard)
+                DeckDailyStatistics.objects.using(shard).filter(id__in=archived_ids)._raw_delete(shard)
+
+        summaries = ProfileDailySummary.objects.using(shard).filter(date__lt=cutoff)
+        if options['profile']:
+            summaries = summaries.filter(profile_id__in=options['profile'])
+        years = summaries.order_by().values('profile_id', year=ExtractYear('date')).annotate(
+            reviews_sum=Sum('reviews'), learned_sum=Sum('learned'), failed_sum=Sum('failed'),
+            seconds_sum=Sum('seconds'), days=Count('id')
+        )
+
+        with transaction.atomic(using=shard):
+            for row in years:
+                summary, created = ProfileYearlySummary.objects.using(shard).select_for_update().get_or_create(
+                    profile_id=row['profile_id'], year=row['year']
+                )
+                ProfileYearlySummary.objects.using(shard).filter(id=summary.id).update(
+                    reviews=F('reviews') + row['reviews_sum'], learned=F('learned') + row['learned_sum'],
+                    failed=F('failed') + row['failed_sum'], seconds=F('seconds') + row['seconds_sum'],
+                    active_days=F('active_days') + row['days'],
+                )
+                profile_ids.add(row['profile_id'])
+            summaries._raw_delete(shard)
+        return profile_ids
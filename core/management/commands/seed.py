@@ -0,0 +1,350 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from applications.models import Profile
+from authentication.models import User
+from contents.constants import CardState
+from contents.models import DeckTag, DeckTemplate, CardTemplate, CardTemplateFrontContent, CardTemplateBackContent, \
+    Deck, Card, CardFrontContent, CardBackContent, DeckDailyStatistics, CardSucceededStatistics
+from core.sharding import choose_shard, shards
+
+SYLLABLES = (
+    'ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vo', 'zi', 'an', 'el', 'or', 'un', 'is', 'de', 'po', 'ri', 'ta',
+    'ble', 'con', 'dis', 'ment', 'tion', 'pre', 'ing', 'er', 'ous', 'al', 'ly', 'ive',
+)
+
+CARD_STATE_WEIGHTS = (
+    (CardState.STATE_IDLE, 40),
+    (CardState.STATE_VIEWED, 10),
+    (CardState.STATE_AGAIN, 10),
+    (CardState.STATE_GOOD, 40),
+)
+
+
+@contextmanager
+def auto_now_disabled(*fields):
+    """
+    Allows writing historical dates to `auto_now` / `auto_now_add` fields with bulk_create
+    """
+    previous = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in previous:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    """
+    Random content generator, one instance per worker (random.Random is not shared between threads)
+    """
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def word(self, min_syllables=1, max_syllables=4):
+        return ''.join(self.random.choice(SYLLABLES) for i in range(self.random.randint(min_syllables, max_syllables)))
+
+    def sentence(self, min_words=4, max_words=14):
+        return ' '.join(self.word() for i in range(self.random.randint(min_words, max_words))).capitalize() + '.'
+
+    def deck_name(self):
+        return ' '.join(self.word(2, 3) for i in range(self.random.randint(1, 3))).title()[:128]
+
+    def card_state(self):
+        states, weights = zip(*CARD_STATE_WEIGHTS)
+        return self.random.choices(states, weights)[0]
+
+    def front_content(self, **kwargs):
+        return dict(word=self.word(2, 5)[:128], helper_text=self.word()[:128] if self.random.random() < 0.3 else None,
+                    **kwargs)
+
+    def back_content(self, **kwargs):
+        examples = [self.sentence(3, 8)[:128] for i in range(self.random.randint(0, 3))]
+        return dict(definition=self.sentence(), examples=examples, **kwargs)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic data (users, decks, cards, templates and statistics history) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--users', type=int, default=100, help='Count of users (with profiles)', )
+        parser.add_argument('-d', '--decks', type=int, default=5, help='Count of decks per user', )
+        parser.add_argument('-c', '--cards', type=int, default=100, help='Count of cards per deck', )
+        parser.add_argument('-t', '--templates', type=int, default=50, help='Count of deck templates', )
+        parser.add_argument('--template-cards', type=int, default=50, help='Count of cards per deck template', )
+        parser.add_argument('--tags', type=int, default=200, help='Count of deck tags', )
+        parser.add_argument('--days', type=int, default=90, help='Days of statistics history', )
+        parser.add_argument('-b', '--batch-size', type=int, default=5000, help='Rows per bulk insert', )
+        parser.add_argument('-w', '--workers', type=int, default=4, help='Count of parallel insert workers', )
+        parser.add_argument(
+            '-s', '--seed', type=int, default=None,
+            help='Random seed for reproducible data (random and printed by default)', )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+        self.run_key = uuid.uuid4().hex[:8]
+        if options['seed'] is None:  # Printed to reproduce the run
+            options['seed'] = random.SystemRandom().randrange(2 ** 32)
+            self.stdout.write('Seed: %s' % options['seed'])
+        generator = Generator(options['seed'])
+
+        with auto_now_disabled(
+                DeckDailyStatistics._meta.get_field('date'),
+                CardSucceededStatistics._meta.get_field('date'),
+                CardSucceededStatistics._meta.get_field('date_time'),
+        ):
+            tag_ids = self.create_tags(generator, options['tags'])
+            self.stdout.write('Tags: %s' % len(tag_ids))
+
+            profile_shards = self.create_users(options['users'])
+            profile_ids = list(profile_shards)
+            self.stdout.write('Users and profiles: %s' % len(profile_ids))
+
+            templates = self.create_templates(generator, profile_ids, tag_ids)
+            self.stdout.write('Deck templates: %s' % len(templates))
+
+            # Bounded count of cards per worker task to keep memory flat on large datasets
+            chunk_size = max(1, self.batch_size * 10 // max(1, options['decks'] * options['cards']))
+            by_shard = {}
+            for profile_id, shard in profile_shards.items():
+                by_shard.setdefault(shard, []).append(profile_id)
+            chunks = [
+                (shard, ids[i:i + chunk_size])
+                for shard, ids in by_shard.items() for i in range(0, len(ids), chunk_size)
+            ]
+            totals = {}
+            for result in self.run_workers(chunks, tag_ids, templates):
+                for key, value in result.items():
+                    totals[key] = totals.get(key, 0) + value
+                self.stdout.write('Decks: %(decks)s, cards: %(cards)s' % totals)
+
+        self.stdout.write()
+        for key, value in totals.items():
+            self.stdout.write('%s: %s' % (key.replace('_', ' ').capitalize(), value))
+        self.stdout.write(self.style.SUCCESS('Seeding finished in %.1fs' % (time.monotonic() - started)))
+
+    def bulk_create(self, model, objects, using='default'):
+        return model.objects.using(using).bulk_create(objects, batch_size=self.batch_size)
+
+    def create_tags(self, generator, count):
+        names = set()
+        while len(names) < count:
+            names.add(('%s-%s' % (generator.word(1, 2), len(names)))[:16])
+        DeckTag.objects.bulk_create([DeckTag(name=name) for name in names], ignore_conflicts=True)
+        tags = list(DeckTag.objects.filter(name__in=names))
+        for shard in shards()[1:]:  # Replicated to shards (see core/sharding.py), bulk_create sends no signals
+            DeckTag.objects.using(shard).bulk_create(tags, ignore_conflicts=True)
+        return [tag.id for tag in tags]
+
+    def create_users(self, count):
+        password = make_password('password')  # Hashing is the slowest part, the same hash for everyone
+        users = self.bulk_create(User, [
+            User(name='Seed user %s' % i, email='seed-%s-%s@lldeck.local' % (self.run_key, i), password=password)
+            for i in range(count)
+        ])
+        profiles = self.bulk_create(Profile, [Profile(user_id=user.id, shard=choose_shard(user.id)) for user in users])
+        return {profile.id: profile.shard for profile in profiles}
+
+    @transaction.atomic
+    def create_templates(self, generator, profile_ids, tag_ids):
+        """
+        Creates deck templates with cards and contents
+        Returns list of (template id, [(card template id, front content id, back content id), ...])
+        """
+        deck_templates = self.bulk_create(DeckTemplate, [
+            DeckTemplate(
+                name=generator.deck_name(), creator_id=generator.random.choice(profile_ids),
+                public=generator.random.random() < 0.7,
+            ) for i in range(self.options['templates'])
+        ] if profile_ids else [])
+
+        self.bulk_create(DeckTemplate.tags.through, [
+            DeckTemplate.tags.through(decktemplate_id=deck_template.id, decktag_id=tag_id)
+            for deck_template in deck_templates
+            for tag_id in generator.random.sample(tag_ids, min(len(tag_ids), generator.random.randint(0, 3)))
+        ])
+        self.bulk_create(DeckTemplate.liked.through, [
+            DeckTemplate.liked.through(decktemplate_id=deck_template.id, profile_id=profile_id)
+            for deck_template in deck_templates
+            for profile_id in generator.random.sample(
+                profile_ids, min(len(profile_ids), int(generator.random.paretovariate(1.5)) - 1)
+            )
+        ])
+
+        card_templates = self.bulk_create(CardTemplate, [
+            CardTemplate(name=generator.word(2, 4), deck_id=deck_template.id)
+            for deck_template in deck_templates
+            for i in range(self.options['template_cards'])
+        ])
+        self.bulk_create(CardTemplateFrontContent, [
+            CardTemplateFrontContent(**generator.front_content(card_id=card.id)) for card in card_templates
+        ])
+        self.bulk_create(CardTemplateBackContent, [
+            CardTemplateBackContent(**generator.back_content(card_id=card.id)) for card in card_templates
+        ])
+
+        templates = {deck_template.id: [] for deck_template in deck_templates}
+        for card in card_templates:
+            templates[card.deck_id].append(card.id)
+        return list(templates.items())
+
+    def run_workers(self, chunks, tag_ids, templates):
+        """
+        Yields results of the chunks in order, single worker runs in the current thread and connection
+        (e.g. inside of the test case transaction)
+        """
+        seed = self.options['seed']
+        if self.options['workers'] <= 1:
+            for index, (shard, chunk) in enumerate(chunks):
+                yield self.seed_profiles(shard, chunk, tag_ids, templates, seed + index)
+            return
+
+        def worker(index, shard, chunk):
+            try:
+                return self.seed_profiles(shard, chunk, tag_ids, templates, seed + index)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.options['workers']) as executor:
+            futures = [executor.submit(worker, index, *chunk) for index, chunk in enumerate(chunks)]
+            for future in futures:
+                yield future.result()
+
+    def seed_profiles(self, shard, profile_ids, tag_ids, templates, seed):
+        """
+        Creates decks, cards, contents and statistics history of the given profiles (of the same shard)
+        in one transaction
+        """
+        with transaction.atomic(using=shard):
+            return self._seed_profiles(Generator(seed), shard, profile_ids, tag_ids, templates)
+
+    def _seed_profiles(self, generator, shard, profile_ids, tag_ids, templates):
+        options = self.options
+        decks, deck_templates = [], []
+        for profile_id in profile_ids:
+            for i in range(options['decks']):
+                template = generator.random.choice(templates) if templates and generator.random.random() < 0.2 \
+                    else None
+                decks.append(Deck(
+                    name=generator.deck_name(), profile_id=profile_id, favorite=generator.random.random() < 0.1,
+                    template_id=template[0] if template else None
+                ))
+                deck_templates.append(template)
+        decks = self.bulk_create(Deck, decks, shard)
+
+        self.bulk_create(Deck.tags.through, [
+            Deck.tags.through(deck_id=deck.id, decktag_id=tag_id)
+            for deck in decks
+            for tag_id in generator.random.sample(tag_ids, min(len(tag_ids), generator.random.randint(0, 3)))
+        ], shard)
+        self.bulk_create(DeckTemplate.downloaded.through, list({
+            (deck.template_id, deck.profile_id): DeckTemplate.downloaded.through(
+                decktemplate_id=deck.template_id, profile_id=deck.profile_id
+            ) for deck in decks if deck.template_id
+        }.values()))
+
+        cards = []
+        for deck, template in zip(decks, deck_templates):
+            if template:
+                items = template[1]
+            else:
+                items = [None] * options['cards']
+            for number, card_template_id in enumerate(items, 1):
+                state = generator.card_state()
+                cards.append(Card(
+                    name=generator.word(2, 4), deck_id=deck.id, template_id=card_template_id, state=state,
+                    position=number * Card.POSITION_GAP,
+                    k=round(generator.random.uniform(1.3, 3.5), 1),
+                    opened_date=timezone.now() - timezone.timedelta(days=generator.random.randint(0, options['days']))
+                    if state != CardState.STATE_IDLE else None,
+                ))
+        cards = self.bulk_create(Card, cards, shard)
+
+        # Cards of templates share the content of the card templates (copy-on-write, see `Card.get_content`)
+        self.bulk_create(CardFrontContent, [
+            CardFrontContent(**generator.front_content(card_id=card.id))
+            for card in cards if card.template_id is None
+        ], shard)
+        self.bulk_create(CardBackContent, [
+            CardBackContent(**generator.back_content(card_id=card.id))
+            for card in cards if card.template_id is None
+        ], shard)
+
+        successes = self.create_card_history(generator, shard, cards)
+        statistics = self.create_deck_history(generator, shard, cards)
+        return {
+            'decks': len(decks), 'cards': len(cards),
+            'card_succeeded_statistics': successes, 'deck_daily_statistics': statistics,
+        }
+
+    def create_card_history(self, generator, shard, cards):
+        """
+        Success history of the learned (GOOD) cards, `next_date` follows the default `k ** success_count` interval
+        """
+        days = self.options['days']
+        statistics, updated = [], []
+        for card in cards:
+            if card.state != CardState.STATE_GOOD or not days:
+                continue
+            offsets = sorted(generator.random.sample(range(days), min(days, generator.random.randint(1, 5))))
+            for offset in offsets:
+                date = self.today - timezone.timedelta(days=offset)
+                statistics.append(CardSucceededStatistics(
+                    card_id=card.id, date=date,
+                    date_time=timezone.now() - timezone.timedelta(days=offset)
+                ))
+            card.next_date = self.today - timezone.timedelta(days=offsets[0]) + \
+                timezone.timedelta(days=int(card.k ** len(offsets)))
+            updated.append(card)
+
+        self.bulk_create(CardSucceededStatistics, statistics, shard)
+        Card.objects.using(shard).bulk_update(updated, ['next_date'], batch_size=self.batch_size)
+        return len(statistics)
+
+    def create_deck_history(self, generator, shard, cards):
+        """
+        Daily deck statistics for every active day with learned / failed cards relations
+        """
+        by_deck = {}
+        for card in cards:
+            if card.state != CardState.STATE_IDLE:
+                by_deck.setdefault(card.deck_id, []).append(card.id)
+
+        statistics, relations = [], []
+        for deck_id, card_ids in by_deck.items():
+            for offset in range(self.options['days']):
+                if generator.random.random() > 0.6:
+                    continue
+                seconds_gone = generator.random.randint(30, 3600)
+                learned = generator.random.sample(card_ids, min(len(card_ids), generator.random.randint(0, 20)))
+                failed = generator.random.sample(card_ids, min(len(card_ids), generator.random.randint(0, 5)))
+                statistics.append(DeckDailyStatistics(
+                    deck_id=deck_id, date=self.today - timezone.timedelta(days=offset), seconds_gone=seconds_gone,
+                    learned_count=len(learned), failed_count=len(failed)
+                ))
+                relations.append((learned, failed))
+        statistics = self.bulk_create(DeckDailyStatistics, statistics, shard)
+
+        self.bulk_create(DeckDailyStatistics.cards_learned.through, [
+            DeckDailyStatistics.cards_learned.through(deckdailystatistics_id=stat.id, card_id=card_id)
+            for stat, (learned, failed) in zip(statistics, relations) for card_id in learned
+        ], shard)
+        self.bulk_create(DeckDailyStatistics.cards_failed.through, [
+            DeckDailyStatistics.cards_failed.through(deckdailystatistics_id=stat.id, card_id=card_id)
+            for stat, (learned, failed) in zip(statistics, relations) for card_id in failed
+        ], shard)
+        return len(statistics)
@@ -0,0 +1,167 @@
+"""
+In-process request metrics registry, exported in Prometheus text format by core.views.MetricsView
+
+Metrics are kept per worker process (gunicorn workers are scraped independently)
+Collected per resolved URL pattern: latency histogram, DB queries count and time, serializer time
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from rest_framework.serializers import BaseSerializer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+current_request_metrics = contextvars.ContextVar('current_request_metrics', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERIES_BUCKETS)
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+class RequestMetrics:
+    """
+    Metrics of the single request, filled by execute wrapper and serializer instrumentation
+    """
+    slow_queries_limit = 10
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries_count = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries_count += 1
+            self.db_seconds += duration
+            self.queries.append((duration, sql))
+            if len(self.queries) > self.slow_queries_limit * 2:
+                self.queries = sorted(self.queries, reverse=True)[:self.slow_queries_limit]
+
+    @property
+    def slowest_queries(self):
+        return sorted(self.queries, reverse=True)[:self.slow_queries_limit]
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = defaultdict(RouteMetrics)
+
+    def record(self, route, method, status_code, request_metrics: RequestMetrics, seconds):
+        with self.lock:
+            metrics = self.routes[(route, method, status_code)]
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(request_metrics.queries_count)
+            metrics.db_seconds += request_metrics.db_seconds
+            metrics.serializer_seconds += request_metrics.serializer_seconds
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    @classmethod
+    def _labels(cls, route, method, status_code, **extra):
+        labels = {'route': route, 'method': method, 'status': status_code, **extra}
+        return ','.join(
+            '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels.items()
+        )
+
+    def _histogram_lines(self, name, labels, histogram):
+        lines = []
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append('%s_bucket{%s,le="%s"} %s' % (name, labels, bound, count))
+        lines.append('%s_bucket{%s,le="+Inf"} %s' % (name, labels, histogram.count))
+        lines.append('%s_sum{%s} %s' % (name, labels, histogram.sum))
+        lines.append('%s_count{%s} %s' % (name, labels, histogram.count))
+        return lines
+
+    def export(self):
+        with self.lock:
+            routes = sorted(self.routes.items())
+            latency, queries, db_seconds, serializer_seconds = [], [], [], []
+            for (route, method, status_code), metrics in routes:
+                labels = self._labels(route, method, status_code)
+                latency += self._histogram_lines('lldeck_request_duration_seconds', labels, metrics.latency)
+                queries += self._histogram_lines('lldeck_request_db_queries', labels, metrics.queries)
+                db_seconds.append('lldeck_request_db_seconds_total{%s} %s' % (labels, metrics.db_seconds))
+                serializer_seconds.append(
+                    'lldeck_request_serializer_seconds_total{%s} %s' % (labels, metrics.serializer_seconds)
+                )
+
+        return '\n'.join([
+            '# HELP lldeck_request_duration_seconds Request latency by URL pattern.',
+            '# TYPE lldeck_request_duration_seconds histogram',
+            *latency,
+            '# HELP lldeck_request_db_queries Database queries per request by URL pattern.',
+            '# TYPE lldeck_request_db_queries histogram',
+            *queries,
+            '# HELP lldeck_request_db_seconds_total Time spent in database queries by URL pattern.',
+            '# TYPE lldeck_request_db_seconds_total counter',
+            *db_seconds,
+            '# HELP lldeck_request_serializer_seconds_total Time spent in serializers by URL pattern.',
+            '# TYPE lldeck_request_serializer_seconds_total counter',
+            *serializer_seconds,
+        ]) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def instrument_serializers():
+    """
+    Wraps `BaseSerializer.data` to add serialization time to the current request metrics
+    Nested `.data` calls are counted once
+    """
+    data_property = BaseSerializer.data
+    if getattr(data_property.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        metrics = current_request_metrics.get()
+        if metrics is None:
+            return data_property.fget(self)
+
+        started = time.perf_counter()
+        metrics.serializer_depth += 1
+        try:
+            return data_property.fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_seconds += time.perf_counter() - started
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
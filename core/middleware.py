@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import RequestMetrics, current_request_metrics, registry
+
+logger = logging.getLogger(__name__)
+
+
+class QueryMetricsMiddleware:
+    """
+    Records latency, DB queries count / time and serializer time per resolved URL pattern
+    Requests slower than `SLOW_REQUEST_SECONDS` are logged with their slowest SQL queries
+    Sync and async capable, queries of async views are recorded by `core.async_views.database_sync_to_async`
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    def record(self, request, response, metrics):
+        seconds = metrics.seconds
+        route = self.get_route(request)
+        registry.record(route, request.method, response.status_code, metrics, seconds)
+
+        threshold = getattr(settings, 'SLOW_REQUEST_SECONDS', None)
+        if threshold and seconds >= threshold:
+            logger.warning(
+                "Slow request %s %s (%s) took %.3fs: %s queries in %.3fs, serializers %.3fs\n%s",
+                request.method, request.path, route, seconds, metrics.queries_count, metrics.db_seconds,
+                metrics.serializer_seconds,
+                '\n'.join("  %.3fs %s" % (duration, sql) for duration, sql in metrics.slowest_queries)
+            )
+
+    @classmethod
+    def get_route(cls, request):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None:
+            return '<unresolved>'
+        return resolver_match.route or resolver_match.view_name
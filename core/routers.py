@@ -0,0 +1,135 @@
+"""
+Read replica database routing
+
+Reads of safe-method requests (GET, HEAD, OPTIONS) go to one of the replica aliases,
+writes and everything after the first write of the request go to the primary (`default`)
+Clients that wrote recently are pinned to the primary for `REPLICA_STICKY_SECONDS` (replication lag)
+Outside of requests (commands, shell) everything uses the primary
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_DATABASE = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+current_routing = contextvars.ContextVar('current_routing', default=None)
+
+
+def replica_databases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class RequestRouting:
+    """
+    Routing state of the single request, shared by threads of the request (contextvars are copied)
+    """
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.replica = random.choice(replica_databases()) if use_replica and replica_databases() else None
+
+    @property
+    def read_database(self):
+        if self.wrote or not self.replica:
+            return PRIMARY_DATABASE
+        return self.replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None:
+            return PRIMARY_DATABASE
+        return routing.read_database
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True  # Read-after-write of this request goes to the primary
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DATABASE, *replica_databases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_databases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Starts routing state of the request, pins clients to the primary after their writes
+    Clients are identified by Authorization header or session cookie (before the authentication runs)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        routing, sticky_key = self.start(request)
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish(routing, sticky_key)
+        return response
+
+    async def __acall__(self, request):
+        routing, sticky_key = self.start(request)
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish(routing, sticky_key)
+        return response
+
+    def start(self, request):
+        sticky_key = self.get_sticky_key(request)
+        use_replica = bool(replica_databases()) and request.method in SAFE_METHODS and not self.is_sticky(sticky_key)
+        return RequestRouting(use_replica), sticky_key
+
+    @classmethod
+    def finish(cls, routing, sticky_key):
+        if routing.wrote and sticky_key and replica_databases():
+            try:
+                cache.set(sticky_key, True, settings.REPLICA_STICKY_SECONDS)
+            except Exception as error:  # Cache backend is not available
+                logger.warning("Could not pin client to the primary database: %s", error)
+
+    @classmethod
+    def is_sticky(cls, sticky_key):
+        if not sticky_key:
+            return False
+        try:
+            return bool(cache.get(sticky_key))
+        except Exception as error:  # Cache backend is not available, replica might be behind
+            logger.warning("Could not check primary database pin: %s", error)
+            return True
+
+    @classmethod
+    def get_sticky_key(cls, request):
+        identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if identity:
+            return 'lldeck:primary-sticky:%s' % hashlib.sha1(identity.encode()).hexdigest()
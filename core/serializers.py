@@ -0,0 +1,138 @@
+"""
+Fast path of list serializers for hot list endpoints (opt-in by `values_serializer_class` of views)
+
+`ValuesSerializer` reads only the columns of its fields by `.values_list()`, without model instances,
+and converts the tuples to dicts by a function compiled once per serializer class
+(a list comprehension of dict displays, no field objects are walked per row)
+Output has to be the same as of the equivalent `ModelSerializer` (compared by the serializer benchmark of core/tests.py)
+
+Sparse fieldsets of GET requests: `?fields=id,name` keeps only the listed fields (computed properties of the others
+are not evaluated, columns of the others are not read), `?expand=front_content` replaces listed related ids
+by nested representations (`SparseFieldsMixin`), expanded lists are served by the serializers
+"""
+from django.db import models
+from rest_framework import serializers
+
+
+def query_names(request, param):
+    """
+    Names of the comma separated query parameter of a GET request, None without the parameter
+    """
+    if request is None or request.method != 'GET':
+        return None
+    value = getattr(request, 'query_params', request.GET).get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class ValuesSerializer:
+    """
+    `fields` are (name, lookup, converter) triples in the output order, the converter is a name of a method
+    converting the value of the lookup (or None to output it as is)
+    `prepare(rows)` is called with the page before the conversion, e.g. to read related rows of the page at once
+    """
+    fields = ()
+    expandable_fields = ()  # Expanded by the serializer (see `supports`)
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        requested = query_names(self.context.get('request'), 'fields')
+        self.active_fields = tuple(field for field in self.fields if requested is None or field[0] in requested)
+
+    @classmethod
+    def supports(cls, request):
+        """
+        Whether the fast path serves the request
+        """
+        return not (query_names(request, 'expand') or set()) & set(cls.expandable_fields)
+
+    def columns(self):
+        columns = []
+        for name, lookup, converter in self.active_fields:
+            if lookup not in columns:
+                columns.append(lookup)
+        return columns
+
+    def compiled(self):
+        """
+        (function converting rows, converter names), compiled once per serializer class and set of fields
+        """
+        compiled = self.__class__.__dict__.get('_compiled')
+        if compiled is None:
+            compiled = self.__class__._compiled = {}
+        if self.active_fields not in compiled:
+            columns = self.columns()
+            converters = [converter for name, lookup, converter in self.active_fields if converter]
+            items = []
+            for name, lookup, converter in self.active_fields:
+                value = 'row[%s]' % columns.index(lookup)
+                if converter:
+                    value = 'c%s(%s)' % (converters.index(converter), value)
+                items.append('%r: %s' % (name, value))
+            source = 'def convert(rows%s):\n    return [{%s} for row in rows]\n' % (
+                ''.join(', c%s' % index for index in range(len(converters))), ', '.join(items)
+            )
+            namespace = {}
+            exec(compile(source, '<%s>' % self.__class__.__name__, 'exec'), namespace)
+            compiled[self.active_fields] = namespace['convert'], converters
+        return compiled[self.active_fields]
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values_list(*self.columns())
+
+    def prepare(self, rows):
+        pass
+
+    def to_representation(self, rows):
+        convert, converters = self.compiled()
+        rows = list(rows)
+        self.prepare(rows)
+        return convert(rows, *[getattr(self, converter) for converter in converters])
+
+    def file_url(self, field, name):
+        """
+        URL of the file like `serializers.FileField` (absolute with the request in the context)
+        """
+        if not name:
+            return None
+        url = field.storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=` and `?expand=` of GET requests for model serializers (see the module docstring)
+    `expandable_fields` maps names of fields to methods returning their nested serializers,
+    `prefetch_expanded(instances, names)` reads the expanded rows of a page at once (`ExpandableListSerializer`)
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = query_names(request, 'fields')
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+        expand = query_names(request, 'expand') or set()
+        self.expanded = sorted(expand & set(self.expandable_fields) & set(self.fields))
+        for name in self.expanded:
+            self.fields[name] = getattr(self, self.expandable_fields[name])()
+
+    def prefetch_expanded(self, instances, names):
+        pass
+
+
+class ExpandableListSerializer(serializers.ListSerializer):
+    """
+    List of `SparseFieldsMixin` serializers, expanded rows are prefetched for the whole page
+    """
+
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.child.expanded:
+            self.child.prefetch_expanded(instances, self.child.expanded)
+        return super(ExpandableListSerializer, self).to_representation(instances)
@@ -0,0 +1,144 @@
+"""
+Profile based horizontal sharding
+
+Decks, cards, card contents and statistics of a profile live on the shard `Profile.shard` (shard map),
+everything else (users, profiles, tags, deck templates) stays on `default`, which is the first shard as well
+New profiles are placed by `choose_shard(user_id)`, `rebalanceshards` command moves profiles between shards
+
+`ShardRouter` routes by instance hints only: profile.decks, deck.cards, card.front_content... (related managers)
+and saving of instances. Plain `Deck.objects` querysets have no hints and go to `default`, use `.using(shard)`
+Replicated models (deck tags) are written to `default` and copied to every shard (contents/signals.py),
+so joins of sharded rows with them (deck.tags.all()) are read on the shard
+
+Shard map entries are kept in the process memory up to SHARD_MAP_TTL, every lookup compares them with the version
+of the profile in the shared cache, `forget_profile_shard` bumps it and the moved profile is read again everywhere
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+
+from core.cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+SHARDED_MODELS = {
+    'contents.deck', 'contents.deck_tags', 'contents.card', 'contents.cardfrontcontent', 'contents.cardbackcontent',
+    'contents.deckdailystatistics', 'contents.deckdailyqueue', 'contents.deckdailystatistics_cards_learned',
+    'contents.deckdailystatistics_cards_failed', 'contents.cardsucceededstatistics', 'contents.cardstudystep',
+    'contents.deckdailysummary', 'contents.profiledailysummary', 'contents.profileyearlysummary',
+}
+
+REPLICATED_MODELS = {'contents.decktag'}
+
+SHARD_SLOTS = 64  # Sequences of sharded tables are interleaved, ids stay unique across shards (up to 64 shards)
+
+SHARD_MAP_TTL = 60  # seconds to keep profile shard in the process memory
+
+_profile_shards = {}
+
+
+def shards():
+    return getattr(settings, 'DATABASE_SHARDS', None) or ['default']
+
+
+def choose_shard(user_id):
+    return shards()[int(user_id or 0) % len(shards())]
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def is_replicated(model):
+    return model._meta.label_lower in REPLICATED_MODELS
+
+
+def shard_of_profile_id(profile_id):
+    if len(shards()) == 1:
+        return shards()[0]
+
+    version = shard_map_version(profile_id)  # Read before the shard, a concurrent move bumps it after the switch
+    cached = _profile_shards.get(profile_id)
+    if cached and cached[1] > time.monotonic() and cached[2] == version:
+        return cached[0]
+
+    from applications.models import Profile
+    shard = Profile.objects.using('default').filter(id=profile_id).values_list('shard', flat=True).first()
+    shard = shard or shards()[0]
+    _profile_shards[profile_id] = (shard, time.monotonic() + SHARD_MAP_TTL, version)
+    return shard
+
+
+def shard_map_version(profile_id):
+    try:
+        return response_cache.get_version('profile_shard', profile_id)
+    except Exception as error:  # Cache backend is not available, entries expire by SHARD_MAP_TTL only
+        logger.warning("Could not read shard map version of profile %s: %s", profile_id, error)
+        return None
+
+
+def forget_profile_shard(profile_id):
+    """
+    Called after the switched shard map is committed, clears the entry in every process
+    """
+    _profile_shards.pop(profile_id, None)
+    response_cache.bump_now('profile_shard', profile_id)
+
+
+def shard_of_instance(instance):
+    """
+    Shard of the profile owning the instance, or None if it can not be resolved without queries
+    """
+    from applications.models import Profile
+    if isinstance(instance, Profile):  # Not kept in the shard map, the instance may be older than its version
+        return instance.shard or shards()[0]
+
+    if not is_sharded(instance.__class__):
+        return None
+    if instance._state.db:
+        return instance._state.db
+
+    for name in ('profile', 'deck', 'card'):
+        try:
+            field = instance._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.is_cached(instance):
+            return shard_of_instance(getattr(instance, name))
+        if name == 'profile' and instance.profile_id:
+            return shard_of_profile_id(instance.profile_id)
+    return None
+
+
+class ShardRouter:
+    """
+    Must be the first of DATABASE_ROUTERS, returns None for the models that are not sharded
+    """
+
+    def db_for_read(self, model, **hints):
+        # Single shard (`default` only) leaves reads to the replica router
+        if len(shards()) == 1 or hints.get('instance') is None:
+            return None
+        if is_replicated(model):
+            return shard_of_instance(hints['instance']) if is_sharded(hints['instance'].__class__) else None
+        if not is_sharded(model):
+            return None
+        return shard_of_instance(hints['instance'])
+
+    def db_for_write(self, model, **hints):
+        if is_replicated(model):
+            return None
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows reference users, profiles, tags and templates of `default` (without db constraints)
+        if is_sharded(obj1.__class__) or is_sharded(obj2.__class__):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default' or db not in shards():
+            return None
+        return model_name is not None and '%s.%s' % (app_label, model_name) in SHARDED_MODELS | REPLICATED_MODELS
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+
+BENCHMARK_TAG = 'benchmark'
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Benchmarks (wall-clock, seeded datasets) are excluded by default, run them explicitly:
+    python manage.py test core --tag benchmark
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if BENCHMARK_TAG not in (tags or ()):
+            exclude_tags = set(exclude_tags or ()) | {BENCHMARK_TAG}
+        super(TestRunner, self).__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
@@ -1,3 +1,334 @@
-from django.test import TestCase
+import json
+import os
+import time
+import uuid
+from contextlib import ExitStack
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, RequestFactory, tag, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from applications.models import Profile
+from authentication import urls as authentication_urls
+from contents import urls as contents_urls
+from contents.models import Deck, DeckTemplate, Card
+from contents.serializers import DeckListSerializer, DeckListValuesSerializer, CardListSerializer, \
+    CardListValuesSerializer, DeckTemplateListSerializer, DeckTemplateListValuesSerializer
+from core.renderers import FastJSONRenderer
+from core.sharding import shards
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+
+class CaptureAllQueries(ExitStack):
+    """
+    Queries of every database alias (primary, replicas and shards), `len()` is their total count
+    """
+
+    def __enter__(self):
+        super(CaptureAllQueries, self).__enter__()
+        self.contexts = [self.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        return self
+
+    def __len__(self):
+        return sum(len(context.captured_queries) for context in self.contexts)
+
+
+def url_pattern(urlpatterns, name):
+    return str(next(pattern for pattern in urlpatterns if pattern.name == name).pattern)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(percent / 100 * len(values))) - 1))
+    return values[index]
+
+
+@tag('benchmark')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class EndpointBenchmarkTestCase(TestCase):
+    """
+    Drives every URL of contents/urls.py and authentication/urls.py through the test client
+    on a seeded dataset, records latency percentiles and query counts to benchmarks/results.json
+
+    Fails when a view exceeds its query budget (`query_budgets`) or when its queries count starts growing
+    with the page size (N+1), queries of every database alias are counted
+    Latency is compared with benchmarks/baseline.json of the same machine, (re)written with BENCHMARK_UPDATE_BASELINE=1,
+    it is skipped without the baseline
+
+    Run: python manage.py test core --tag benchmark
+    """
+    iterations = int(os.environ.get('BENCHMARK_ITERATIONS', 20))
+    update_baseline = os.environ.get('BENCHMARK_UPDATE_BASELINE') == '1'
+    baseline_path = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+    results_path = os.path.join(BENCHMARKS_DIR, 'results.json')
+
+    latency_tolerance = 2.0  # p95 may be up to twice slower than the baseline
+    latency_slack = 0.05  # seconds, absorbs noise of the fast endpoints
+
+    # Queries per request of every URL pattern: session, user and profile (3) and the queries of the view,
+    # savepoints of atomic blocks are counted as well. Lower a budget when a view gets cheaper
+    query_budgets = {
+        'decks/my': 6,
+        'decks/my/forecast': 5,
+        'decks/my/<int:deck_id>': 8,
+        'decks/my/<int:deck_id>/forecast': 5,
+        'decks/my/<int:deck_id>/template-update': 10,
+        'decks/my/<int:deck_id>/cards': 6,
+        'decks/my/<int:deck_id>/cards/<int:card_id>': 4,
+        'decks/my/<int:deck_id>/cards/<int:card_id>/front': 8,
+        'decks/my/<int:deck_id>/cards/<int:card_id>/back': 8,
+        'decks/my/<int:deck_id>/cards/<int:card_id>/step': 12,
+        'decks/my/<int:deck_id>/cards/<int:card_id>/position': 10,
+        'decks/my/<int:deck_id>/cards/new': 7,
+        'decks/my/<int:deck_id>/cards/new/shuffle': 8,
+        'decks/my/<int:deck_id>/cards/learning': 7,
+        'decks/my/<int:deck_id>/cards/to-review': 7,
+        'deck-templates/my': 5,
+        'deck-templates/my/<int:deck_id>': 6,
+        'deck-templates/popular': 5,
+        url_pattern(contents_urls.urlpatterns, 'card-action'): 10,
+        'api-token/': 4,
+        'register': 6,
+        'users/me': 2,
+        'users/me/profile': 3,
+        'users/me/profile/status': 5,
+        'users/me/profile/history': 5,
+        'users/leaderboards/<str:board>': 6,
+        'users/leaderboards/<str:board>/templates': 7,
+        'users/<int:user_id>': 4,
+        'users/<int:user_id>/profile': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed', users=5, decks=3, cards=30, templates=4, template_cards=10, tags=20, days=30,
+            workers=1, seed=1, stdout=StringIO()
+        )
+        call_command('rollupstatistics', days=30, stdout=StringIO())
+        cls.profile = Profile.objects.filter(deck_templates__isnull=False).order_by('id').first()
+        cls.profile.is_private = False
+        cls.profile.save()
+
+        cls.user = cls.profile.user
+        cls.user.is_staff = True
+        cls.user.save()
+
+        cls.deck = cls.profile.decks.filter(template=None).order_by('id').first() or cls.profile.decks.first()
+        cls.template_deck = cls.profile.decks.exclude(template=None).order_by('id').first() or cls.deck
+        cls.card = cls.deck.cards.order_by('id').first()
+        cls.deck_template = cls.profile.deck_templates.order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_cases(self):
+        """
+        List of (url pattern, method, path, data, paginated)
+        """
+        deck = '/contents/decks/my/%s' % self.deck.id
+        card = '%s/cards/%s' % (deck, self.card.id)
+        template_deck = '/contents/decks/my/%s' % self.template_deck.id
+        registered = iter(range(10 ** 6))
+
+        def registration():
+            number = next(registered)
+            return {
+                'name': 'Benchmark user', 'email': 'benchmark-%s@lldeck.local' % number,
+                'phone_number': '+1202555%04d' % number, 'password1': 'Benchmark-password-1',
+                'password2': 'Benchmark-password-1',
+            }
+
+        return [
+            ('decks/my', 'get', '/contents/decks/my', None, True),
+            ('decks/my/forecast', 'get', '/contents/decks/my/forecast?days=30&projected=1', None, False),
+            ('decks/my/<int:deck_id>', 'get', deck, None, False),
+            ('decks/my/<int:deck_id>/forecast', 'get', '%s/forecast?days=30&projected=1' % deck, None, False),
+            ('decks/my/<int:deck_id>/template-update', 'get', '%s/template-update' % template_deck, None, False),
+            ('decks/my/<int:deck_id>/cards', 'get', '%s/cards' % deck, None, True),
+            ('decks/my/<int:deck_id>/cards/<int:card_id>', 'get', card, None, False),
+            ('decks/my/<int:deck_id>/cards/<int:card_id>/front', 'get', '%s/front' % card, None, False),
+            ('decks/my/<int:deck_id>/cards/<int:card_id>/back', 'get', '%s/back' % card, None, False),
+            ('decks/my/<int:deck_id>/cards/<int:card_id>/step', 'post', '%s/step' % card,
+             lambda: {'idempotency_key': uuid.uuid4().hex, 'success': True}, False),
+            ('decks/my/<int:deck_id>/cards/<int:card_id>/position', 'put', '%s/position' % card,
+             {'after': None}, False),
+            ('decks/my/<int:deck_id>/cards/new', 'get', '%s/cards/new' % deck, None, True),
+            ('decks/my/<int:deck_id>/cards/new/shuffle', 'post', '%s/cards/new/shuffle' % deck, None, False),
+            ('decks/my/<int:deck_id>/cards/learning', 'get', '%s/cards/learning' % deck, None, True),
+            ('decks/my/<int:deck_id>/cards/to-review', 'get', '%s/cards/to-review' % deck, None, True),
+            ('deck-templates/my', 'get', '/contents/deck-templates/my', None, True),
+            ('deck-templates/my/<int:deck_id>', 'get',
+             '/contents/deck-templates/my/%s' % self.deck_template.id, None, False),
+            ('deck-templates/popular', 'get', '/contents/deck-templates/popular', None, True),
+            (url_pattern(contents_urls.urlpatterns, 'card-action'), 'put', '%s/action?success=1' % card, None, False),
+            ('api-token/', 'post', '/auth/api-token/', {'username': self.user.email, 'password': 'password'}, False),
+            ('register', 'post', '/auth/register', registration, False),
+            ('users/me', 'get', '/auth/users/me', None, False),
+            ('users/me/profile', 'get', '/auth/users/me/profile', None, False),
+            ('users/me/profile/status', 'get', '/auth/users/me/profile/status', None, False),
+            ('users/me/profile/history', 'get', '/auth/users/me/profile/history', None, False),
+            ('users/leaderboards/<str:board>', 'get', '/auth/users/leaderboards/weekly', None, False),
+            ('users/leaderboards/<str:board>/templates', 'get', '/auth/users/leaderboards/streak/templates', None,
+             False),
+            ('users/<int:user_id>', 'get', '/auth/users/%s' % self.user.id, None, False),
+            ('users/<int:user_id>/profile', 'get', '/auth/users/%s/profile' % self.user.id, None, False),
+        ]
+
+    def request(self, method, path, data=None):
+        data = data() if callable(data) else data
+        if method == 'put':
+            return self.client.put(path, data=json.dumps(data or {}), content_type='application/json')
+        return getattr(self.client, method)(path, data)
+
+    def measure(self, method, path, data):
+        self.request(method, path, data)  # Warm up, e.g. the first read of the day stores study queues of the deck
+        latencies, queries = [], []
+        for i in range(self.iterations):
+            with CaptureAllQueries() as context:
+                started = time.perf_counter()
+                response = self.request(method, path, data)
+                latencies.append(time.perf_counter() - started)
+            queries.append(len(context))
+            self.assertLess(response.status_code, 500, "%s %s failed" % (method.upper(), path))
+        return {
+            'status': response.status_code,
+            'queries': max(queries),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+
+    def queries_per_row(self, path):
+        counts = []
+        for limit in (1, 10):
+            with CaptureAllQueries() as context:
+                self.client.get(path, {'limit': limit})
+            counts.append(len(context))
+        return (counts[1] - counts[0]) / 9
+
+    def test_every_url_is_benchmarked(self):
+        patterns = {str(pattern.pattern) for pattern in contents_urls.urlpatterns + authentication_urls.urlpatterns}
+        benchmarked = {case[0] for case in self.get_cases()}
+        self.assertEqual(patterns - benchmarked, set(), "URL patterns without benchmark case")
+        self.assertEqual(benchmarked - set(self.query_budgets), set(), "Benchmark cases without query budget")
+
+    def test_endpoints_within_budget(self):
+        results = {}
+        for name, method, path, data, paginated in self.get_cases():
+            results[name] = self.measure(method, path, data)
+            if paginated:
+                results[name]['queries_per_row'] = self.queries_per_row(path)
+
+        os.makedirs(BENCHMARKS_DIR, exist_ok=True)
+        with open(self.results_path, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+        if self.update_baseline:
+            with open(self.baseline_path, 'w') as file:
+                json.dump({name: {'p95': result['p95']} for name, result in results.items()}, file, indent=2,
+                          sort_keys=True)
+
+        baseline = {}
+        if os.path.exists(self.baseline_path):
+            with open(self.baseline_path) as file:
+                baseline = json.load(file)
+
+        failures = []
+        for name, result in results.items():
+            budget = self.query_budgets[name]
+            if result['queries'] > budget:
+                failures.append("%s: %s queries, budget %s" % (name, result['queries'], budget))
+            if result.get('queries_per_row', 0) > 0:
+                failures.append("%s: %.1f queries per row, expected none" % (name, result['queries_per_row']))
+            if name in baseline:
+                threshold = baseline[name]['p95'] * self.latency_tolerance + self.latency_slack
+                if result['p95'] > threshold:
+                    failures.append("%s: p95 %.3fs, threshold %.3fs" % (name, result['p95'], threshold))
+
+        self.assertFalse(failures, "Performance regressions:\n" + "\n".join(failures))
+
+
+@tag('benchmark')
+class SerializerBenchmarkTestCase(TestCase):
+    """
+    Micro-benchmark of the fast path list serializers (core/serializers.py) against the DRF serializers:
+    the same seeded rows are read, serialized and rendered by both, responses have to be equal
+    and the fast path has to be faster, timings are recorded to benchmarks/serializers.json
+
+    Run: python manage.py test core --tag benchmark
+    """
+    iterations = int(os.environ.get('BENCHMARK_ITERATIONS', 20))
+    results_path = os.path.join(BENCHMARKS_DIR, 'serializers.json')
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed', users=2, decks=10, cards=200, templates=20, template_cards=10, tags=20, days=1,
+            workers=1, seed=1, stdout=StringIO()
+        )
+
+    def get_cases(self):
+        """
+        List of (name, queryset, serializer class, values serializer class)
+        """
+        shard = shards()[0]
+        return [
+            ('decks', Deck.objects.using(shard).with_counts().prefetch_related('tags').order_by('id'),
+             DeckListSerializer, DeckListValuesSerializer),
+            ('cards', Card.objects.using(shard).order_by('id'), CardListSerializer, CardListValuesSerializer),
+            ('deck_templates', DeckTemplate.objects.with_counts().order_by('id'),
+             DeckTemplateListSerializer, DeckTemplateListValuesSerializer),
+        ]
+
+    @classmethod
+    def normalized(cls, content):
+        """
+        Tags of a deck are compared as a set, both serializers read them without an order
+        """
+        rows = json.loads(content)
+        for row in rows:
+            if 'tags' in row:
+                row['tags'] = sorted(row['tags'], key=lambda tag: tag['name'])
+        return rows
+
+    @classmethod
+    def timed(cls, render, iterations):
+        timings = []
+        for i in range(iterations):
+            started = time.perf_counter()
+            content = render()
+            timings.append(time.perf_counter() - started)
+        return content, percentile(timings, 50)
+
+    def test_fast_serializers(self):
+        context = {'request': RequestFactory().get('/')}
+        results, failures = {}, []
+        for name, queryset, serializer_class, values_serializer_class in self.get_cases():
+            def render():
+                return JSONRenderer().render(serializer_class(queryset.all(), many=True, context=context).data)
+
+            def render_fast():
+                serializer = values_serializer_class(context=context)
+                return FastJSONRenderer().render(serializer.to_representation(serializer.values(queryset.all())))
+
+            content, seconds = self.timed(render, self.iterations)
+            fast_content, fast_seconds = self.timed(render_fast, self.iterations)
+            self.assertEqual(self.normalized(fast_content), self.normalized(content), "%s: responses differ" % name)
+
+            rows = len(json.loads(content))
+            results[name] = {
+                'rows': rows, 'serializer_p50': seconds, 'values_serializer_p50': fast_seconds,
+                'speedup': seconds / fast_seconds if fast_seconds else None,
+            }
+            if rows and fast_seconds >= seconds:
+                failures.append("%s: fast path %.4fs, serializer %.4fs" % (name, fast_seconds, seconds))
+
+        os.makedirs(BENCHMARKS_DIR, exist_ok=True)
+        with open(self.results_path, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        self.assertFalse(failures, "Fast path is not faster:\n" + "\n".join(failures))
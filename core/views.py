@@ -1,3 +1,18 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
 
-# Create your views here.
+from core.metrics import registry
+
+
+class MetricsView(View):
+    """
+    Prometheus text exposition of request metrics (see core/metrics.py)
+    Available for `METRICS_ALLOWED_IPS` and staff users only
+    """
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def get(self, request):
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+            return HttpResponseForbidden()
+        return HttpResponse(registry.export(), content_type=self.content_type)
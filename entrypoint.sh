@@ -1,8 +1,11 @@
 #!/bin/sh
 
 python manage.py flush --no-input
-python manage.py makemigrations
 python manage.py migrate --no-input
 python manage.py collectstatic --no-input
 
-gunicorn lldeck.wsgi:application --bind 0.0.0.0:8000
+if [ "$SERVER_MODE" = "asgi" ]; then
+  gunicorn lldeck.asgi:application --bind 0.0.0.0:8000 --worker-class uvicorn.workers.UvicornWorker
+else
+  gunicorn lldeck.wsgi:application --bind 0.0.0.0:8000
+fi
@@ -30,6 +30,12 @@ DEBUG = True
 
 ALLOWED_HOSTS = config("ALLOWED_HOSTS", '').split(',')
 
+# wsgi (gunicorn sync workers) or asgi (uvicorn workers), see entrypoint.sh
+SERVER_MODE = config("SERVER_MODE", 'wsgi')
+
+# Async implementations of the hot read endpoints (core/async_views.py)
+ASYNC_READ_PATH = SERVER_MODE == 'asgi'
+
 INTERNAL_IPS = [
     "127.0.0.1",
     "localhost"
@@ -38,10 +44,16 @@ INTERNAL_IPS = [
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
-        'LOCATION': '127.0.0.1:9000',
+        'LOCATION': config("CACHE_LOCATION", '127.0.0.1:9000'),
     }
 }
 
+# Versioned response cache (core/cache.py), entries are invalidated by version bumps
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Card scheduling algorithm (contents/schedulers.py), run `reschedule` command after switching
+CARD_SCHEDULER = config("CARD_SCHEDULER", 'contents.schedulers.DefaultScheduler')
+
 # For requests from browsers (cors)
 # For more info https://pypi.org/project/django-cors-headers/
 
@@ -92,6 +104,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryMetricsMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -103,8 +117,20 @@ MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if ASYNC_READ_PATH:
+    # Sync only middleware, would run every async request in a thread
+    MIDDLEWARE.remove('debug_toolbar.middleware.DebugToolbarMiddleware')
+    SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W001']
+
 ROOT_URLCONF = 'lldeck.urls'
 
+# Request metrics (core/middleware.py), exported on /metrics
+
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", '127.0.0.1').split(',')
+
+# Requests slower than this (seconds) are logged with their slowest SQL queries, 0 to disable
+SLOW_REQUEST_SECONDS = config("SLOW_REQUEST_SECONDS", 1.0, cast=float)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -134,9 +160,45 @@ DATABASES = {
         'PASSWORD': config("DATABASE_PASSWORD", ''),
         'HOST': config("DATABASE_HOST", ''),
         'PORT': config("DATABASE_PORT", ''),
+        'CONN_MAX_AGE': config("DATABASE_CONN_MAX_AGE", 0, cast=int),
     }
 }
 
+# Read replicas for safe-method requests (core/routers.py), e.g. DATABASE_REPLICA_HOSTS=replica-1,replica-2:5433
+# Locally DATABASE_REPLICA_HOSTS=localhost adds second alias of the same database
+
+DATABASE_REPLICAS = []
+
+for index, replica_host in enumerate(filter(None, config("DATABASE_REPLICA_HOSTS", '').split(',')), start=1):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES['replica_%s' % index] = dict(
+        DATABASES['default'], HOST=replica_host, PORT=replica_port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append('replica_%s' % index)
+
+# Shards of profiles' decks, cards and statistics (core/sharding.py), `default` is the first shard
+# e.g. DATABASE_SHARDS=lldeck_shard_1,shard-host:5432/lldeck_shard_2 (database name on the default server or host)
+
+DATABASE_SHARDS = ['default']
+
+for index, shard_database in enumerate(filter(None, config("DATABASE_SHARDS", '').split(',')), start=1):
+    shard_host, _, shard_name = shard_database.rpartition('/')
+    shard_host, _, shard_port = shard_host.partition(':')
+    DATABASES['shard_%s' % index] = dict(
+        DATABASES['default'], NAME=shard_name,
+        HOST=shard_host or DATABASES['default']['HOST'], PORT=shard_port or DATABASES['default']['PORT']
+    )
+    DATABASE_SHARDS.append('shard_%s' % index)
+
+DATABASE_ROUTERS = ['core.sharding.ShardRouter', 'core.routers.ReplicaRouter']
+
+# Seconds to read from the primary after client's own writes
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", 5, cast=int)
+
+# Benchmarks are run only with --tag benchmark (core/test_runner.py)
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -203,34 +265,43 @@ LOGGING = {
     'disable_existing_loggers': False,
     'formatters': {
         'verbose': {
+            '()': 'core.log.StructuredFormatter',
             'format': '[%(levelname)s] %(asctime)s : %(message)s',
         },
         'simple': {
+            '()': 'core.log.StructuredFormatter',
             'format': '[%(levelname)s] %(message)s'
         }
     },
     'handlers': {
         'applications_file_handler': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.log.AsyncFileHandler',
             'filename': 'applications/activity.log',
             'formatter': 'verbose',
             'encoding': 'utf-8'
         },
         'contents_file_handler': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.log.AsyncFileHandler',
             'filename': 'contents/activity.log',
             'formatter': 'verbose',
             'encoding': 'utf-8'
         },
         'authentication_file_handler': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.log.AsyncFileHandler',
             'filename': 'authentication/activity.log',
             'formatter': 'verbose',
             'encoding': 'utf-8'
         },
+        'core_file_handler': {
+            'level': 'INFO',
+            'class': 'core.log.AsyncFileHandler',
+            'filename': 'core/activity.log',
+            'formatter': 'verbose',
+            'encoding': 'utf-8'
+        },
         'console_handler': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
@@ -250,5 +321,9 @@ LOGGING = {
             'handlers': ['authentication_file_handler', 'console_handler'],
             'level': 'DEBUG',
         },
+        'core': {
+            'handlers': ['core_file_handler', 'console_handler'],
+            'level': 'DEBUG',
+        },
     },
 }
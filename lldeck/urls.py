@@ -19,9 +19,12 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import MetricsView
+
 urlpatterns = [
                   path('admin/', admin.site.urls),
                   path('auth/', include('authentication.urls')),
                   path('contents/', include('contents.urls')),
                   path('__debug__/', include('debug_toolbar.urls')),
+                  path('metrics', MetricsView.as_view()),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)